@@ -1,118 +1,870 @@
-import serial
-import time
+import argparse
+import copy
 import os
-import joblib
+import time
+from functools import partial
 import numpy as np
+from anytime_decision import AnytimeDecider
+from compiled_pipeline import CompiledPipeline
+from metrics import METRICS, now
+from session_features import SessionAggregator
+from wire_format import FRAME_DATA, WIRE_ACK, WIRE_HELLO, WireFramer
+# serial, joblib ve sklearn ağır modüllerdir; açılışı hızlandırmak için ihtiyaç anında import edilir
 # import pandas as pd # Eğer gelen string'i DataFrame'e çevirmek isterseniz
 
 # --- Yapılandırma ---
 SERIAL_PORT_DEVICE = "/dev/rfcomm0"
 BAUD_RATE = 9600 # ESP32 ile aynı olmalı
+# Birden çok swipe paneli: cihaz kimliği -> seri port. Verilirse SERIAL_PORT_DEVICE yerine hepsi tek
+# döngüde dinlenir; her cihazın oturumu ayrı tutulur, çıktılar [cihaz] önekiyle yazılır ve aynı anda
+# gelen satırlar tek model örneğinde birlikte tahmin edilir. Bağlantısı kopan cihaz
+# DEVICE_RECONNECT_INTERVAL saniyede bir yeniden açılır; diğer cihazlar çalışmaya devam eder.
+SERIAL_PORT_DEVICES = None # örn. {"panel1": "/dev/rfcomm0", "panel2": "/dev/rfcomm1"}
+DEVICE_RECONNECT_INTERVAL = 2.0
 
 # Kaydedilmiş model ve nesnelerin BBB üzerindeki yolları
 MODEL_DIR = "/home/debian/ml_model/" # Bu yolu kendi dosya yapınıza göre güncelleyin
 MODEL_FILENAME = os.path.join(MODEL_DIR, 'xgboost_swipe_model.joblib')
 SCALER_FILENAME = os.path.join(MODEL_DIR, 'scaler.joblib')
 ENCODER_FILENAME = os.path.join(MODEL_DIR, 'label_encoder.joblib')
+# flat_forest.py ile dışa aktarılmış, yalnızca numpy gerektiren model dosyası
+FOREST_FILENAME = os.path.join(MODEL_DIR, 'flat_forest.npz')
+# model_bundle.py ile yazılmış tek dosyalık, sürümlü paket (pickle yok, mmap ile açılır)
+BUNDLE_FILENAME = os.path.join(MODEL_DIR, 'swipe_model.bundle.npy')
+# quantized_forest.py ile nicemlenmiş paket: int16 eşikler (scaler katlanmış), uint8 yaprak değerleri
+QUANTIZED_FILENAME = os.path.join(MODEL_DIR, 'swipe_model.quantized.npy')
+# BBB_egitme.py'nin oturum özelliklerinden eğittiği model (isteğe bağlı; yoksa satır oyları kullanılır)
+SESSION_FOREST_FILENAME = os.path.join(MODEL_DIR, 'session_forest.npz')
+# BBB_egitme.py'nin (veya user_templates.py'nin) ürettiği kullanıcı şablonları. Kayıtlı olmayan kişilerin
+# reddi isteğe bağlıdır (REJECT_UNKNOWN_USERS / --reject-unknown veya UNKNOWN_THRESHOLD verilirse açılır):
+# oturumun özellikleri tahmin edilen kullanıcının şablonundan eşikten uzaksa karar UNKNOWN_USER_LABEL olur.
+# Ayırt edicilik henüz sınırlıdır (bench_user_templates.py: AUC ~0.72; varsayılan eşikte kayıtlı
+# kullanıcıların ~%5'i reddedilir, sahte kişilerin yalnızca ~%13'ü yakalanır), bu yüzden varsayılan kapalıdır.
+# Erken karar (EARLY_EXIT_MARGIN) o ana kadarki satırlar şablon kontrolünden geçerse yazdırılır; oturum
+# sonundaki karar yine tüm oturuma bakar. Yalnızca SESSION_MODE'da kullanılır.
+USER_TEMPLATES_FILENAME = os.path.join(MODEL_DIR, 'user_templates.npz')
+REJECT_UNKNOWN_USERS = False
+UNKNOWN_THRESHOLD = None # None ise dosyadaki eşik (eğitimde kayıtlı kullanıcıların ~%95'i kabul); büyüdükçe daha az ret
+UNKNOWN_USER_LABEL = "unknown"
 
-# Model, scaler ve encoder'ı yükle
-try:
-    loaded_model = joblib.load(MODEL_FILENAME)
-    loaded_scaler = joblib.load(SCALER_FILENAME)
-    loaded_label_encoder = joblib.load(ENCODER_FILENAME)
-    print("Model, scaler ve label encoder başarıyla yüklendi.")
-    print(f"Yüklenen Label Encoder Sınıfları: {list(loaded_label_encoder.classes_)}")
-except Exception as e:
-    print(f"Model/Scaler/Encoder yüklenirken hata: {e}")
-    print("Lütfen dosyaların doğru yolda olduğundan ve bozuk olmadığından emin olun.")
-    loaded_model = None
+# Tahmin motoru: "sklearn" (joblib dosyaları), "numpy" (düzleştirilmiş orman .npz)
+# veya "bundle" (tek dosyalık paket; en hızlı açılış, sklearn/xgboost gerekmez)
+# veya "quantized" (nicemlenmiş paket; en az bellek, yalnızca tamsayı karşılaştırma ve toplama)
+INFERENCE_ENGINE = "sklearn"
 
-def predict_user(swipe_features_list):
-    if not loaded_model or not loaded_scaler or not loaded_label_encoder:
-        print("Model, scaler veya encoder yüklenemedi. Tahmin yapılamıyor.")
-        return None
+FEATURE_COUNT = 18 # 9 ham dokunma değeri + 9 süre değeri
+
+# True: her swipe oturumu (CMD:START_SWIPE ... CMD:DATA_SENT) için tek karar yazdırılır
+# False: eskisi gibi her DATA: satırı için ayrı tahmin yazdırılır
+SESSION_MODE = True
+# Erken karar (yalnızca SESSION_MODE'da): örneklerin log-olasılıkları toplanır ve en olası kullanıcı
+# ikinciden EARLY_EXIT_MARGIN kadar öne geçince CMD:DATA_SENT beklenmeden karar yazdırılır.
+# None ise kapalıdır. Eşik seçimi için bkz. bench_early_exit.py
+EARLY_EXIT_MARGIN = 8.0
+EARLY_EXIT_MIN_SAMPLES = 2
+
+# Ölçümler (metrics.py): seri bekleme, ayrıştırma, ölçekleme ve tahmin süreleri ile hata sayaçları.
+# METRICS_PORT verilirse http://127.0.0.1:<port>/metrics adresinden JSON olarak sunulur;
+# METRICS_SNAPSHOT_FILE verilirse METRICS_SNAPSHOT_INTERVAL saniyede bir dosyaya yazılır.
+METRICS_PORT = None                 # örn. 9100
+METRICS_SNAPSHOT_FILE = None        # örn. "/run/bbbpredict_metrics.json" (tmpfs, SD karta yazılmaz)
+METRICS_SNAPSHOT_INTERVAL = 10.0
+# True ise satır başına çıktılar (alınan her satır, eklenen veri sayısı) hiç yazdırılmaz; yalnızca kararlar
+QUIET = False
+# Model dosyası bu aralıkla (saniye) kontrol edilir; değiştiyse oturumlar arasında yeniden yüklenir
+# (bkz. enrollment.py). None ise kapalıdır.
+MODEL_RELOAD_INTERVAL = 5.0
+# Tahmin önbelleği (prediction_cache.py): aynı kovaya düşen ham özellik vektörleri için model yeniden
+# çalıştırılmaz. None ise kapalıdır. Kova genişliği 1 tamsayı girdilerde kayıpsızdır; örn.
+# [4]*9 + [100]*9 ham değerleri 4'lük, süreleri 100'lük kovalara böler (daha çok isabet, yaklaşık sonuç).
+# Önbellek her model yüklemesinde boşalır. Seçim için bkz. bench_prediction_cache.py
+PREDICTION_CACHE_SIZE = None        # örn. 4096 kayıt
+PREDICTION_CACHE_TTL = 300.0        # saniye; None ise süresiz
+PREDICTION_CACHE_BUCKETS = 1
+# Tahmin ayrı bir işçi süreçte çalışır (inference_worker.py): seri okuma tahmin sürerken de devam eder,
+# satırlar paylaşılan bellekteki yuvalar üzerinden gönderilir ve sonuçlar aynı seçici döngüsünde işlenir.
+# İşçi çökerse yeniden başlatılır ve bitmemiş satırlar yeniden gönderilir. Model (ve tahmin önbelleği)
+# yalnızca işçi süreçte yüklenir. Boş yuva yoksa satırlar cihaz kuyruğunda bekler; kuyruk
+# MAX_PENDING_ROWS satırı aşarsa en eski satırlar atılır (inference_rows_dropped). Bkz. bench_inference_worker.py
+INFERENCE_WORKER = False
+WORKER_SLOTS = 4
+WORKER_SLOT_ROWS = 64
+WORKER_LOAD_TIMEOUT = 60.0          # ilk model yüklemesi için en fazla bekleme (saniye)
+MAX_PENDING_ROWS = 1024
+
+# Model modül import edilirken değil, ilk ihtiyaç anında yüklenir (bkz. load_models)
+compiled_pipeline = None
+label_lookup = None
+session_pipeline = None
+user_templates = None
+model_version = None
+_session_forest = None
+_user_templates = None
+_model_stamp = None
+_next_reload_check = 0.0
+_worker = None
+_worker_failed_generation = None
+
+def _model_files():
+    if INFERENCE_ENGINE == "bundle":
+        return [BUNDLE_FILENAME]
+    if INFERENCE_ENGINE == "numpy":
+        return [FOREST_FILENAME]
+    if INFERENCE_ENGINE == "quantized":
+        return [QUANTIZED_FILENAME]
+    return [MODEL_FILENAME, SCALER_FILENAME, ENCODER_FILENAME]
+
+def _load_pipeline():
+    # Seçili motora göre (hat, model sürümü) döner; global durumu değiştirmez
+    if INFERENCE_ENGINE == "bundle":
+        from model_bundle import load_bundle
+        # Diziler dosyaya eşlenir (mmap); pickle ve kopyalama yok
+        arrays = load_bundle(BUNDLE_FILENAME)
+        print("Model paketi başarıyla yüklendi.")
+    elif INFERENCE_ENGINE == "numpy":
+        from flat_forest import load_forest
+        # Scaler parametreleri ve sınıf adları dosyanın içinde; joblib/sklearn import edilmez
+        arrays = load_forest(FOREST_FILENAME)
+        print("Düzleştirilmiş orman modeli başarıyla yüklendi.")
+    elif INFERENCE_ENGINE == "quantized":
+        from quantized_forest import QuantizedPipeline, load_quantized
+        # Ham tamsayı girdilerle çalışır; scaler eşiklere katlanmıştır
+        arrays = load_quantized(QUANTIZED_FILENAME)
+        print("Nicemlenmiş model paketi başarıyla yüklendi.")
+        return QuantizedPipeline(arrays), int(arrays.get("model_version", 0))
+    else:
+        import joblib
+        loaded_model = joblib.load(MODEL_FILENAME)
+        loaded_scaler = joblib.load(SCALER_FILENAME)
+        loaded_label_encoder = joblib.load(ENCODER_FILENAME)
+        print("Model, scaler ve label encoder başarıyla yüklendi.")
+        # Scaler + model yükleme anında tek bir hatta derlenir (tahmin başına sklearn doğrulaması yok)
+        return CompiledPipeline.from_sklearn(loaded_scaler, loaded_model, loaded_label_encoder.classes_), 0
+    # enrollment.py ile yayımlanan paketlerde sürüm numarası bulunur
+    return CompiledPipeline.from_flat_forest(arrays), int(arrays.get("model_version", 0))
+
+def _load_serving_pipeline():
+    # _load_pipeline + isteğe bağlı tahmin önbelleği; işçi modunda işçi süreçte çağrılır
+    pipeline, version = _load_pipeline()
+    if PREDICTION_CACHE_SIZE:
+        from prediction_cache import CachedPipeline
+        # Her model kendi (boş) önbelleğiyle gelir; eski modelin sonuçları yeni modelde kullanılmaz
+        pipeline = CachedPipeline(pipeline, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_BUCKETS)
+    return pipeline, version
+
+def _install_pipeline(pipeline, version):
+    # Yeni hattı devreye alır; devam eden oturumlar başladıkları modelle biter (bkz. DeviceSession.start)
+    global compiled_pipeline, label_lookup, session_pipeline, user_templates, model_version
+    # Sayısal etiket -> kullanıcı adı için arama tablosu; satır başına inverse_transform çağrısı yapmamak için
+    label_lookup = pipeline.classes
+    print(f"Yüklenen Label Encoder Sınıfları: {list(label_lookup)}")
+    session_pipeline = _session_forest
+    if session_pipeline is not None and list(session_pipeline.classes) != list(label_lookup):
+        # Artımlı kayıttan sonra oturum modeli yeni kullanıcıları tanımaz; satır oyları kullanılır
+        print("Oturum modelinin sınıfları yüklenen modelden farklı; oturum modeli kullanılmayacak.")
+        session_pipeline = None
+    user_templates = _user_templates
+    if user_templates is not None and list(user_templates.class_names) != list(label_lookup):
+        # Yeni kaydedilen kullanıcıların şablonu yok (bkz. user_templates.py komut satırı)
+        print("Kullanıcı şablonlarının sınıfları yüklenen modelden farklı; bilinmeyen kullanıcı reddi kapalı.")
+        user_templates = None
+    model_version = version
+    compiled_pipeline = pipeline
+
+def load_models():
+    # Model, scaler ve encoder'ı yükle; başarılıysa True döner
+    global compiled_pipeline, _session_forest, _user_templates, _model_stamp
+    try:
+        stamp = _model_files_stamp()
+        if os.path.exists(SESSION_FOREST_FILENAME):
+            from flat_forest import load_forest
+            _session_forest = CompiledPipeline.from_flat_forest(load_forest(SESSION_FOREST_FILENAME))
+            print("Oturum modeli başarıyla yüklendi.")
+        if REJECT_UNKNOWN_USERS or UNKNOWN_THRESHOLD is not None:
+            if os.path.exists(USER_TEMPLATES_FILENAME):
+                from user_templates import UserTemplates, load_templates
+                _user_templates = UserTemplates(load_templates(USER_TEMPLATES_FILENAME), UNKNOWN_THRESHOLD)
+                print(f"Kullanıcı şablonları başarıyla yüklendi (eşik {_user_templates.threshold:.3f}).")
+            else:
+                print(f"Kullanıcı şablonları ({USER_TEMPLATES_FILENAME}) bulunamadı; bilinmeyen kullanıcı reddi kapalı.")
+        if INFERENCE_WORKER:
+            # Model işçi süreçte yüklenir; burada yalnızca vekili (RemotePipeline) kurulur
+            if not _start_worker():
+                return False
+        else:
+            _install_pipeline(*_load_serving_pipeline())
+        _model_stamp = stamp
+        return True
+    except Exception as e:
+        print(f"Model/Scaler/Encoder yüklenirken hata: {e}")
+        print("Lütfen dosyaların doğru yolda olduğundan ve bozuk olmadığından emin olun.")
+        compiled_pipeline = None
+        return False
+
+def _on_worker_model(generation, version, classes):
+    # İşçi bir model kuşağını yükledi; yalnızca en son istenen kuşak devreye alınır
+    from inference_worker import RemotePipeline
+    if generation != _worker.generation:
+        return
+    if compiled_pipeline is not None and compiled_pipeline.generation == generation:
+        # İşçi yeniden başlatıldı ve aynı kuşağı yeniden yükledi
+        return
+    reload = compiled_pipeline is not None
+    _install_pipeline(RemotePipeline(_worker, generation, classes, FEATURE_COUNT), version)
+    if reload:
+        METRICS.count("model_reloads")
+        print(f"Model sürüm {version} devreye alındı.")
+
+def _on_worker_model_error(generation, error):
+    global _worker_failed_generation
+    _worker_failed_generation = generation
+    METRICS.count("model_reload_errors")
+    if compiled_pipeline is not None and compiled_pipeline.generation == generation == _worker.generation:
+        # Yeniden başlatılan işçi kullanılan kuşağı yükleyemedi (ör. dosya o arada değişti): model
+        # dosyası yeni bir kuşak olarak yüklenir; eski kuşaktaki oturumların tahminleri hata alır
+        print(f"İşçi kullanılan modeli (sürüm {model_version}) yeniden yükleyemedi, model yeniden yükleniyor: {error}")
+        _worker.load()
+        return
+    print(f"İşçi modeli yükleyemedi, mevcut model (sürüm {model_version}) kullanılmaya devam ediyor: {error}")
+
+def _start_worker():
+    # İşçi süreci başlatır ve ilk modelin yüklenmesini bekler; başarılıysa True döner. İlk çağrı
+    # işçi başlatıcısını fork eder: ölçüm ve seri iş parçacıkları başlamadan önce (load_models) yapılır
+    global _worker
+    from inference_worker import InferenceWorker
+    if _worker is None:
+        _worker = InferenceWorker(_load_serving_pipeline, FEATURE_COUNT, WORKER_SLOTS, WORKER_SLOT_ROWS)
+        _worker.on_model(_on_worker_model)
+        _worker.on_model_error(_on_worker_model_error)
+        _worker.start()
+        print(f"Tahmin işçi süreci başlatıldı (pid {_worker.pid}).")
+    generation = _worker.load()
+    loaded = _worker.wait(lambda: (compiled_pipeline is not None and compiled_pipeline.generation == generation)
+                          or _worker_failed_generation == generation, WORKER_LOAD_TIMEOUT)
+    return loaded and _worker_failed_generation != generation
+
+def stop_worker():
+    # İşçi süreci kapatır ve paylaşılan belleği bırakır
+    global _worker, compiled_pipeline
+    if _worker is None:
+        return
+    _worker.close()
+    _worker = None
+    compiled_pipeline = None
+
+def _on_worker_ready():
+    # İşçinin sonuç borusu okunabilir: sonuçlar oturumlara eklenir, yuva bekleyen satırlar gönderilir
+    _worker.poll()
+    _flush_pending(list(_devices.values()))
+
+def _model_files_stamp():
+    # Model dosyalarının kimliği: os.replace ile yayımlanan yeni dosyanın inode'u farklıdır
+    stamp = []
+    for path in _model_files():
+        st = os.stat(path)
+        stamp.append((st.st_ino, st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+def _maybe_reload_models():
+    # Model dosyası değiştiyse (ör. enrollment.py yeni sürüm yayımladıysa) yeni modeli yükler.
+    # Seri okuma döngüsü içinde çalışır: okuma durmaz, gelen baytlar çekirdek tamponunda bekler ve
+    # yükleme bitince işlenir. Oturumlar başladıkları modeli tuttuğu için bir oturum asla iki
+    # modelle değerlendirilmez; yeni model bir sonraki oturumdan itibaren kullanılır.
+    global _model_stamp, _next_reload_check
+    if MODEL_RELOAD_INTERVAL is None or compiled_pipeline is None:
+        return
+    current = time.monotonic()
+    if current < _next_reload_check:
+        return
+    _next_reload_check = current + MODEL_RELOAD_INTERVAL
     try:
-        if len(swipe_features_list) != 18: # XGBoost modelinin beklediği özellik sayısı
-            print(f"HATA: Beklenen özellik sayısı 18, alınan: {len(swipe_features_list)}")
-            return None
-        
-        new_data_np = np.array(swipe_features_list).reshape(1, -1)
-        new_data_scaled = loaded_scaler.transform(new_data_np)
-        prediction_encoded = loaded_model.predict(new_data_scaled)
-        predicted_user_label_numeric = prediction_encoded[0]
-        predicted_user_name = loaded_label_encoder.inverse_transform([predicted_user_label_numeric])[0]
-        
-        return predicted_user_name
+        stamp = _model_files_stamp()
+    except OSError:
+        return
+    if stamp == _model_stamp:
+        return
+    # Bozuk dosya her kontrolde yeniden denenmesin; bir sonraki yayında tekrar denenir
+    _model_stamp = stamp
+    if _worker is not None:
+        # Yükleme işçide yapılır; G/Ç süreci beklemez, model hazır olunca _on_worker_model devreye alır
+        _worker.load()
+        return
+    start = now()
+    try:
+        pipeline, version = _load_serving_pipeline()
     except Exception as e:
-        print(f"Tahmin sırasında hata: {e}")
+        METRICS.count("model_reload_errors")
+        print(f"Yeni model yüklenemedi, mevcut model (sürüm {model_version}) kullanılmaya devam ediyor: {e}")
+        return
+    _install_pipeline(pipeline, version)
+    METRICS.observe("model_reload", start)
+    METRICS.count("model_reloads")
+    print(f"Model sürüm {version} devreye alındı.")
+
+def _batch_to_matrix(batch):
+    # Gelen toplu veriyi (N, 18) float matrise çevirir; her satır için ayrı hata durumu tutar
+    if isinstance(batch, np.ndarray):
+        if batch.ndim == 1:
+            batch = batch.reshape(1, -1)
+        if batch.ndim != 2 or batch.shape[1] != FEATURE_COUNT:
+            # Şekil tek seferde kontrol edilir; uymuyorsa tüm satırlar hatalıdır
+            hata = f"HATA: Beklenen özellik sayısı {FEATURE_COUNT}, alınan: {batch.shape[-1]}"
+            METRICS.count("feature_count_mismatch", len(batch))
+            return np.empty((0, FEATURE_COUNT)), [hata] * len(batch)
+        matrix = batch.astype(np.float64, copy=False)
+        errors = [None] * len(matrix)
+    else:
+        rows = list(batch)
+        if rows and all(np.ndim(row) == 0 for row in rows):
+            # Düz özellik listesi tek satırdır (1-D ndarray gibi)
+            rows = [rows]
+        matrix = np.empty((len(rows), FEATURE_COUNT), dtype=np.float64)
+        errors = [None] * len(rows)
+        for i, row in enumerate(rows):
+            try:
+                if np.ndim(row) != 1 or len(row) != FEATURE_COUNT:
+                    alinan = len(row) if np.ndim(row) == 1 else "sıra olmayan değer"
+                    errors[i] = f"HATA: Beklenen özellik sayısı {FEATURE_COUNT}, alınan: {alinan}"
+                    METRICS.count("feature_count_mismatch")
+                    continue
+                matrix[i] = row
+            except (TypeError, ValueError):
+                errors[i] = "HATA: Gelen veri sayısal değerlere çevrilemedi."
+
+    # Hatalı satırlar ve NaN/inf içeren satırlar tahmine girmez
+    finite = np.isfinite(matrix).all(axis=1)
+    for i in np.flatnonzero(~finite):
+        if errors[i] is None:
+            METRICS.count("non_finite_rows")
+            errors[i] = "HATA: Özelliklerde sayısal olmayan (NaN/inf) değer var."
+    return matrix, errors
+
+def predict_users(batch):
+    # Toplu tahmin: (N, 18) dizi veya özellik listelerinden oluşan iterable alır.
+    # Her satır için (kullanıcı_adı, hata) döner; başarılı satırlarda hata None'dır.
+    if compiled_pipeline is None and not load_models():
+        hata = "Model, scaler veya encoder yüklenemedi. Tahmin yapılamıyor."
+        return [(None, hata) for _ in batch]
+
+    matrix, errors = _batch_to_matrix(batch)
+    valid = np.array([e is None for e in errors], dtype=bool)
+    results = [(None, e) for e in errors]
+    if not valid.any():
+        return results
+
+    try:
+        # Ölçekleme ve tahmin tüm geçerli satırlar için tek çağrıda yapılır
+        names = compiled_pipeline.predict(matrix if valid.all() else matrix[valid])
+    except Exception as e:
+        hata = f"Tahmin sırasında hata: {e}"
+        for i in np.flatnonzero(valid):
+            results[i] = (None, hata)
+        return results
+
+    for i, name in zip(np.flatnonzero(valid), names):
+        results[i] = (name, None)
+    return results
+
+def predict_user(swipe_features_list):
+    predicted_user_name, hata = predict_users([swipe_features_list])[0]
+    if hata:
+        print(hata)
         return None
+    return predicted_user_name
+
+class DeviceSession:
+    # Bir cihazın (swipe panelinin) durumu: aynı okumada gelen ve henüz tahmin edilmemiş DATA satırları,
+    # oturumun oyları/özellikleri ve erken karar. Tek cihazlı modda device_id None'dır.
+
+    def __init__(self, device_id=None):
+        self.device_id = device_id
+        self.prefix = f"[{device_id}] " if device_id is not None else ""
+        self.pending = []
+        self.pipeline = None
+        self.labels = None
+        self.aggregator = None
+        self.decider = None
+        # İşçi modu: işçideki yuva sayısı, sonuçlar gelince bitirilecek oturum ve oturum numarası;
+        # closing: CMD:DATA_SENT'i gelmiş ama sonuçları işçide olan önceki oturumlar (numara -> oturum)
+        self.in_flight = 0
+        self.finish_requested = False
+        self.session_id = 0
+        self.closing = {}
+
+    def start(self):
+        # Oturum o anki modelle başlar; model oturum ortasında değişse de oturum bu modelle biter
+        self.session_id += 1
+        self.in_flight = 0
+        self.pipeline = compiled_pipeline
+        self.labels = label_lookup
+        n_classes = len(self.labels)
+        if self.aggregator is None or len(self.aggregator.votes) != n_classes:
+            self.aggregator = SessionAggregator(n_classes)
+            self.decider = None
+            if EARLY_EXIT_MARGIN is not None:
+                self.decider = AnytimeDecider(n_classes, margin=EARLY_EXIT_MARGIN, min_samples=EARLY_EXIT_MIN_SAMPLES)
+        else:
+            self.aggregator.reset()
+            if self.decider is not None:
+                self.decider.reset()
+
+    def end(self):
+        self.pipeline = None
+
+    def detach(self):
+        # İşçi modu: sonuçları beklenen oturum ayrı bir nesneye taşınır ve kararını sonuçlar gelince
+        # verir; cihaz yeni oturuma beklemeden başlar (seri okuma durmaz)
+        closing = copy.copy(self)
+        self.closing[closing.session_id] = closing
+        self.pending = []
+        self.aggregator = None
+        self.decider = None
+        self.pipeline = None
+        self.in_flight = 0
+        self.finish_requested = False
+        return closing
+
+# Cihaz kimliği -> DeviceSession
+_devices = {}
+
+def _device(device_id=None):
+    state = _devices.get(device_id)
+    if state is None:
+        state = _devices[device_id] = DeviceSession(device_id)
+    return state
+
+def _session_rows(state):
+    # Bekleyen satırları doğrulayıp kuyruğu boşaltır; geçerli (k, 18) satırları döner
+    matrix, errors = _batch_to_matrix(state.pending)
+    state.pending.clear()
+    for hata in set(e for e in errors if e is not None):
+        print(state.prefix + hata)
+    valid = np.array([e is None for e in errors], dtype=bool)
+    return matrix if valid.all() else matrix[valid]
+
+def _rejected_by_templates(state, encoded):
+    # Şablonlar etkinse oturumun şu ana kadarki özellikleri encoded kullanıcının şablonundan eşikten uzak mı;
+    # (ret, uzaklık) döner
+    if user_templates is None or state.pipeline is not compiled_pipeline:
+        return False, None
+    known, score = user_templates.check(state.aggregator.features(), encoded)
+    return not known[0], score[0]
+
+def _add_to_session(state, rows, scores):
+    # scores: olasılık matrisi (erken karar açıkken) veya sayısal etiketler
+    if scores.ndim == 2:
+        # Satır oyu aynı olasılıkların argmax'ıdır
+        state.aggregator.add_votes(np.argmax(scores, axis=1))
+        early_decision = state.decider.update(scores)
+    else:
+        state.aggregator.add_votes(scores)
+        early_decision = False
+    state.aggregator.update(rows)
+    if not QUIET:
+        print(f"{state.prefix}{len(rows)} swipe verisi oturuma eklendi (toplam {state.aggregator.count}).")
+    if early_decision:
+        rejected, score = _rejected_by_templates(state, state.decider.decision)
+        if rejected:
+            # Karar oturum sonunda tüm satırlarla verilir (kayıtlı değilse "unknown")
+            if not QUIET:
+                print(f"{state.prefix}Erken karar şablon kontrolünden geçmedi (uzaklık {score:.2f}); oturum sonu bekleniyor.")
+            return
+        print(f"\n>>> {state.prefix}ERKEN TAHMİN: Bu kaydırma işlemini yapan kişi {state.labels[state.decider.decision]}! "
+              f"({state.decider.decided_after} örnekte, margin {state.decider.decision_margin:.1f})\n")
+
+def _update_sessions(states):
+    # Oturum modu: cihazların bekleyen satırları ortak model örneğinden tek toplu çağrıda geçer,
+    # sonuçlar satır sayılarına göre bölünüp her cihazın oturumuna eklenir (örnek başına sabit bellek)
+    if compiled_pipeline is None and not load_models():
+        print("Model, scaler veya encoder yüklenemedi. Tahmin yapılamıyor.")
+        for state in states:
+            state.pending.clear()
+        return
+    if _worker is not None:
+        _submit_sessions(states)
+        return
+    groups = {}
+    for state in states:
+        if not state.pending:
+            continue
+        if state.pipeline is None:
+            state.start()
+        rows = _session_rows(state)
+        if len(rows):
+            # Model oturum ortasında değiştiyse eski ve yeni oturumlar ayrı gruplarda hesaplanır
+            groups.setdefault(id(state.pipeline), []).append((state, rows))
+
+    for members in groups.values():
+        pipeline = members[0][0].pipeline
+        rows = members[0][1] if len(members) == 1 else np.vstack([member_rows for _, member_rows in members])
+        try:
+            if any(state.decider is not None and not state.decider.decided for state, _ in members):
+                # Olasılıklar bir kez hesaplanır; erken kararı olmayan cihazlar da argmax'ı oy olarak kullanır
+                scores = pipeline.predict_proba(rows)
+                needs_proba = True
+            else:
+                scores = pipeline.predict_encoded(rows)
+                needs_proba = False
+        except Exception as e:
+            print(f"Tahmin sırasında hata: {e}")
+            continue
+        METRICS.count("inference_calls")
+        METRICS.count("inference_rows", len(rows))
+        offset = 0
+        for state, state_rows in members:
+            part = scores[offset:offset + len(state_rows)]
+            offset += len(state_rows)
+            if needs_proba and (state.decider is None or state.decider.decided):
+                part = np.argmax(part, axis=1)
+            try:
+                _add_to_session(state, state_rows, part)
+            except Exception as e:
+                print(f"{state.prefix}Tahmin sırasında hata: {e}")
+
+def _worker_chunks(members):
+    # [(cihaz, satırlar)] -> yuva başına en fazla WORKER_SLOT_ROWS satırlık [(cihaz, satırlar)] listeleri
+    chunks, parts, size = [], [], 0
+    for state, rows in members:
+        start = 0
+        while start < len(rows):
+            take = min(len(rows) - start, WORKER_SLOT_ROWS - size)
+            parts.append((state, rows[start:start + take]))
+            size += take
+            start += take
+            if size == WORKER_SLOT_ROWS:
+                chunks.append(parts)
+                parts, size = [], 0
+    if parts:
+        chunks.append(parts)
+    return chunks
+
+def _submit_sessions(states):
+    # İşçi modu: _update_sessions ile aynı gruplama, ama tahmin beklenmez; sonuçlar _on_session_scores'a gelir.
+    # Kapanmaya ayrılmış oturumların bekleyen satırları cihazın yeni oturumundan önce gönderilir
+    states = list({id(session): session for state in states
+                   for session in [*state.closing.values(), state]}.values())
+    groups = {}
+    for state in states:
+        if not state.pending:
+            continue
+        if state.pipeline is None:
+            state.start()
+        groups.setdefault(id(state.pipeline), []).append(state)
+
+    for members in groups.values():
+        pipeline = members[0].pipeline
+        want_proba = any(state.decider is not None and not state.decider.decided for state in members)
+        chunks = _worker_chunks([(state, _session_rows(state)) for state in members])
+        for i, parts in enumerate(chunks):
+            rows = parts[0][1] if len(parts) == 1 else np.vstack([part for _, part in parts])
+            tagged = [(state, state.session_id, part) for state, part in parts]
+            # İşçi meşgulken eksik yuvalar gönderilmez: satırlar birikir ve sonuç gelince tek çağrıda
+            # tahmin edilir (döngü içi tahmindeki doğal toplu çalışma gibi; satır başına çağrı yükü olmaz)
+            if ((len(rows) < WORKER_SLOT_ROWS and _worker.in_flight)
+                    or not _worker.submit(rows, pipeline.generation, want_proba, partial(_on_session_scores, tagged, want_proba))):
+                # Boş yuva yok: kalan satırlar sırası korunarak kuyruğa döner, bir sonuç gelince yeniden denenir
+                for remaining in reversed(chunks[i:]):
+                    for state, part in reversed(remaining):
+                        state.pending[0:0] = list(part)
+                break
+            for state, _ in parts:
+                state.in_flight += 1
+
+    for state in states:
+        excess = len(state.pending) - MAX_PENDING_ROWS
+        if excess > 0:
+            # İşçi yetişemiyor: bellek sınırlı kalsın diye en eski satırlar atılır
+            del state.pending[:excess]
+            METRICS.count("inference_rows_dropped", excess)
+            print(f"{state.prefix}UYARI: Tahmin kuyruğu dolu, en eski {excess} satır atıldı.")
+        _maybe_finish_session(state)
+
+def _on_session_scores(tagged, want_proba, scores, error):
+    # İşçiden gelen bir yuvanın sonuçları: satır sayılarına göre bölünüp cihazların oturumlarına eklenir
+    if error is None:
+        METRICS.count("inference_calls")
+        METRICS.count("inference_rows", len(scores))
+    offset = 0
+    finished = {}
+    for state, session_id, rows in tagged:
+        part = None if error is not None else scores[offset:offset + len(rows)]
+        offset += len(rows)
+        # Oturum bu arada kapanmaya ayrıldıysa sonuç oraya gider; yeniden başlamış/atılmışsa yok sayılır
+        state = state.closing.get(session_id) or (state if state.session_id == session_id else None)
+        if state is None or state.pipeline is None:
+            continue
+        state.in_flight -= 1
+        finished[id(state)] = state
+        if error is not None:
+            print(f"{state.prefix}Tahmin sırasında hata: {error}")
+            continue
+        if want_proba and (state.decider is None or state.decider.decided):
+            part = np.argmax(part, axis=1)
+        try:
+            _add_to_session(state, rows, part)
+        except Exception as e:
+            print(f"{state.prefix}Tahmin sırasında hata: {e}")
+    for state in finished.values():
+        _maybe_finish_session(state)
+
+def _maybe_finish_session(state):
+    # CMD:DATA_SENT geldiyse ve oturumun tüm satırları işçiden döndüyse karar yazdırılır
+    if state.finish_requested and not state.in_flight and not state.pending:
+        state.finish_requested = False
+        if state.closing.get(state.session_id) is state:
+            del state.closing[state.session_id]
+        _finish_session(state)
+
+
+def _finish_session(state):
+    # CMD:DATA_SENT: oturum için tek karar; oturum modeli varsa o, yoksa satır oylarının çoğunluğu
+    if state.aggregator is None or state.pipeline is None:
+        print(f">>> {state.prefix}TAHMİN: Oturumda geçerli swipe verisi yok, kullanıcı tanımlanamadı.\n")
+        return
+    labels = state.labels
+    winner, winner_votes, total_votes = state.aggregator.vote()
+    if total_votes == 0:
+        print(f">>> {state.prefix}TAHMİN: Oturumda geçerli swipe verisi yok, kullanıcı tanımlanamadı.\n")
+        state.end()
+        return
+    print(f"{state.prefix}Satır oyları: {labels[winner]} ({winner_votes}/{total_votes})")
+    predicted = winner
+    if session_pipeline is not None and state.pipeline is compiled_pipeline:
+        try:
+            # Oturum modelinin sınıfları yüklenen modelinkiyle aynıdır (bkz. _install_pipeline)
+            predicted = int(session_pipeline.predict_encoded(state.aggregator.features())[0])
+        except Exception as e:
+            print(f"Oturum modeli tahmini sırasında hata: {e}; satır oyları kullanılıyor.")
+    predicted_user = labels[predicted]
+    rejected, score = _rejected_by_templates(state, predicted)
+    if rejected:
+        METRICS.count("unknown_user_rejections")
+        print(f"{state.prefix}Şablon uzaklığı {score:.2f} > eşik {user_templates.threshold:.2f} "
+              f"(en yakın kullanıcı {predicted_user})")
+        predicted_user = UNKNOWN_USER_LABEL
+    if state.decider is not None and state.decider.decided:
+        print(f"{state.prefix}Erken karar {state.decider.decided_after} örnekte verilmişti: "
+              f"{labels[state.decider.decision]}")
+    print(f"\n>>> {state.prefix}TAHMİN: Bu kaydırma işlemini yapan kişi {predicted_user}!\n")
+    state.end()
+
+def _flush_pending(states):
+    if SESSION_MODE:
+        _update_sessions(states)
+        return
+    for state in states:
+        if not state.pending:
+            continue
+        if not QUIET:
+            print(f"{state.prefix}{len(state.pending)} swipe verisi alındı, tahmin yapılıyor...")
+        for predicted_user, hata in predict_users(state.pending):
+            if hata:
+                print(state.prefix + hata)
+            if predicted_user:
+                print(f"\n>>> {state.prefix}TAHMİN: Bu kaydırma işlemini yapan kişi {predicted_user}!\n")
+            else:
+                print(f">>> {state.prefix}TAHMİN: Kullanıcı tanımlanamadı.\n")
+        state.pending.clear()
+
+def _flush_all():
+    # Çok cihazlı mod: bir uyanmada okunan tüm cihazların satırları birlikte tahmin edilir
+    _flush_pending(list(_devices.values()))
+
+def _on_line(state, line):
+    # Komut satırlarından önce bekleyen DATA: satırları değerlendirilir; çıktı sırası korunur
+    if not line.startswith("DATA:"):
+        _flush_pending([state])
+
+def _log_line(state, line):
+    print(f"{state.prefix}ESP32'den alındı: '{line}'")
+
+def _on_start_swipe(state, line):
+    print(f"{state.prefix}Swipe taraması başlatıldı, veri bekleniyor...")
+    if _worker is not None and state.finish_requested:
+        state.detach()
+    # Yeni sürüm yayımlandıysa oturum başlamadan devreye alınır
+    _maybe_reload_models()
+    if compiled_pipeline is not None:
+        state.start()
+
+def _on_data(state, line):
+    start = now()
+    feature_string = line.split("DATA:", 1)[1]
+    try:
+        # Özellikleri float'a çevir (XGBoost genellikle float bekler)
+        swipe_features = [float(val) for val in feature_string.split(',')]
+    except ValueError:
+        METRICS.count("malformed_lines")
+        print(f"{state.prefix}HATA: Gelen veri sayısal değerlere çevrilemedi.")
+        print(f"Sorunlu veri: {feature_string}")
+        return
+    METRICS.observe("parse", start)
+    state.pending.append(swipe_features)
+
+def _on_data_frame(state, frame):
+    # İkili DATA çerçeveleri: metin ayrıştırma/float dönüşümü yok, (k, 18) dizi doğrudan kuyruğa eklenir
+    if not QUIET:
+        print(f"{state.prefix}ESP32'den {len(frame.data)} ikili DATA çerçevesi alındı.")
+    METRICS.count("binary_data_rows", len(frame.data))
+    state.pending.extend(frame.data)
+
+def _on_wire_ack(state, line):
+    print(f"{state.prefix}ESP32 ikili çerçeve formatına geçti.")
+
+def _on_data_sent(state, line):
+    print(f"{state.prefix}ESP32 veri gönderimini tamamladığını bildirdi.")
+    # Bekleyen DATA: satırları _on_line'da bu satırdan önce işlenmiştir
+    if SESSION_MODE and _worker is not None:
+        # İşçi modunda satırlar henüz işçide olabilir; karar son sonuç gelince yazdırılır
+        state.finish_requested = True
+        _maybe_finish_session(state)
+    elif SESSION_MODE:
+        _finish_session(state)
+
+def _on_handler_error(line, e):
+    print(f"Seri okuma/işleme sırasında beklenmedik hata: {e}")
+
+def register_handlers(reader, state=None, batch_end=True):
+    # ESP32 protokolündeki komutlar için işleyicileri okuyucuya kaydeder.
+    # state: cihazın DeviceSession'ı; batch_end=False ise bekleyen satırlar okuyucu yerine
+    # MultiDeviceReader'ın ortak toplu tahmininde (_flush_all) değerlendirilir
+    if state is None:
+        state = _device()
+    reader.on_line(partial(_on_line, state))
+    if not QUIET:
+        # Sessiz modda bu kanca hiç kaydedilmez; satır başına print sıcak yoldan tamamen çıkar
+        reader.on_line(partial(_log_line, state))
+    reader.on("CMD:START_SWIPE", partial(_on_start_swipe, state))
+    reader.on_prefix("DATA:", partial(_on_data, state))
+    reader.on("CMD:DATA_SENT", partial(_on_data_sent, state))
+    reader.on_frame(FRAME_DATA, partial(_on_data_frame, state))
+    reader.on(WIRE_ACK, partial(_on_wire_ack, state))
+    if batch_end:
+        reader.on_batch_end(partial(_flush_pending, [state]))
+        reader.on_batch_end(_maybe_reload_models)
+    reader.on_error(_on_handler_error)
+
+def _setup_device(device_id, port):
+    # MultiDeviceReader bir cihazı (yeniden) açtığında çağrılır; yarım kalmış oturum atılır
+    from serial_reader import SerialLineReader
+    state = _device(device_id)
+    state.pending.clear()
+    state.finish_requested = False
+    state.closing.clear()
+    state.end()
+    reader = SerialLineReader(port, framer=WireFramer())
+    register_handlers(reader, state, batch_end=False)
+    port.write(WIRE_HELLO)
+    return reader
+
+def _on_device_connect(device_id):
+    print(f"[{device_id}] {SERIAL_PORT_DEVICES[device_id]} açıldı, ESP32'den komut bekleniyor...")
+
+def _on_device_disconnect(device_id, reason):
+    print(f"[{device_id}] Bağlantı kapandı ({reason}); {DEVICE_RECONNECT_INTERVAL} s sonra yeniden denenecek.")
+
+def run_devices():
+    # Çok cihazlı mod: tüm portlar tek seçici döngüsünde; tahmin tek model örneğinde toplu yapılır
+    import serial
+    from serial_reader import MultiDeviceReader
+    print(f"{len(SERIAL_PORT_DEVICES)} cihaz dinleniyor: {', '.join(SERIAL_PORT_DEVICES)}")
+    reader = MultiDeviceReader(SERIAL_PORT_DEVICES, lambda path: serial.Serial(path, BAUD_RATE, timeout=1),
+                               _setup_device, reconnect_interval=DEVICE_RECONNECT_INTERVAL)
+    reader.on_connect(_on_device_connect)
+    reader.on_disconnect(_on_device_disconnect)
+    reader.on_batch_end(_flush_all)
+    reader.on_batch_end(_maybe_reload_models)
+    if _worker is not None:
+        reader.watch(_worker.fileno(), _on_worker_ready)
+    try:
+        reader.run()
+    finally:
+        reader.close()
 
 def main():
     ser = None
     print("--- BeagleBone Black - Swipe Tahmin Sistemi ---")
-    print(f"Seri port açılmaya çalışılıyor: {SERIAL_PORT_DEVICE}")
 
-    if not all([os.path.exists(f) for f in [MODEL_FILENAME, SCALER_FILENAME, ENCODER_FILENAME]]):
+    if not all([os.path.exists(f) for f in _model_files()]):
         print("Model, scaler veya encoder dosyalarından biri bulunamadı. Lütfen yolları kontrol edin.")
         return
 
+    import serial
+    from serial_reader import SerialLineReader
+    reader = None
+    if METRICS_PORT:
+        METRICS.start_http_server(METRICS_PORT)
+        print(f"Ölçümler http://127.0.0.1:{METRICS_PORT}/metrics adresinde.")
+    if METRICS_SNAPSHOT_FILE:
+        METRICS.start_snapshot_writer(METRICS_SNAPSHOT_FILE, METRICS_SNAPSHOT_INTERVAL)
     try:
+        if SERIAL_PORT_DEVICES:
+            run_devices()
+            return
+        print(f"Seri port açılmaya çalışılıyor: {SERIAL_PORT_DEVICE}")
         ser = serial.Serial(SERIAL_PORT_DEVICE, BAUD_RATE, timeout=1)
         print(f"{SERIAL_PORT_DEVICE} başarıyla açıldı.")
         print("ESP32'den komut bekleniyor...")
 
-        while True:
-            if ser.in_waiting > 0:
-                try:
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        print(f"ESP32'den alındı: '{line}'")
-                        
-                        if line == "CMD:START_SWIPE":
-                            print("Swipe taraması başlatıldı, veri bekleniyor...")
-                        elif line.startswith("DATA:"):
-                            print("Swipe verisi alındı, tahmin yapılıyor...")
-                            feature_string = line.split("DATA:", 1)[1]
-                            try:
-                                # Özellikleri float'a çevir (XGBoost genellikle float bekler)
-                                swipe_features = [float(val) for val in feature_string.split(',')]
-                                
-                                predicted_user = predict_user(swipe_features)
-                                if predicted_user:
-                                    print(f"\n>>> TAHMİN: Bu kaydırma işlemini yapan kişi {predicted_user}!\n")
-                                else:
-                                    print(">>> TAHMİN: Kullanıcı tanımlanamadı.\n")
-
-                            except ValueError:
-                                print("HATA: Gelen veri sayısal değerlere çevrilemedi.")
-                                print(f"Sorunlu veri: {feature_string}")
-                            except Exception as e_parse:
-                                print(f"Veri işlenirken hata: {e_parse}")
-
-                        elif line == "CMD:DATA_SENT":
-                            print("ESP32 veri gönderimini tamamladığını bildirdi.")
-                except serial.SerialException as se:
-                    print(f"Seri port hatası: {se}")
-                    break 
-                except UnicodeDecodeError:
-                    print("Seri porttan okurken Unicode decode hatası.")
-                except Exception as e_read:
-                    print(f"Seri okuma/işleme sırasında beklenmedik hata: {e_read}")
-            
-            time.sleep(0.05)
+        # Seri port dosya tanımlayıcısı üzerinde bloklanarak beklenir (poll/sleep yok);
+        # bağlantı koptuktan sonra biriken satırlar tek okumada toplu olarak işlenir
+        # Metin satırları ve ikili çerçeveler aynı akışta kabul edilir; ESP32 ikili formatı
+        # destekliyorsa WIRE_HELLO'ya yanıt verip geçer, desteklemiyorsa metin formatı sürer
+        reader = SerialLineReader(ser, framer=WireFramer())
+        register_handlers(reader)
+        if _worker is not None:
+            reader.watch(_worker.fileno(), _on_worker_ready)
+        ser.write(WIRE_HELLO)
+        if reader.run() == "eof":
+            print("Seri port bağlantısı kapandı.")
 
     except serial.SerialException as e:
         print(f"Seri port ({SERIAL_PORT_DEVICE}) açılamadı: {e}")
+    except OSError as e:
+        print(f"Seri port hatası: {e}")
     except KeyboardInterrupt:
         print("\nProgram kullanıcı tarafından sonlandırıldı.")
     finally:
+        if reader:
+            reader.close()
         if ser and ser.is_open:
             ser.close()
             print("Seri port kapatıldı.")
+        METRICS.stop(METRICS_SNAPSHOT_FILE)
         print("Sistem kapatılıyor.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="BeagleBone Black swipe tahmin sistemi.")
+    parser.add_argument("--quiet", action="store_true", help="Satır başına çıktıları kapat; yalnızca kararları yazdır")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Yerel HTTP ölçüm portu")
+    parser.add_argument("--metrics-file", default=METRICS_SNAPSHOT_FILE, help="Periyodik ölçüm anlık görüntü dosyası")
+    parser.add_argument("--device", action="append", metavar="KİMLİK=PORT",
+                        help="Çok cihazlı mod için seri port (tekrarlanabilir), örn. panel1=/dev/rfcomm0")
+    parser.add_argument("--prediction-cache", type=int, default=PREDICTION_CACHE_SIZE, metavar="KAYIT",
+                        help="Tahmin önbelleğinin en fazla kayıt sayısı (verilmezse kapalı)")
+    parser.add_argument("--inference-worker", action="store_true", default=INFERENCE_WORKER,
+                        help="Tahmini ayrı bir işçi süreçte çalıştır (seri okuma tahmin sırasında durmaz)")
+    parser.add_argument("--reject-unknown", action="store_true", default=REJECT_UNKNOWN_USERS,
+                        help="Kullanıcı şablonlarından uzak oturumları 'unknown' olarak reddet")
+    parser.add_argument("--unknown-threshold", type=float, default=UNKNOWN_THRESHOLD,
+                        help="Şablon uzaklığı eşiği (verilirse ret açılır; varsayılan dosyadaki eşik)")
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    if loaded_model:
-        main()
+    args = parse_args()
+    QUIET = QUIET or args.quiet
+    METRICS_PORT = args.metrics_port
+    METRICS_SNAPSHOT_FILE = args.metrics_file
+    PREDICTION_CACHE_SIZE = args.prediction_cache
+    INFERENCE_WORKER = args.inference_worker
+    REJECT_UNKNOWN_USERS = args.reject_unknown
+    UNKNOWN_THRESHOLD = args.unknown_threshold
+    if args.device:
+        SERIAL_PORT_DEVICES = dict(device.split("=", 1) for device in args.device)
+    if load_models():
+        try:
+            main()
+        finally:
+            stop_worker()
     else:
         print("Model yüklenemediği için program başlatılamıyor.")
\ No newline at end of file
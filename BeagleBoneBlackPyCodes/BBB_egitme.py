@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import os
 
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
@@ -22,10 +23,28 @@ column_names = [
     "durationT9", "durationT8", "durationT7", "durationT0", "durationT2", "durationT3", "durationT6", "durationT5", "durationT4"
 ]
 
+# column_store.py ile oluşturulmuş sütunlu depo varsa CSV yerine o kullanılır
+# (python column_store.py veriseti.csv veriseti_store; gateway COLUMN_STORE_DIR ile de ekler)
+DATASET_STORE = "veriseti_store"
+
 try:
-    # CSV'yi oku, ilk satırı (ESP32 başlığı) atla ve kendi sütun isimlerimizi ver.
-    df = pd.read_csv("veriseti.csv", header=None, skiprows=1, names=column_names)
-    print("Veriseti başarıyla yüklendi ve sütun isimleri atandı.")
+    if os.path.isdir(DATASET_STORE):
+        from column_store import decode_ids, load_store
+        # Sütun dosyaları belleğe eşlenir (mmap); metin ayrıştırma yok. DataFrame oluşturulurken sütunlar
+        # bir kez belleğe kopyalanır (satır başına ~40 bayt int16/uint32; CSV metninin ayrıştırılmasına
+        # göre küçük); eğitim kodunun geri kalanı pandas üzerinden çalıştığı için bu kopya tutulur
+        store_columns, store_meta = load_store(DATASET_STORE)
+        store_users, store_trials = decode_ids(store_columns, store_meta)
+        df = pd.DataFrame({name: store_columns[name] for name in column_names[1:]})
+        df.insert(0, "user_trial", store_trials)
+        print(f"Veriseti sütunlu depodan yüklendi: {DATASET_STORE} ({store_meta['rows']} satır).")
+    else:
+        # CSV'yi oku, ilk satırı (ESP32 başlığı) atla ve kendi sütun isimlerimizi ver.
+        # Çok cihazlı gateway satırların sonuna cihaz kimliği ekler; usecols ile o sütun atlanır.
+        df = pd.read_csv("veriseti.csv", header=None, skiprows=1, names=column_names,
+                         usecols=range(len(column_names)))
+        store_users = None
+        print("Veriseti başarıyla yüklendi ve sütun isimleri atandı.")
 except FileNotFoundError:
     print("HATA: 'veriseti.csv' dosyası bulunamadı. Lütfen dosyanın doğru klasörde olduğundan emin olun.")
     df = None
@@ -47,7 +66,10 @@ else:
 if df is not None:
     try:
         # 'user_trial' sütunundan sadece kullanıcı ID'sini (örn: "User0") ayıklayalım
-        df['UserID'] = df['user_trial'].apply(lambda x: str(x).split('.')[0])
+        if store_users is not None:
+            df['UserID'] = store_users  # depoda sözlükle kodlanmış; satır başına bölme yok
+        else:
+            df['UserID'] = df['user_trial'].astype(str).str.split('.', n=1).str[0]
         print("'UserID' sütunu başarıyla oluşturuldu.")
 
         print("\nBenzersiz UserID değerleri ve sayıları:")
@@ -181,6 +203,141 @@ else:
     print("Lütfen önceki hücrelerin doğru çalıştığından emin olun.")
 
 
+# Derlenmiş scaler + model hattının sklearn yolu ile birebir aynı sonucu verdiğini kontrol edelim
+from compiled_pipeline import CompiledPipeline
+
+if 'rf_model' in locals() and 'scaler' in locals():
+    compiled_pipeline = CompiledPipeline.from_sklearn(scaler, rf_model, label_encoder.classes_)
+    X_all = X.to_numpy(dtype=np.float64)
+    sklearn_pred = rf_model.predict(scaler.transform(X))
+    compiled_pred = compiled_pipeline.predict_encoded(X_all)
+    mismatch = int(np.count_nonzero(sklearn_pred != compiled_pred))
+    if mismatch == 0:
+        print(f"Derlenmiş hat tüm {len(X_all)} satırda sklearn tahminleriyle birebir eşleşiyor.")
+    else:
+        print(f"UYARI: Derlenmiş hat {mismatch} satırda sklearn tahminlerinden farklı!")
+
+
+# Modeli yalnızca numpy ile çalışan düz dizilere aktaralım (BBBPredict'te INFERENCE_ENGINE = "numpy")
+from flat_forest import FlatForest, export_forest, save_forest
+from model_bundle import save_bundle
+
+if 'rf_model' in locals() and 'scaler' in locals() and 'label_encoder' in locals():
+    try:
+        forest_filename = 'flat_forest.npz'
+        forest_arrays = export_forest(rf_model, scaler, label_encoder.classes_)
+        save_forest(forest_filename, forest_arrays)
+        print(f"Düzleştirilmiş orman '{forest_filename}' olarak kaydedildi "
+              f"({len(forest_arrays['roots'])} ağaç, {len(forest_arrays['feature'])} düğüm).")
+
+        # Aynı diziler BBB'de hızlı açılış için tek dosyalık pakete de yazılır (INFERENCE_ENGINE = "bundle")
+        # Yeni kullanıcılar sonradan bu pakete enrollment.py ile yeniden eğitim yapmadan eklenebilir
+        bundle_filename = 'swipe_model.bundle.npy'
+        save_bundle(bundle_filename, forest_arrays)
+        print(f"Model paketi '{bundle_filename}' olarak kaydedildi.")
+
+        # Parite testi: numpy değerlendirici rf_model.predict ile aynı sonucu vermeli
+        flat_forest = FlatForest(forest_arrays)
+        for set_name, X_check in [("Test seti", X_test_scaled), ("Tüm veri seti", scaler.transform(X))]:
+            mismatch = int(np.count_nonzero(flat_forest.predict(X_check) != rf_model.predict(X_check)))
+            if mismatch == 0:
+                print(f"{set_name}: numpy orman tüm {len(X_check)} satırda rf_model.predict ile eşleşiyor.")
+            else:
+                print(f"UYARI: {set_name}: numpy orman {mismatch}/{len(X_check)} satırda rf_model.predict'ten farklı!")
+    except Exception as e:
+        print(f"Düzleştirilmiş orman dışa aktarılırken hata: {e}")
+
+
+# Düşük bellek için nicemlenmiş paket (BBBPredict'te INFERENCE_ENGINE = "quantized"):
+# scaler int16 eşiklere katlanır, yaprak olasılıkları uint8'e nicemlenir (bkz. quantized_forest.py)
+from quantized_forest import QuantizedPipeline, model_nbytes, quantize_forest
+
+if 'forest_arrays' in locals():
+    try:
+        quantized_arrays = quantize_forest(forest_arrays)
+        quantized_filename = 'swipe_model.quantized.npy'
+        save_bundle(quantized_filename, quantized_arrays)
+        print(f"Nicemlenmiş model '{quantized_filename}' olarak kaydedildi "
+              f"({model_nbytes(forest_arrays) / 2**20:.1f} MB -> {model_nbytes(quantized_arrays) / 2**20:.1f} MB).")
+
+        # Nicemleme kayıplı olabilir: float model ile uyum ve test doğruluğu farkı raporlanır
+        quantized_pipeline = QuantizedPipeline(quantized_arrays)
+        quantized_pred = quantized_pipeline.predict_encoded(X_test.to_numpy())
+        float_pred = rf_model.predict(X_test_scaled)
+        agreement = float(np.mean(quantized_pred == float_pred))
+        print(f"Nicemlenmiş model test setinde float modelle %{agreement * 100:.2f} uyumlu; doğruluk "
+              f"{accuracy_score(y_test, quantized_pred):.4f} (float: {accuracy_score(y_test, float_pred):.4f}).")
+    except Exception as e:
+        print(f"Nicemlenmiş model oluşturulurken hata: {e}")
+
+
+# --- Oturum (swipe) düzeyinde model ---
+# Her user_trial tek bir özellik satırına indirgenir; BBBPredict her swipe için tek karar verir
+from session_features import SessionAggregator, build_session_features
+
+if df is not None and 'label_encoder' in locals():
+    try:
+        # BBB'ye gelen DATA: satırlarında zaman damgası yok; aynı hesap için zaman örnek indeksinden türetilir
+        session_df = build_session_features(df, time_column=None)
+        session_users = session_df.index.to_series().str.split('.').str[0]
+        y_session = label_encoder.transform(session_users)
+        print(f"\n{len(session_df)} oturum, {session_df.shape[1]} oturum özelliği oluşturuldu.")
+
+        # Bölme oturum bazında yapılır; aynı swipe'ın satırları hem eğitimde hem testte olmaz
+        S_train, S_test, ys_train, ys_test = train_test_split(
+            session_df, y_session, test_size=0.2, random_state=42, stratify=y_session)
+        session_scaler = StandardScaler()
+        S_train_scaled = session_scaler.fit_transform(S_train)
+        S_test_scaled = session_scaler.transform(S_test)
+
+        session_model = RandomForestClassifier(random_state=42, n_jobs=-1, n_estimators=100)
+        session_model.fit(S_train_scaled, ys_train)
+        accuracy_session = accuracy_score(ys_test, session_model.predict(S_test_scaled))
+        print(f"Oturum modeli doğruluğu (test oturumları): {accuracy_session:.4f}")
+
+        # Aynı test oturumlarında satır modelinin çoğunluk oyu (satır modeli satır bazında bölündüğü
+        # için bu oturumların bazı satırlarını eğitimde görmüştür; karşılaştırma iyimserdir)
+        aggregator = SessionAggregator(len(label_encoder.classes_))
+        vote_correct = 0
+        stream_mismatch = 0
+        test_rows = df[df['user_trial'].isin(S_test.index)]
+        for session_name, rows in test_rows.groupby('user_trial', sort=False):
+            aggregator.reset()
+            row_features = rows[X.columns].to_numpy(dtype=np.float64)
+            aggregator.update(row_features)
+            aggregator.add_votes(compiled_pipeline.predict_encoded(row_features))
+            winner, _, _ = aggregator.vote()
+            vote_correct += int(winner == label_encoder.transform([session_name.split('.')[0]])[0])
+            # Akış halindeki hesap, vektörel hesapla aynı olmalı
+            if not np.allclose(aggregator.features(), session_df.loc[session_name].to_numpy()):
+                stream_mismatch += 1
+        print(f"Satır modeli çoğunluk oyu doğruluğu (test oturumları): {vote_correct / len(S_test):.4f}")
+        if stream_mismatch == 0:
+            print("SessionAggregator tüm test oturumlarında build_session_features ile eşleşiyor.")
+        else:
+            print(f"UYARI: SessionAggregator {stream_mismatch} oturumda build_session_features'tan farklı!")
+
+        # BBBPredict bu dosya varsa oturum modelini kullanır (yalnızca numpy gerekir)
+        session_forest_filename = 'session_forest.npz'
+        save_forest(session_forest_filename, export_forest(session_model, session_scaler, label_encoder.classes_))
+        print(f"Oturum modeli '{session_forest_filename}' olarak kaydedildi.")
+
+        # Kayıtlı olmayan kişileri reddetmek için kullanıcı şablonları (bkz. user_templates.py);
+        # oturum modeliyle aynı ölçekleme kullanılır. BBBPredict bunları yalnızca --reject-unknown ile kullanır
+        from user_templates import UserTemplates, build_templates, save_templates
+        template_arrays = build_templates(S_train.to_numpy(dtype=np.float64), ys_train, label_encoder.classes_,
+                                          mean=session_scaler.mean_, scale=session_scaler.scale_)
+        templates = UserTemplates(template_arrays)
+        accepted, _ = templates.check(S_test.to_numpy(dtype=np.float64), session_model.predict(S_test_scaled))
+        print(f"Kullanıcı şablonları eşiği: {templates.threshold:.3f}; "
+              f"test oturumlarının kabul oranı: {accepted.mean():.4f}")
+        user_templates_filename = 'user_templates.npz'
+        save_templates(user_templates_filename, template_arrays)
+        print(f"Kullanıcı şablonları '{user_templates_filename}' olarak kaydedildi.")
+    except Exception as e:
+        print(f"Oturum modeli oluşturulurken hata: {e}")
+
+
 # Yeni örneği uygun sütun isimleriyle DataFrame olarak oluştur
 sample_data = {
     'rawT9': [86], 'rawT8': [80], 'rawT7': [74], 'rawT0': [13], 'rawT2': [62], 'rawT3': [64],
@@ -1,9 +1,17 @@
 import paho.mqtt.client as mqtt
 import ssl
 import serial
-import time
 import os
-import csv # For CSV operations
+import signal
+import argparse
+from functools import partial
+
+from column_store import ColumnStoreWriter
+from csv_sink import BufferedCsvWriter
+from metrics import METRICS, now
+from mqtt_pipeline import MqttPublishPipeline
+from serial_reader import MultiDeviceReader, SerialLineReader
+from wire_format import WIRE_HELLO, WireFramer
 
 # --- Configuration Section ---
 # MQTT Broker Details (User should configure these)
@@ -14,10 +22,23 @@ MQTT_USERNAME = "YOUR_MQTT_USERNAME"              # Your MQTT username (if requi
 MQTT_PASSWORD = "YOUR_MQTT_PASSWORD"              # Your MQTT password (if required)
 # Path to your CA certificate file for TLS connection
 CA_CERT_PATH = "/path/to/your/emqxsl-ca.crt" # e.g., "/home/debian/certs/ca.crt"
+# Publishing runs in its own thread: each swipe session is sent as one payload. Payloads that cannot be
+# published (broker unreachable or too many unacked) wait in this spool directory until they are acked
+MQTT_SPOOL_DIR = "/path/to/your/mqtt_spool" # e.g., "/home/debian/data/mqtt_spool"
+MQTT_QUEUE_SIZE = 1000          # Lines buffered between the serial reader and the publisher
+MQTT_MAX_INFLIGHT = 20          # Unacked QoS1 publishes before new payloads wait in the spool
+MQTT_DRAIN_RATE = 5.0           # Spooled payloads published per second after reconnecting
 
 # Serial Port (Bluetooth) Details
 SERIAL_PORT_DEVICE = "/dev/rfcomm0" # Default for first Bluetooth serial device
 BAUD_RATE = 9600                    # Should match ESP32's Bluetooth serial baud rate
+# Several swipe panels: device id -> serial port. When set, all ports are served from one loop instead
+# of SERIAL_PORT_DEVICE; each data row in the CSV file and in the MQTT payloads gets the device id as an
+# extra last column (kept in the column store's device column), and MQTT sessions are tracked per
+# device. A device that disconnects is reopened every DEVICE_RECONNECT_INTERVAL seconds while the
+# others keep running.
+SERIAL_PORT_DEVICES = None          # e.g. {"panel1": "/dev/rfcomm0", "panel2": "/dev/rfcomm1"}
+DEVICE_RECONNECT_INTERVAL = 2.0
 
 # CSV File Details
 # Path where the collected sensor data will be saved as a CSV file
@@ -25,6 +46,25 @@ CSV_FILE_PATH = "/path/to/your/dataset.csv" # e.g., "/home/debian/data/sensor_da
 # Optional: CSV header if you want to write it when the file is created
 # If the ESP32 already sends a header, this might not be needed here.
 # CSV_HEADER = ["UserID", "Timestamp", "RawT9", ..., "DurationT0"]
+# Buffered CSV writing: rows are flushed every CSV_FLUSH_ROWS rows, after CSV_FLUSH_SECONDS,
+# at the end of each swipe session (CMD:DATA_SENT) and on shutdown
+CSV_FLUSH_ROWS = 50
+CSV_FLUSH_SECONDS = 2.0
+CSV_FSYNC_POLICY = "boundary"   # "never", "boundary" (end of session + shutdown) or "always"
+# Optional rotation; rotated files get a timestamp suffix (None disables)
+CSV_ROTATE_BYTES = None         # e.g. 50 * 1024 * 1024
+CSV_ROTATE_SECONDS = None       # e.g. 24 * 3600
+# Optional columnar copy of the data rows (column_store.py) that training can memory-map instead of
+# re-parsing the ever-growing CSV; None disables it. It is flushed and fsynced like the CSV file
+# (CSV_FLUSH_ROWS, CSV_FLUSH_SECONDS, CSV_FSYNC_POLICY)
+COLUMN_STORE_DIR = None         # e.g. "/home/debian/data/swipe_store"
+
+# Metrics (serial wait, CSV write and MQTT publish timings, error counters), see metrics.py
+METRICS_PORT = None             # e.g. 9101 -> http://127.0.0.1:9101/metrics (JSON)
+METRICS_SNAPSHOT_FILE = None    # e.g. "/run/bbb_gateway_metrics.json" (tmpfs, spares the SD card)
+METRICS_SNAPSHOT_INTERVAL = 10.0
+# Quiet mode: no per-line / per-session prints on the serial console
+QUIET = False
 
 
 # --- MQTT Callback Functions ---
@@ -40,6 +80,9 @@ def on_disconnect(client, userdata, rc):
     print(f"Disconnected from MQTT, return code {rc}")
     if rc != 0:
         print("Unexpected disconnection.")
+    if userdata is not None:
+        # paho resends unacked messages after reconnecting; their PUBACKs still complete them
+        userdata.connection_lost()
 
 def on_publish(client, userdata, mid):
     """
@@ -47,35 +90,9 @@ def on_publish(client, userdata, mid):
     This can be very verbose if enabled.
     """
     # print(f"Message ID {mid} successfully published.")
-    pass
-
-
-# --- CSV Writing Function ---
-def write_to_csv(file_path, data_row_string):
-    """
-    Appends a given comma-separated string as a new row to a CSV file.
-    
-    :param file_path: Path to the CSV file.
-    :param data_row_string: A string containing data values separated by commas (e.g., "value1,value2,value3").
-    """
-    try:
-        # Split the incoming string by commas to create a list
-        data_list = data_row_string.split(',')
-
-        # Check if file exists (could be used to write header if file is new, currently not used)
-        # file_exists = os.path.isfile(file_path)
-
-        # Open the file in append mode ('a')
-        with open(file_path, 'a', newline='') as csvfile:
-            csv_writer = csv.writer(csvfile)
-            # If header is desired and file is new/empty:
-            # if not file_exists or os.path.getsize(file_path) == 0:
-            #     if CSV_HEADER:
-            #         csv_writer.writerow(CSV_HEADER)
-            csv_writer.writerow(data_list)
-        # print(f"Data written to CSV: {data_row_string}") # Can be too frequent for logs
-    except Exception as e:
-        print(f"Error writing to CSV file ({file_path}): {e}")
+    if userdata is not None:
+        # The broker acked the message; drop it (and its spool file, if it was spooled)
+        userdata.acknowledge(mid)
 
 
 # --- Main Application Logic ---
@@ -104,6 +121,12 @@ def main():
         print("You might try 'tls_version=ssl.PROTOCOL_TLSv1_2' in client.tls_set(...)")
         return
 
+    # Publisher thread + spool; passed to the callbacks as userdata
+    publisher = MqttPublishPipeline(client, MQTT_TOPIC, MQTT_SPOOL_DIR, qos=1, queue_size=MQTT_QUEUE_SIZE,
+                                    max_inflight=MQTT_MAX_INFLIGHT, drain_rate=MQTT_DRAIN_RATE,
+                                    verbose=not QUIET)
+    client.user_data_set(publisher)
+
     # Assign callback functions
     client.on_connect = on_connect
     client.on_disconnect = on_disconnect
@@ -118,71 +141,180 @@ def main():
         return
 
     client.loop_start() # Start the MQTT client loop in a separate thread
+    publisher.start()   # Start the publisher thread (reads from the queue filled by the serial loop)
 
     # Initialize Serial Port (for Bluetooth communication)
     ser = None # Initialize ser to None for the finally block
+    if SERIAL_PORT_DEVICES:
+        # Multi-device mode: the ports are opened (and reopened) by the MultiDeviceReader below
+        print(f"Serving {len(SERIAL_PORT_DEVICES)} devices: {', '.join(SERIAL_PORT_DEVICES)}")
+    else:
+        try:
+            print(f"Attempting to open serial port: {SERIAL_PORT_DEVICE} at {BAUD_RATE} baud")
+            ser = serial.Serial(SERIAL_PORT_DEVICE, BAUD_RATE, timeout=1) # 1-second timeout for reads
+            print(f"Successfully opened serial port {SERIAL_PORT_DEVICE}.")
+        except serial.SerialException as e:
+            print(f"Error opening serial port ({SERIAL_PORT_DEVICE}): {e}")
+            print("Ensure Bluetooth device is paired, trusted, and bound to rfcomm0 (or configured port).")
+            publisher.stop()
+            client.loop_stop()
+            client.disconnect()
+            return
+        print(f"Waiting for data from ESP32 on {SERIAL_PORT_DEVICE}...")
+    print(f"Publishing data to MQTT topic: {MQTT_TOPIC}")
+    print(f"Saving data to CSV file: {CSV_FILE_PATH}")
+
+    # Keep the CSV file open and write rows in batches instead of reopening it for every line
     try:
-        print(f"Attempting to open serial port: {SERIAL_PORT_DEVICE} at {BAUD_RATE} baud")
-        ser = serial.Serial(SERIAL_PORT_DEVICE, BAUD_RATE, timeout=1) # 1-second timeout for reads
-        print(f"Successfully opened serial port {SERIAL_PORT_DEVICE}.")
-    except serial.SerialException as e:
-        print(f"Error opening serial port ({SERIAL_PORT_DEVICE}): {e}")
-        print("Ensure Bluetooth device is paired, trusted, and bound to rfcomm0 (or configured port).")
+        csv_writer = BufferedCsvWriter(CSV_FILE_PATH, max_rows=CSV_FLUSH_ROWS, max_delay=CSV_FLUSH_SECONDS,
+                                       fsync_policy=CSV_FSYNC_POLICY, rotate_bytes=CSV_ROTATE_BYTES,
+                                       rotate_seconds=CSV_ROTATE_SECONDS)
+    except Exception as e:
+        print(f"Error opening CSV file ({CSV_FILE_PATH}): {e}")
+        if ser:
+            ser.close()
+        publisher.stop()
         client.loop_stop()
         client.disconnect()
         return
+    csv_writer.start_background_flush()
 
-    print(f"Waiting for data from ESP32 on {SERIAL_PORT_DEVICE}...")
-    print(f"Publishing data to MQTT topic: {MQTT_TOPIC}")
-    print(f"Saving data to CSV file: {CSV_FILE_PATH}")
+    store_writer = None
+    if COLUMN_STORE_DIR:
+        try:
+            store_writer = ColumnStoreWriter(COLUMN_STORE_DIR, max_rows=CSV_FLUSH_ROWS, max_delay=CSV_FLUSH_SECONDS,
+                                             fsync_policy=CSV_FSYNC_POLICY)
+            store_writer.start_background_flush()
+            print(f"Appending data rows to column store: {COLUMN_STORE_DIR} ({store_writer.store.rows} rows)")
+        except Exception as e:
+            print(f"Error opening column store ({COLUMN_STORE_DIR}): {e}")
+
+    if METRICS_PORT:
+        METRICS.start_http_server(METRICS_PORT)
+        print(f"Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+    if METRICS_SNAPSHOT_FILE:
+        METRICS.start_snapshot_writer(METRICS_SNAPSHOT_FILE, METRICS_SNAPSHOT_INTERVAL)
+
+    def handle_message(message, device_id=None):
+        """
+        Handles one complete line received from the ESP32.
+
+        :param message: The received line.
+        :param device_id: Id of the sending device in multi-device mode; appended to data rows.
+        """
+        METRICS.count("lines_received")
+        if not QUIET:
+            print(f"Received{f' from {device_id}' if device_id else ''}: '{message}'")
+        if device_id is not None and not message.startswith("CMD:"):
+            message = f"{message},{device_id}"
+
+        # 1. Write to CSV file (buffered; flushed in batches)
+        start = now()
+        try:
+            csv_writer.write_line(message)
+        except Exception as e:
+            METRICS.count("csv_write_errors")
+            print(f"Error writing to CSV file ({CSV_FILE_PATH}): {e}")
+        METRICS.observe("csv_write", start)
+        if store_writer is not None:
+            try:
+                store_writer.write_line(message)
+            except Exception as e:
+                METRICS.count("column_store_errors")
+                print(f"Error appending to column store ({COLUMN_STORE_DIR}): {e}")
+
+        # 2. Hand over to the MQTT publisher thread (never blocks the serial loop)
+        if not publisher.submit(message, device_id):
+            print("MQTT queue is full, message dropped (it is still saved to CSV).")
+
+    def handle_error(message, err):
+        print(f"Error reading from or processing serial data: {err}")
+
+    def setup_device(device_id, port):
+        """Creates the line reader for a (re)opened device in multi-device mode."""
+        device_reader = SerialLineReader(port, framer=WireFramer())
+        device_reader.on_default(partial(handle_message, device_id=device_id))
+        device_reader.on_error(handle_error)
+        port.write(WIRE_HELLO)
+        return device_reader
+
+    if SERIAL_PORT_DEVICES:
+        reader = MultiDeviceReader(SERIAL_PORT_DEVICES, lambda path: serial.Serial(path, BAUD_RATE, timeout=1),
+                                   setup_device, reconnect_interval=DEVICE_RECONNECT_INTERVAL)
+        reader.on_connect(lambda device_id: print(f"Device {device_id} connected ({SERIAL_PORT_DEVICES[device_id]})."))
+        reader.on_disconnect(lambda device_id, reason: print(
+            f"Device {device_id} disconnected ({reason}); retrying every {DEVICE_RECONNECT_INTERVAL} s."))
+    else:
+        # Block on the serial file descriptor instead of polling in_waiting every 50 ms;
+        # lines are decoded/split by the reader and handed to handle_message as they complete
+        # Text lines and compact binary frames (wire_format) are both accepted; binary frames are rendered
+        # back to their CSV/DATA: text so the CSV file and MQTT payloads keep the same format
+        reader = SerialLineReader(ser, framer=WireFramer())
+        reader.on_default(handle_message)
+        reader.on_error(handle_error)
+
+        # Offer the binary format; firmware without support ignores this and keeps sending text
+        try:
+            ser.write(WIRE_HELLO)
+        except serial.SerialException as e:
+            print(f"Could not send wire format hello: {e}")
+
+    # Shut down cleanly on SIGTERM (e.g. systemctl stop) so buffered rows are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: reader.stop())
 
     try:
-        while True:
-            if ser.in_waiting > 0: # Check if there's data waiting in the serial buffer
-                try:
-                    line = ser.readline() # Read a line (terminated by newline)
-                    if line:
-                        # Decode from bytes to string, ignore errors if any non-UTF-8 chars appear
-                        message = line.decode('utf-8', errors='ignore').strip() 
-                        if message: # Ensure the message is not empty after stripping
-                            print(f"Received: '{message}'")
-
-                            # 1. Write to CSV file
-                            write_to_csv(CSV_FILE_PATH, message)
-
-                            # 2. Publish to MQTT
-                            # QoS 1: At least once delivery
-                            result = client.publish(MQTT_TOPIC, message, qos=1) 
-                            if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                                # Print only a snippet if the message is long
-                                print(f"Successfully published '{message[:30]}...' to MQTT.")
-                            else:
-                                print(f"Failed to publish message to MQTT, error code: {result.rc}")
-                        # else:
-                        #     print("Received empty line from ESP32.")
-                except UnicodeDecodeError:
-                    print("Unicode decode error while reading from serial. Ensure ESP32 sends UTF-8.")
-                except Exception as read_err:
-                    print(f"Error reading from or processing serial data: {read_err}")
-
-            # Brief pause to reduce CPU usage and allow other processes to run
-            time.sleep(0.05) 
+        if reader.run() == "eof":
+            print(f"Serial port {SERIAL_PORT_DEVICE} was closed by the device.")
 
+    except OSError as e:
+        print(f"Serial port error: {e}")
     except KeyboardInterrupt:
         print("\nProgram terminated by user (Ctrl+C).")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
         print("Cleaning up resources...")
+        reader.close()
+        try:
+            csv_writer.close()
+            print(f"CSV file {CSV_FILE_PATH} flushed and closed.")
+        except Exception as e:
+            print(f"Error closing CSV file ({CSV_FILE_PATH}): {e}")
+        if store_writer is not None:
+            try:
+                store_writer.close()
+                print(f"Column store {COLUMN_STORE_DIR} closed ({store_writer.store.rows} rows).")
+            except Exception as e:
+                print(f"Error closing column store ({COLUMN_STORE_DIR}): {e}")
         if ser and ser.is_open:
             ser.close()
             print(f"Serial port {SERIAL_PORT_DEVICE} closed.")
         
+        # Flush the open session to the broker/spool before the network loop stops
+        publisher.stop()
+        print(f"MQTT publisher stats: {publisher.stats()}")
+        METRICS.stop(METRICS_SNAPSHOT_FILE)
+
         if client.is_connected(): # Check if client is connected before attempting to stop loop/disconnect
             client.loop_stop()
             client.disconnect()
         print("MQTT client disconnected.")
         print("Exiting.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="BeagleBone Black - ESP32 data gateway.")
+    parser.add_argument("--quiet", action="store_true", help="Disable per-line and per-session prints")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Local HTTP metrics port")
+    parser.add_argument("--metrics-file", default=METRICS_SNAPSHOT_FILE, help="Periodic metrics snapshot file")
+    parser.add_argument("--device", action="append", metavar="ID=PORT",
+                        help="Serial port for multi-device mode (repeatable), e.g. panel1=/dev/rfcomm0")
+    return parser.parse_args()
+
 if __name__ == '__main__':
+    args = parse_args()
+    QUIET = QUIET or args.quiet
+    METRICS_PORT = args.metrics_port
+    METRICS_SNAPSHOT_FILE = args.metrics_file
+    if args.device:
+        SERIAL_PORT_DEVICES = dict(device.split("=", 1) for device in args.device)
     main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import numpy as np
+
+# --- Swipe sürerken erken karar (anytime prediction) ---
+# Oturumdaki her örneğin sınıf olasılıklarının logaritması toplanır (örnekler bağımsız kabul
+# edilerek oturumun log-olabilirliği). En iyi sınıfın toplamı ikinci en iyiden margin kadar
+# öndeyse karar CMD:DATA_SENT beklenmeden verilir. Margin doğal logaritma biriminde bir
+# olabilirlik oranıdır: margin=3 -> en iyi sınıf ikinciden ~20 kat daha olası.
+# Orman olasılıkları 0 olabildiği için log(p + epsilon) kullanılır.
+
+DEFAULT_MARGIN = 3.0
+DEFAULT_EPSILON = 1e-3
+
+
+class AnytimeDecider:
+    # Bir oturumun log-olasılık toplamlarını tutar; karar verildikten sonra reset'e kadar yeni örnekleri yok sayar
+
+    def __init__(self, n_classes, margin=DEFAULT_MARGIN, min_samples=1, epsilon=DEFAULT_EPSILON):
+        self.margin = margin
+        self.min_samples = min_samples
+        self.epsilon = epsilon
+        self.log_proba = np.zeros(n_classes, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.log_proba[:] = 0.0
+        self.decision = None        # sayısal etiket
+        self.decided_after = None   # kararın verildiği örnek sayısı
+        self.decision_margin = None
+
+    @property
+    def decided(self):
+        return self.decision is not None
+
+    def update(self, proba):
+        # proba: (k, sınıf_sayısı) olasılıklar (CompiledPipeline.predict_proba).
+        # Karar bu çağrıda verildiyse True döner
+        if self.decided:
+            return False
+        proba = np.asarray(proba, dtype=np.float64)
+        if proba.ndim == 1:
+            proba = proba.reshape(1, -1)
+        if len(proba) == 0:
+            return False
+
+        # Toplu gelen örneklerde her ara adımın toplamı tek seferde hesaplanır;
+        # kararın tam olarak kaçıncı örnekte verildiği böylece korunur
+        cumulative = np.cumsum(np.log(proba + self.epsilon), axis=0)
+        cumulative += self.log_proba
+        if cumulative.shape[1] > 1:
+            top2 = np.partition(cumulative, -2, axis=1)[:, -2:]
+            margins = top2[:, 1] - top2[:, 0]
+        else:
+            margins = np.full(len(cumulative), np.inf)
+        counts = self.count + np.arange(1, len(proba) + 1)
+        ready = (margins >= self.margin) & (counts >= self.min_samples)
+
+        if ready.any():
+            i = int(np.argmax(ready))
+            self.log_proba[:] = cumulative[i]
+            self.count = int(counts[i])
+            self.decision = int(np.argmax(cumulative[i]))
+            self.decided_after = self.count
+            self.decision_margin = float(margins[i])
+            return True
+        self.log_proba[:] = cumulative[-1]
+        self.count = int(counts[-1])
+        return False
+
+    def best(self):
+        # Karar verilmemiş olsa da şu ana kadarki en olası sınıf; örnek yoksa None
+        if self.decided:
+            return self.decision
+        if self.count == 0:
+            return None
+        return int(np.argmax(self.log_proba))
@@ -0,0 +1,89 @@
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from csv_sink import FSYNC_ALWAYS, FSYNC_BOUNDARY, FSYNC_NEVER, BufferedCsvWriter
+
+# --- CSV write throughput benchmark ---
+# Replays Dataset/dataset.csv line by line through the gateway's original write_to_csv() (open/append/
+# close per line, kept here as the baseline) and through BufferedCsvWriter with each fsync policy, and reports rows/sec.
+# A CMD:DATA_SENT boundary is inserted whenever user_trial changes, like one swipe session.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(SCRIPT_DIR, "..", "Dataset", "dataset.csv")
+
+
+def load_lines(path, repeat):
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip()]
+    stream = []
+    previous_trial = None
+    for line in lines * repeat:
+        trial = line.split(',', 1)[0]
+        if previous_trial is not None and trial != previous_trial:
+            stream.append("CMD:DATA_SENT")
+        previous_trial = trial
+        stream.append(line)
+    stream.append("CMD:DATA_SENT")
+    return stream
+
+
+def write_to_csv(file_path, data_row_string):
+    """
+    The gateway's original CSV writer: appends a given comma-separated string as a new row to a CSV file.
+
+    :param file_path: Path to the CSV file.
+    :param data_row_string: A string containing data values separated by commas (e.g., "value1,value2,value3").
+    """
+    try:
+        # Open the file in append mode ('a') for every row
+        with open(file_path, 'a', newline='') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(data_row_string.split(','))
+    except Exception as e:
+        print(f"Error writing to CSV file ({file_path}): {e}")
+
+
+def bench_original(lines, out_path):
+    start = time.perf_counter()
+    for line in lines:
+        write_to_csv(out_path, line)
+    return time.perf_counter() - start
+
+
+def bench_buffered(lines, out_path, fsync_policy, max_rows):
+    start = time.perf_counter()
+    writer = BufferedCsvWriter(out_path, max_rows=max_rows, fsync_policy=fsync_policy)
+    for line in lines:
+        writer.write_line(line)
+    writer.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV sink write throughput: write_to_csv vs BufferedCsvWriter.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="CSV file to replay")
+    parser.add_argument("--repeat", type=int, default=3, help="Replay the dataset this many times")
+    parser.add_argument("--max-rows", type=int, default=50, help="BufferedCsvWriter flush threshold")
+    parser.add_argument("--dir", default=None, help="Directory to write into (default: a temp dir; "
+                                                    "point it at the SD card for realistic numbers)")
+    args = parser.parse_args()
+
+    lines = load_lines(args.dataset, args.repeat)
+    n_rows = sum(1 for line in lines if not line.startswith("CMD:"))
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        results = [("write_to_csv", bench_original(lines, os.path.join(tmp, "original.csv")))]
+        for policy in (FSYNC_NEVER, FSYNC_BOUNDARY, FSYNC_ALWAYS):
+            path = os.path.join(tmp, f"buffered_{policy}.csv")
+            results.append((f"buffered/{policy}", bench_buffered(lines, path, policy, args.max_rows)))
+
+    print(f"{n_rows} rows, {len(lines) - n_rows} session boundaries")
+    for name, elapsed in results:
+        print(f"{name:<20} {elapsed:8.3f} s  {n_rows / elapsed:12.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from anytime_decision import AnytimeDecider
+from compiled_pipeline import CompiledPipeline
+from session_features import DURATION_COLUMNS, RAW_COLUMNS
+
+# Erken karar (anytime prediction) tekrar oynatma ölçümü: Dataset/dataset.csv user_trial oturumlarına
+# ayrılır, her oturumun örnekleri sırayla AnytimeDecider'a verilir ve her margin eşiği için
+# doğruluk ile karar için gereken örnek sayısı raporlanır. Eşik hiç aşılmazsa oturum sonundaki
+# en olası sınıf kullanılır (CMD:DATA_SENT'te verilecek karar).
+#
+# Varsayılan olarak model, oturum bazında ayrılmış eğitim oturumlarıyla burada eğitilir; böylece
+# test oturumlarının hiçbir satırı eğitimde görülmez. --forest ile BBB'deki model dosyası da
+# kullanılabilir (o model veri setinin satırlarını görmüş olabilir; sonuçlar iyimser çıkar).
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(SCRIPT_DIR, "..", "Dataset", "dataset.csv")
+FEATURE_COLUMNS = RAW_COLUMNS + DURATION_COLUMNS
+
+
+def load_sessions(path):
+    df = pd.read_csv(path, header=None, names=["user_trial", "timestamp"] + FEATURE_COLUMNS)
+    df["UserID"] = df["user_trial"].str.split(".").str[0]
+    return df
+
+
+def train_pipeline(df, train_sessions):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    label_encoder = LabelEncoder().fit(df["UserID"])
+    train = df[df["user_trial"].isin(train_sessions)]
+    X_train = train[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    scaler = StandardScaler().fit(X_train)
+    model = RandomForestClassifier(random_state=42, n_jobs=-1, n_estimators=100)
+    model.fit(scaler.transform(X_train), label_encoder.transform(train["UserID"]))
+    return CompiledPipeline.from_sklearn(scaler, model, label_encoder.classes_)
+
+
+def load_pipeline(path):
+    if path.endswith(".npy"):
+        from model_bundle import load_bundle
+        return CompiledPipeline.from_flat_forest(load_bundle(path))
+    from flat_forest import load_forest
+    return CompiledPipeline.from_flat_forest(load_forest(path))
+
+
+def replay(sessions, n_classes, margin, min_samples):
+    # sessions: (oturum olasılıkları (k, sınıf), gerçek etiket) listesi
+    decider = AnytimeDecider(n_classes, margin=margin, min_samples=min_samples)
+    samples, correct, early = [], [], []
+    for proba, label in sessions:
+        decider.reset()
+        decider.update(proba)
+        samples.append(decider.decided_after if decider.decided else len(proba))
+        correct.append(decider.best() == label)
+        early.append(decider.decided and decider.decided_after < len(proba))
+    return np.array(samples), np.array(correct), np.array(early)
+
+
+def plot(results, full_accuracy, full_samples, output):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    samples = [r["mean_samples"] for r in results]
+    accuracy = [r["accuracy"] for r in results]
+    plt.figure(figsize=(8, 5))
+    plt.plot(samples, accuracy, marker="o", label="Erken karar")
+    for r in results:
+        plt.annotate(f"margin={r['margin']:g}", (r["mean_samples"], r["accuracy"]),
+                     textcoords="offset points", xytext=(5, -12), fontsize=8)
+    plt.scatter([full_samples], [full_accuracy], color="red", zorder=3, label="Tüm oturum (CMD:DATA_SENT)")
+    plt.xlabel("Karar için gereken ortalama örnek sayısı")
+    plt.ylabel("Oturum doğruluğu")
+    plt.title("Erken karar: doğruluk / gecikme")
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(output)
+    print(f"Grafik '{output}' olarak kaydedildi.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Erken karar eşiklerinin doğruluk/örnek sayısı ölçümü.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Tekrar oynatılacak CSV dosyası")
+    parser.add_argument("--forest", default=None, help="Hazır model (.npz düz orman veya .npy paket); "
+                                                       "verilmezse oturum bazında ayrılmış verilerle eğitilir")
+    parser.add_argument("--margins", default="0.5,1,2,3,5,8,12", help="Virgülle ayrılmış margin eşikleri")
+    parser.add_argument("--min-samples", type=int, default=1, help="Karar öncesi en az örnek sayısı")
+    parser.add_argument("--test-size", type=float, default=0.3, help="Test oturumlarının oranı")
+    parser.add_argument("--output", default="early_exit.png", help="Grafik dosyası")
+    args = parser.parse_args()
+
+    df = load_sessions(args.dataset)
+    session_users = df.groupby("user_trial", sort=False)["UserID"].first()
+    if args.forest:
+        pipeline = load_pipeline(args.forest)
+        test_sessions = session_users.index
+    else:
+        from sklearn.model_selection import train_test_split
+        train_sessions, test_sessions = train_test_split(
+            session_users.index, test_size=args.test_size, random_state=42, stratify=session_users)
+        pipeline = train_pipeline(df, train_sessions)
+
+    label_index = {name: i for i, name in enumerate(pipeline.classes)}
+    test = df[df["user_trial"].isin(test_sessions)]
+    # Olasılıklar tüm test satırları için bir kez hesaplanır; her eşik aynı olasılıkları tekrar oynatır
+    proba = pipeline.predict_proba(test[FEATURE_COLUMNS].to_numpy(dtype=np.float64))
+    sessions = []
+    for rows in test.groupby("user_trial", sort=False).indices.values():
+        sessions.append((proba[rows], label_index[test["UserID"].iloc[rows[0]]]))
+    n_classes = proba.shape[1]
+
+    full_samples, full_correct, _ = replay(sessions, n_classes, np.inf, args.min_samples)
+    print(f"{len(sessions)} test oturumu, ortalama {full_samples.mean():.1f} örnek/oturum")
+    print(f"{'margin':>8} {'doğruluk':>9} {'ort. örnek':>11} {'medyan':>7} {'erken %':>8}")
+    print(f"{'tümü':>8} {full_correct.mean():9.4f} {full_samples.mean():11.2f} "
+          f"{np.median(full_samples):7.1f} {0.0:8.1f}")
+
+    results = []
+    for margin in (float(m) for m in args.margins.split(",")):
+        samples, correct, early = replay(sessions, n_classes, margin, args.min_samples)
+        results.append({"margin": margin, "accuracy": correct.mean(), "mean_samples": samples.mean()})
+        print(f"{margin:8g} {correct.mean():9.4f} {samples.mean():11.2f} "
+              f"{np.median(samples):7.1f} {100 * early.mean():8.1f}")
+
+    plot(results, full_correct.mean(), full_samples.mean(), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from compiled_pipeline import CompiledPipeline
+from enrollment import encode_users, enroll, load_samples, publish, user_names
+from flat_forest import export_forest
+from model_bundle import load_bundle
+
+# Artımlı kayıt (enrollment.py) ile tam yeniden eğitimin süre ve doğruluk karşılaştırması.
+# Veri seti oturum (user_trial) bazında eğitim/test olarak bölünür; --new-users kadar kullanıcı
+# başlangıç modelinden çıkarılır ve sonradan kaydedilir:
+#   temel        yeni kullanıcılar hariç eğitilen model (yeni kullanıcıları hiç tanımaz)
+#   yaprak       temel + enroll (yalnızca scaler ve yaprak güncellemesi)
+#   yaprak+ağaç  temel + enroll (--new-trees yeni ağaç; eski eğitim verisinden --replay-rows satır)
+#   tam          tüm eğitim oturumlarıyla sıfırdan eğitim (BBB_egitme.py ile aynı ayarlar)
+# Her varyant için süre, test satırı doğruluğu (tümü / yeni / eski kullanıcılar) ve satır oylarının
+# çoğunluğuyla oturum doğruluğu raporlanır. Ayrıca yayımlama ve BBBPredict'teki yeniden yükleme
+# (load_bundle + CompiledPipeline) süresi ölçülür.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(SCRIPT_DIR, "..", "Dataset", "dataset.csv")
+
+
+def split_sessions(user_trials, test_size, rng):
+    # Her kullanıcının oturumlarından test_size oranı teste ayrılır; satır maskesi döner
+    sessions = np.unique(user_trials)
+    owners = user_names(sessions)
+    test_sessions = []
+    for user in np.unique(owners):
+        own = rng.permutation(sessions[owners == user])
+        test_sessions.extend(own[:max(1, int(round(len(own) * test_size)))])
+    return np.isin(user_trials, test_sessions)
+
+
+def train_forest(users, features, n_estimators, random_state):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    class_names = np.unique(users)
+    scaler = StandardScaler().fit(features)
+    model = RandomForestClassifier(random_state=random_state, n_jobs=-1, n_estimators=n_estimators)
+    model.fit(scaler.transform(features), encode_users(class_names, users))
+    return export_forest(model, scaler, class_names)
+
+
+def evaluate(arrays, user_trials, features, new_users):
+    pipeline = CompiledPipeline.from_flat_forest(arrays)
+    users = user_names(user_trials)
+    predicted = pipeline.predict(features).astype(str)
+    correct = predicted == users
+    is_new = np.isin(users, new_users)
+
+    session_correct = {}
+    for session in np.unique(user_trials):
+        rows = user_trials == session
+        names, votes = np.unique(predicted[rows], return_counts=True)
+        session_correct[session] = names[np.argmax(votes)] == user_names([session])[0]
+    sessions = np.array(list(session_correct))
+    session_ok = np.array(list(session_correct.values()))
+    session_new = np.isin(user_names(sessions), new_users)
+    return {
+        "rows": float(correct.mean()),
+        "rows_new": float(correct[is_new].mean()),
+        "rows_old": float(correct[~is_new].mean()),
+        "sessions": float(session_ok.mean()),
+        "sessions_new": float(session_ok[session_new].mean()),
+        "sessions_old": float(session_ok[~session_new].mean()),
+    }
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Artımlı kayıt ile tam yeniden eğitimin karşılaştırması.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="CSV dosyası veya column_store klasörü")
+    parser.add_argument("--new-users", type=int, default=2, help="Sonradan kaydedilecek kullanıcı sayısı")
+    parser.add_argument("--trees", type=int, default=100, help="Temel ve tam modeldeki ağaç sayısı")
+    parser.add_argument("--new-trees", type=int, default=20, help="Kayıtta eklenecek ağaç sayısı")
+    parser.add_argument("--replay-rows", type=int, default=1000, help="Yeni ağaçlar için eski veriden satır")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Teste ayrılan oturum oranı")
+    parser.add_argument("--seed", type=int, default=42, help="Rastgele tohum")
+    parser.add_argument("--output", default="bench_enrollment.json", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    user_trials, features = load_samples(args.dataset)
+    users = user_names(user_trials)
+    new_users = rng.choice(np.unique(users), args.new_users, replace=False).tolist()
+    test = split_sessions(user_trials, args.test_size, rng)
+    train_new = ~test & np.isin(users, new_users)
+    train_old = ~test & ~np.isin(users, new_users)
+    print(f"{len(features)} satır, {len(np.unique(users))} kullanıcı; sonradan kaydedilenler: {', '.join(new_users)} "
+          f"({int(train_new.sum())} eğitim satırı)")
+
+    base = train_forest(users[train_old], features[train_old], args.trees, args.seed)
+    replay = rng.choice(np.flatnonzero(train_old), min(args.replay_rows, int(train_old.sum())), replace=False)
+
+    variants = {"temel": (base, 0.0)}
+    variants["yaprak"] = timed(lambda: enroll(base, users[train_new], features[train_new], random_state=args.seed)[0])
+    variants["yaprak+ağaç"] = timed(lambda: enroll(
+        base, users[train_new], features[train_new], users[replay], features[replay],
+        new_trees=args.new_trees, random_state=args.seed)[0])
+    variants["tam"] = timed(lambda: train_forest(users[~test], features[~test], args.trees, args.seed))
+
+    report = {"dataset": os.path.abspath(args.dataset), "new_users": new_users, "seed": args.seed, "variants": {}}
+    print(f"\n{'varyant':<12} {'süre s':>8} {'satır':>7} {'s. yeni':>8} {'s. eski':>8} "
+          f"{'oturum':>7} {'o. yeni':>8} {'o. eski':>8} {'ağaç':>5}")
+    for name, (arrays, seconds) in variants.items():
+        scores = evaluate(arrays, user_trials[test], features[test], new_users)
+        report["variants"][name] = dict(scores, seconds=seconds, trees=len(arrays["roots"]))
+        print(f"{name:<12} {seconds:8.2f} {scores['rows']:7.3f} {scores['rows_new']:8.3f} {scores['rows_old']:8.3f} "
+              f"{scores['sessions']:7.3f} {scores['sessions_new']:8.3f} {scores['sessions_old']:8.3f} "
+              f"{len(arrays['roots']):5d}")
+
+    # Yayımlama (sürümlü kopya + atomik değiştirme) ve BBBPredict tarafında yeniden yükleme süresi
+    with tempfile.TemporaryDirectory() as model_dir:
+        bundle_path = os.path.join(model_dir, "swipe_model.bundle.npy")
+        _, publish_seconds = timed(lambda: publish(variants["yaprak+ağaç"][0], bundle_path))
+        _, reload_seconds = timed(lambda: CompiledPipeline.from_flat_forest(load_bundle(bundle_path)))
+    report["publish_seconds"] = publish_seconds
+    report["reload_seconds"] = reload_seconds
+    speedup = variants["tam"][1] / variants["yaprak+ağaç"][1]
+    print(f"\nYayımlama {publish_seconds * 1000:.1f} ms, BBBPredict'te yeniden yükleme {reload_seconds * 1000:.1f} ms; "
+          f"yaprak+ağaç kaydı tam eğitimden {speedup:.1f} kat hızlı.")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Sonuçlar '{args.output}' dosyasına yazıldı.")
+
+
+if __name__ == '__main__':
+    main()
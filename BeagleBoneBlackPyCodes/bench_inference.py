@@ -0,0 +1,210 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+import warnings
+
+import numpy as np
+
+import BBBPredict
+from compiled_pipeline import CompiledPipeline
+from serial_reader import LineFramer
+
+# Tahmin hattı gecikme/verim ölçümü: Dataset/dataset.csv satırları ESP32'nin gönderdiği
+# "DATA:...\r\n" satırlarına çevrilir ve eski predict_user yolunun aşamalarından geçirilir:
+#   decode      bayt -> str (satır satır: decode().strip(); toplu: LineFramer)
+#   parse       "DATA:" önekini atıp float listesine çevirme
+#   scale       StandardScaler.transform
+#   predict     model.predict
+#   inverse     LabelEncoder.inverse_transform
+#   compiled    CompiledPipeline.predict (scale + predict + inverse tek adımda; BBBPredict'in yolu)
+# Her aşama tüm veri üzerinde sırayla çalıştırılır; satır başına (N=1) ve toplu (--batch) modlarda
+# p50/p95/p99 gecikme, satır/s ve aşamanın bellek kullanımı raporlanır: /proc/self/statm'den anlık RSS,
+# aşama boyunca (her 64 çağrıda bir örneklenen) en yüksek değer ve aşama sonundaki değişim. ru_maxrss
+# süreç ömrü boyunca tepe olduğundan aşamaları ayırt etmez; kullanılmaz. Sonuç JSON'a yazılır; farklı
+# commit'lerdeki sonuçlar karşılaştırılarak gerilemeler görülebilir.
+#
+# joblib model dosyaları yoksa (CI, masaüstü) veri setinin kendisiyle eğitilen yedek bir
+# RandomForest/StandardScaler/LabelEncoder kullanılır; ekran veya BBB gerekmez.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(SCRIPT_DIR, "..", "Dataset", "dataset.csv")
+STAGES = ["decode", "parse", "scale", "predict", "inverse", "compiled"]
+
+
+def load_lines(path, repeat):
+    # Veri seti satırlarını seri porttan gelecek bayt satırlarına çevirir
+    lines = []
+    with open(path) as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) == 20:
+                lines.append(("DATA:" + ",".join(fields[2:]) + "\r\n").encode())
+    return lines * repeat
+
+
+def load_model(model_dir, dataset):
+    # (model, scaler, label_encoder, kaynak); dosyalar yoksa veri setiyle eğitilen yedek model
+    files = [os.path.join(model_dir, os.path.basename(path)) for path in (
+        BBBPredict.MODEL_FILENAME, BBBPredict.SCALER_FILENAME, BBBPredict.ENCODER_FILENAME)]
+    if all(os.path.exists(path) for path in files):
+        import joblib
+        return tuple(joblib.load(path) for path in files) + ("joblib",)
+
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    data = np.loadtxt(dataset, delimiter=',', usecols=range(2, 20))
+    users = np.loadtxt(dataset, delimiter=',', usecols=0, dtype=str)
+    label_encoder = LabelEncoder().fit([user.split('.')[0] for user in users])
+    scaler = StandardScaler().fit(data)
+    model = RandomForestClassifier(random_state=42, n_estimators=100)
+    model.fit(scaler.transform(data), label_encoder.transform([user.split('.')[0] for user in users]))
+    return model, scaler, label_encoder, "synthetic"
+
+
+RSS_SAMPLE_EVERY = 64
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def current_rss_kb():
+    # Anlık RSS (statm'in ikinci alanı, sayfa cinsinden); /proc olmayan sistemlerde None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_KB
+    except OSError:
+        return None
+
+
+def summarize(timings, rows, total_seconds, rss_samples):
+    timings = np.asarray(timings) * 1000.0
+    return {
+        "calls": len(timings),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "mean_ms": float(timings.mean()),
+        "rows_per_sec": rows / total_seconds if total_seconds > 0 else float("inf"),
+        "rss_kb": rss_samples[-1],
+        "stage_peak_rss_kb": None if rss_samples[0] is None else max(rss_samples),
+        "rss_delta_kb": None if rss_samples[0] is None else rss_samples[-1] - rss_samples[0],
+    }
+
+
+def run_stage(func, items, rows_per_item):
+    # func her öğeye (satır veya toplu blok) uygulanır; çağrı başına süre ölçülür
+    # RSS aşama başında, her RSS_SAMPLE_EVERY çağrıda bir (süre ölçümünün dışında) ve sonunda okunur
+    outputs = [None] * len(items)
+    timings = np.empty(len(items))
+    rss_samples = [current_rss_kb()]
+    start_all = time.perf_counter()
+    for i, item in enumerate(items):
+        start = time.perf_counter()
+        outputs[i] = func(item)
+        timings[i] = time.perf_counter() - start
+        if i % RSS_SAMPLE_EVERY == RSS_SAMPLE_EVERY - 1 and rss_samples[0] is not None:
+            rss_samples.append(current_rss_kb())
+    total = time.perf_counter() - start_all
+    rss_samples.append(current_rss_kb())
+    return outputs, summarize(timings, sum(rows_per_item), total, rss_samples)
+
+
+def bench_mode(lines, batch_size, model, scaler, label_encoder, pipeline):
+    # batch_size=1: satır başına; aksi halde batch_size satırlık bloklar
+    if batch_size == 1:
+        chunks = lines
+        rows_per_item = [1] * len(lines)
+
+        def decode(chunk):
+            return [chunk.decode('utf-8').strip()]
+    else:
+        chunks = [b"".join(lines[i:i + batch_size]) for i in range(0, len(lines), batch_size)]
+        rows_per_item = [min(batch_size, len(lines) - i) for i in range(0, len(lines), batch_size)]
+        framer = LineFramer()
+        decode = framer.feed
+
+    def parse(decoded):
+        return np.array([[float(v) for v in line.split("DATA:", 1)[1].split(',')] for line in decoded])
+
+    results = {}
+    decoded, results["decode"] = run_stage(decode, chunks, rows_per_item)
+    features, results["parse"] = run_stage(parse, decoded, rows_per_item)
+    scaled, results["scale"] = run_stage(scaler.transform, features, rows_per_item)
+    predicted, results["predict"] = run_stage(model.predict, scaled, rows_per_item)
+    names, results["inverse"] = run_stage(label_encoder.inverse_transform, predicted, rows_per_item)
+    compiled, results["compiled"] = run_stage(pipeline.predict, features, rows_per_item)
+
+    # Derlenmiş hat eski yol ile aynı sonucu vermeli
+    mismatch = sum(int(np.count_nonzero(a != b)) for a, b in zip(names, compiled))
+    return results, mismatch
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tahmin hattı aşamalarının gecikme/verim ölçümü.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Tekrar oynatılacak CSV dosyası")
+    parser.add_argument("--model-dir", default=BBBPredict.MODEL_DIR, help="joblib model dosyalarının klasörü")
+    parser.add_argument("--repeat", type=int, default=1, help="Veri seti kaç kez tekrar oynatılsın")
+    parser.add_argument("--batch", type=int, nargs="+", default=[16, 64], help="Toplu mod blok boyutları")
+    parser.add_argument("--output", default="bench_inference.json", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    # Eğitimde DataFrame ile fit edilen scaler, numpy girdide her çağrıda uyarı basar; ölçümü bozmasın
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    rss_start = current_rss_kb()
+    model, scaler, label_encoder, source = load_model(args.model_dir, args.dataset)
+    pipeline = CompiledPipeline.from_sklearn(scaler, model, label_encoder.classes_)
+    lines = load_lines(args.dataset, args.repeat)
+    print(f"Model: {source} ({type(model).__name__}), {len(lines)} satır")
+
+    # Isınma: ilk çağrılardaki tembel import ve önbellek etkileri ölçüme girmesin
+    bench_mode(lines[:32], 1, model, scaler, label_encoder, pipeline)
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "model_source": source,
+        "model_type": type(model).__name__,
+        "rows": len(lines),
+        "rss_kb_before_model": rss_start,
+        "modes": {},
+    }
+    for batch_size in [1] + [b for b in args.batch if b > 1]:
+        mode = "row" if batch_size == 1 else f"batch{batch_size}"
+        results, mismatch = bench_mode(lines, batch_size, model, scaler, label_encoder, pipeline)
+        report["modes"][mode] = {"batch_size": batch_size, "compiled_mismatch": mismatch, "stages": results}
+
+        print(f"\n--- {mode} (blok boyutu {batch_size}) ---")
+        print(f"{'aşama':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'satır/s':>11} "
+              f"{'aşama tepe RSS MB':>18} {'RSS değişimi MB':>16}")
+        for stage in STAGES:
+            r = results[stage]
+            memory = (f"{r['stage_peak_rss_kb'] / 1024:18.1f} {r['rss_delta_kb'] / 1024:+16.1f}"
+                      if r["rss_kb"] is not None else f"{'-':>18} {'-':>16}")
+            print(f"{stage:<10} {r['p50_ms']:9.4f} {r['p95_ms']:9.4f} {r['p99_ms']:9.4f} "
+                  f"{r['rows_per_sec']:11.0f} {memory}")
+        legacy = sum(results[stage]["rows_per_sec"] ** -1 for stage in ("scale", "predict", "inverse"))
+        print(f"eski yol (scale+predict+inverse) {1 / legacy:.0f} satır/s, "
+              f"compiled {results['compiled']['rows_per_sec']:.0f} satır/s")
+        if mismatch:
+            print(f"UYARI: CompiledPipeline {mismatch} satırda eski yoldan farklı!")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSonuçlar '{args.output}' dosyasına yazıldı.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+import tty
+import warnings
+
+import numpy as np
+
+import BBBPredict
+from bench_inference import DEFAULT_DATASET, load_model
+from enrollment import load_samples, user_names
+from flat_forest import export_forest
+from metrics import METRICS
+from model_bundle import save_bundle
+from serial_reader import LineFramer, SerialLineReader
+from wire_format import WireFramer
+
+# Tahmin işçisinin (inference_worker.py) G/Ç gecikmesine etkisi.
+# BBBPredict'in tek cihazlı döngüsü bir pty'yi /dev/rfcomm0 yerine okur; ayrı bir yazıcı süreç
+# veri setindeki oturumları --rate örnek/s hızında gönderir. Aynı döngüye ikinci bir "ping" pty'si
+# eklenir (SerialLineReader.watch); yazıcı her --ping-interval saniyede bir gönderim anını yazar ve
+# döngünün satırı ne kadar sonra işlediği ölçülür. Tahmin döngüde çalışırken (inline) ping'ler tahmin
+# bitene kadar bekler; işçi modunda döngü yalnızca okur ve gecikme tahmin yükünden bağımsız kalmalıdır.
+# Tahmin yükü --inference-repeat ile yapay olarak artırılır (her tahmin çağrısı modeli N kez çalıştırır;
+# büyük bir modelin veya yavaş bir kartın yerine geçer). Süreçler varsayılan olarak tek çekirdeğe
+# sabitlenir (--cpus 1, BBB'nin tek çekirdekli AM335x'i gibi).
+# Modlar: inline, worker ve worker_kill (işçi her --kill-every saniyede SIGKILL ile öldürülür;
+# oturumlar yine karara bağlanmalı ve kararlar değişmemelidir).
+# Raporlanan: ping gecikmesi p50/p95/p99/en büyük, karara bağlanan oturumlar, inline ile karar
+# uyumu, işçi yeniden başlatma ve atılan satır sayıları.
+
+
+class HeavyPipeline:
+    # Her tahmin çağrısında modeli repeat kez çalıştırır; sonuçlar değişmez, yalnızca süre artar
+    def __init__(self, pipeline, repeat):
+        self.pipeline = pipeline
+        self.repeat = repeat
+        self.classes = pipeline.classes
+        self.n_features = pipeline.n_features
+
+    def predict_encoded(self, features):
+        for _ in range(self.repeat - 1):
+            self.pipeline.predict_encoded(features)
+        return self.pipeline.predict_encoded(features)
+
+    def predict_proba(self, features):
+        for _ in range(self.repeat - 1):
+            self.pipeline.predict_proba(features)
+        return self.pipeline.predict_proba(features)
+
+    def predict(self, features):
+        return self.classes[self.predict_encoded(features)]
+
+
+def open_pty():
+    # (master, slave); slave ham modda, satır düzenleme/yankı yok (serial.Serial'ın yaptığı gibi)
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    return master, slave
+
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def writer(data_fd, ping_fd, sessions, rate, ping_interval, done_fd):
+    # Ayrı süreç: oturum satırlarını ve ping'leri zaman çizelgesine göre gönderir
+    lines = []
+    for rows in sessions:
+        lines.append(b"CMD:START_SWIPE\r\n")
+        lines.extend(("DATA:" + ",".join(str(int(v)) for v in row) + "\r\n").encode() for row in rows)
+        lines.append(b"CMD:DATA_SENT\r\n")
+    period = 1.0 / rate
+    start = time.monotonic()
+    next_ping = start
+    for i, line in enumerate(lines):
+        due = start + i * period
+        while True:
+            current = time.monotonic()
+            if current >= next_ping:
+                write_all(ping_fd, b"PING:%d\n" % time.monotonic_ns())
+                next_ping += ping_interval
+            if current >= due:
+                break
+            time.sleep(max(0.0, min(due, next_ping) - current))
+        write_all(data_fd, line)
+    os.write(done_fd, b"1")
+
+
+def wait_for(condition, timeout, message):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError(message)
+        time.sleep(0.01)
+
+
+def run_mode(mode, sessions, args):
+    # Bir modu baştan sona çalıştırır: (ping gecikmeleri ms, kararlar, sayaç farkları)
+    BBBPredict.INFERENCE_WORKER = mode != "inline"
+    BBBPredict.compiled_pipeline = None
+    BBBPredict._devices.clear()
+    before = METRICS.snapshot()["counters"]
+    decisions = []
+    finish_session = BBBPredict._finish_session
+
+    def record_finish(state):
+        if state.aggregator is not None and state.pipeline is not None and state.aggregator.vote()[2]:
+            decisions.append(state.labels[state.aggregator.vote()[0]])
+        else:
+            decisions.append(None)
+        finish_session(state)
+
+    latencies = []
+    ping_framer = LineFramer()
+    data_master, data_slave = open_pty()
+    ping_master, ping_slave = open_pty()
+    done_r, done_w = os.pipe()
+
+    def on_ping():
+        received = time.monotonic_ns()
+        for line in ping_framer.feed(os.read(ping_slave, 4096)):
+            latencies.append((received - int(line[5:])) / 1e6)
+
+    BBBPredict._finish_session = record_finish
+    killer_stop = threading.Event()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if not BBBPredict.load_models():
+                raise RuntimeError("Model yüklenemedi")
+            reader = SerialLineReader(data_slave, framer=WireFramer())
+            BBBPredict.register_handlers(reader)
+            reader.watch(ping_slave, on_ping)
+            if BBBPredict._worker is not None:
+                reader.watch(BBBPredict._worker.fileno(), BBBPredict._on_worker_ready)
+            reader_thread = threading.Thread(target=reader.run, name="reader")
+            reader_thread.start()
+            if mode == "worker_kill":
+                def killer():
+                    while not killer_stop.wait(args.kill_every):
+                        pid = BBBPredict._worker.pid
+                        if pid is not None:
+                            with contextlib.suppress(ProcessLookupError):
+                                os.kill(pid, signal.SIGKILL)
+                threading.Thread(target=killer, name="killer", daemon=True).start()
+            process = multiprocessing.get_context("fork").Process(
+                target=writer, args=(data_master, ping_master, sessions, args.rate, args.ping_interval, done_w))
+            process.start()
+            try:
+                process.join()
+                killer_stop.set()
+                wait_for(lambda: len(decisions) >= len(sessions), 60.0, f"{mode}: tüm oturumlar karara bağlanmadı")
+            finally:
+                reader.stop()
+                reader_thread.join()
+                reader.close()
+    finally:
+        killer_stop.set()
+        BBBPredict._finish_session = finish_session
+        BBBPredict.stop_worker()
+        for fd in (data_master, data_slave, ping_master, ping_slave, done_r, done_w):
+            os.close(fd)
+    after = METRICS.snapshot()["counters"]
+    counters = {name: after.get(name, 0) - before.get(name, 0)
+                for name in ("worker_restarts", "inference_rows_dropped", "worker_backpressure", "inference_rows")}
+    return np.array(latencies), decisions, counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tahmin işçisinin seri G/Ç gecikmesine etkisi (pty ile).")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Oturumların alınacağı CSV dosyası")
+    parser.add_argument("--model-dir", default=BBBPredict.MODEL_DIR, help="joblib model dosyalarının klasörü")
+    parser.add_argument("--sessions", type=int, default=20, help="Gönderilecek oturum sayısı")
+    parser.add_argument("--rate", type=float, default=100.0, help="Saniyedeki satır sayısı")
+    parser.add_argument("--ping-interval", type=float, default=0.005, help="Ping aralığı (saniye)")
+    parser.add_argument("--inference-repeat", type=int, default=20, help="Yapay tahmin yükü çarpanı")
+    parser.add_argument("--kill-every", type=float, default=0.5, help="worker_kill modunda işçinin öldürülme aralığı (saniye)")
+    parser.add_argument("--cpus", type=int, default=1, help="Sabitlenecek çekirdek sayısı (0: sabitleme yok)")
+    parser.add_argument("--modes", nargs="+", default=["inline", "worker", "worker_kill"],
+                        choices=["inline", "worker", "worker_kill"], help="Çalıştırılacak modlar")
+    parser.add_argument("--output", default="bench_inference_worker.json", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    if args.cpus:
+        os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:args.cpus])
+    model, scaler, label_encoder, source = load_model(args.model_dir, args.dataset)
+    user_trials, features = load_samples(args.dataset)
+    trials, first = np.unique(user_trials, return_index=True)
+    picked = np.random.default_rng(0).choice(trials[np.argsort(first)], args.sessions, replace=False)
+    sessions = [features[user_trials == trial] for trial in picked]
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Model paket olarak yazılır; işçi de BBBPredict'in normal yükleme yolunu kullanır
+        BBBPredict.BUNDLE_FILENAME = os.path.join(model_dir, "swipe_model.bundle.npy")
+        BBBPredict.SESSION_FOREST_FILENAME = os.path.join(model_dir, "session_forest.npz")
+        save_bundle(BBBPredict.BUNDLE_FILENAME, export_forest(model, scaler, label_encoder.classes_))
+        BBBPredict.INFERENCE_ENGINE = "bundle"
+        BBBPredict.QUIET = True
+        BBBPredict.MODEL_RELOAD_INTERVAL = None
+        load_pipeline = BBBPredict._load_pipeline
+        BBBPredict._load_pipeline = lambda: (lambda pipeline, version: (HeavyPipeline(pipeline, args.inference_repeat), version))(*load_pipeline())
+
+        heavy, _ = BBBPredict._load_pipeline()
+        heavy.predict_proba(sessions[0][:8])
+        start = time.perf_counter()
+        heavy.predict_proba(sessions[0][:8])
+        call_ms = (time.perf_counter() - start) * 1000.0
+        print(f"Model: {source}; {args.sessions} oturum ({sum(map(len, sessions))} satır), {args.rate:.0f} satır/s, "
+              f"tahmin yükü x{args.inference_repeat} (8 satırlık çağrı {call_ms:.1f} ms), "
+              f"{len(os.sched_getaffinity(0))} çekirdek\n")
+
+        report = {"model_source": source, "sessions": args.sessions, "rate": args.rate,
+                  "inference_repeat": args.inference_repeat, "call_8_rows_ms": call_ms,
+                  "cpus": len(os.sched_getaffinity(0)), "modes": {}}
+        truth = user_names(picked)
+        reference = None
+        print(f"{'mod':<12} {'ping p50':>9} {'p95':>8} {'p99':>8} {'en büyük':>9} {'oturum':>7} {'doğru':>6} "
+              f"{'uyum':>6} {'yeniden b.':>10} {'atılan':>7}")
+        for mode in args.modes:
+            latencies, decisions, counters = run_mode(mode, sessions, args)
+            if reference is None:
+                reference = decisions
+            result = {
+                "ping_p50_ms": float(np.percentile(latencies, 50)),
+                "ping_p95_ms": float(np.percentile(latencies, 95)),
+                "ping_p99_ms": float(np.percentile(latencies, 99)),
+                "ping_max_ms": float(latencies.max()),
+                "pings": len(latencies),
+                "sessions_decided": sum(d is not None for d in decisions),
+                "session_accuracy": float(np.mean([d == t for d, t in zip(decisions, truth)])),
+                "agreement_with_first_mode": float(np.mean([a == b for a, b in zip(decisions, reference)])),
+                **counters,
+            }
+            report["modes"][mode] = result
+            print(f"{mode:<12} {result['ping_p50_ms']:9.2f} {result['ping_p95_ms']:8.2f} {result['ping_p99_ms']:8.2f} "
+                  f"{result['ping_max_ms']:9.2f} {result['sessions_decided']:7d} {result['session_accuracy']:6.2f} "
+                  f"{result['agreement_with_first_mode']:6.2f} {counters['worker_restarts']:10d} "
+                  f"{counters['inference_rows_dropped']:7d}")
+
+    print("\nPing gecikmesi ms cinsindendir (yazıcının gönderimi -> döngünün satırı işlemesi).")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Sonuçlar '{args.output}' dosyasına yazıldı.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import mqtt_pipeline
+from mqtt_pipeline import MQTT_ERR_NO_CONN, MQTT_ERR_SUCCESS, MqttPublishPipeline
+
+# --- MQTT publish pipeline check ---
+# Drives MqttPublishPipeline through a stand-in client that behaves like paho-mqtt 2.x with QoS1:
+# mids count up and wrap at 65535, PUBACKs arrive on a separate "network" thread (or, optionally,
+# before publish() has returned), publish() while disconnected returns MQTT_ERR_NO_CONN but keeps the
+# message, and unacked messages are resent with the same mid after reconnecting.
+# Scenarios: healthy broker, early PUBACK race, offline spooling, rate-limited drain after reconnecting,
+# disconnect with unacked messages, a publish racing a disconnect, and a stale early ack. Each reports its checks; the exit code is
+# non-zero if any check fails.
+
+
+class _Result:
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+
+class FakeBrokerClient:
+    """
+    In-process stand-in for a connected paho Client and its broker.
+
+    :param ack_delay: Seconds between delivering a message and its PUBACK.
+    :param early_ack: Deliver the PUBACK from inside publish(), before the mid is returned.
+    """
+
+    def __init__(self, ack_delay=0.001, early_ack=False):
+        self.ack_delay = ack_delay
+        self.early_ack = early_ack
+        self.acks_enabled = True
+        self.stale_connected = False  # is_connected() still True after the link dropped (a race in paho)
+        self.pipeline = None
+        self.received = []        # (payload, dup) in the order the broker got them
+        self.publish_calls = {}   # payload -> publish() calls
+        self._connected = True
+        self._mid = 0
+        self._unacked = {}        # mid -> payload, kept for resending like paho's out-message queue
+        self._lock = threading.Lock()
+        self._acks = queue.Queue()
+        self._stop = threading.Event()
+        self._network = threading.Thread(target=self._network_loop, daemon=True)
+        self._network.start()
+
+    def is_connected(self):
+        return self._connected or self.stale_connected
+
+    def publish(self, topic, payload, qos=0):
+        with self._lock:
+            self._mid = self._mid % 65535 + 1
+            mid = self._mid
+            self.publish_calls[payload] = self.publish_calls.get(payload, 0) + 1
+            self._unacked[mid] = payload
+            if not self._connected:
+                return _Result(MQTT_ERR_NO_CONN, mid)
+            self._deliver(mid, payload, dup=False)
+        if self.early_ack and self.acks_enabled:
+            self._ack(mid)
+        return _Result(MQTT_ERR_SUCCESS, mid)
+
+    def disconnect(self):
+        with self._lock:
+            self._connected = False
+        self.pipeline.connection_lost()
+
+    def reconnect(self):
+        with self._lock:
+            self._connected = True
+            for mid, payload in sorted(self._unacked.items()):
+                self._deliver(mid, payload, dup=True)
+
+    def close(self):
+        self._stop.set()
+        self._network.join()
+
+    def _deliver(self, mid, payload, dup):
+        self.received.append((payload, dup))
+        if not self.early_ack and self.acks_enabled:
+            self._acks.put((time.monotonic() + self.ack_delay, mid))
+
+    def _network_loop(self):
+        while not self._stop.is_set():
+            try:
+                due, mid = self._acks.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            time.sleep(max(0.0, due - time.monotonic()))
+            if self._connected:    # a PUBACK in flight during a disconnect is lost
+                self._ack(mid)
+
+    def _ack(self, mid):
+        with self._lock:
+            if self._unacked.pop(mid, None) is None:
+                return
+        self.pipeline.acknowledge(mid)
+
+
+def submit_sessions(pipeline, first, count, rows=5, pace=0.0):
+    # pace: seconds between sessions (a swipe panel sends a session every few seconds)
+    payloads = []
+    for n in range(first, first + count):
+        lines = [f"{n},{i}," + ",".join(["0"] * 18) for i in range(rows)]
+        pipeline.submit("CMD:START_SWIPE")
+        for line in lines:
+            pipeline.submit(line)
+        pipeline.submit("CMD:DATA_SENT")
+        payloads.append("\n".join(lines))
+        if pace:
+            time.sleep(pace)
+    return payloads
+
+
+def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def make_pipeline(client, spool_dir, drain_rate=1000.0, max_inflight=20):
+    pipeline = MqttPublishPipeline(client, "bench/swipes", spool_dir, qos=1, queue_size=100000,
+                                   max_inflight=max_inflight,
+                                   drain_rate=drain_rate, session_timeout=0.2, verbose=False)
+    client.pipeline = pipeline
+    pipeline.start()
+    return pipeline
+
+
+def spool_files(spool_dir):
+    return sorted(name for name in os.listdir(spool_dir) if name.endswith(".msg"))
+
+
+def once_each(client, payloads):
+    return all(client.publish_calls.get(payload) == 1 for payload in payloads)
+
+
+def scenario_healthy(spool_dir, sessions):
+    client = FakeBrokerClient()
+    pipeline = make_pipeline(client, spool_dir)
+    payloads = submit_sessions(pipeline, 0, sessions, pace=0.005)
+    settled = wait_for(lambda: pipeline.stats()["acked"] == sessions, 5.0)
+    stats = pipeline.stats()
+    pipeline.stop()
+    client.close()
+    return stats, {
+        "all_acked": settled,
+        "nothing_spooled": stats["sessions_spooled"] == 0 and not spool_files(spool_dir),
+        "published_once": once_each(client, payloads),
+        "in_order": [payload for payload, _ in client.received] == payloads,
+    }
+
+
+def scenario_early_ack(spool_dir, sessions):
+    client = FakeBrokerClient(early_ack=True)
+    pipeline = make_pipeline(client, spool_dir)
+    payloads = submit_sessions(pipeline, 0, sessions)
+    settled = wait_for(lambda: pipeline.stats()["acked"] == sessions, 5.0)
+    stats = pipeline.stats()
+    pipeline.stop()
+    client.close()
+    return stats, {
+        "all_acked": settled,
+        "no_inflight_left": stats["inflight"] == 0,
+        "no_early_acks_left": not pipeline._early_acks,
+        "published_once": once_each(client, payloads),
+    }
+
+
+def scenario_offline_then_drain(spool_dir, sessions, drain_rate):
+    client = FakeBrokerClient()
+    client._connected = False
+    pipeline = make_pipeline(client, spool_dir, drain_rate=drain_rate)
+    payloads = submit_sessions(pipeline, 0, sessions)
+    spooled = wait_for(lambda: pipeline.stats()["sessions_spooled"] == sessions, 5.0)
+    offline_files = len(spool_files(spool_dir))
+    offline_calls = sum(client.publish_calls.values())
+
+    start = time.monotonic()
+    client.reconnect()
+    drained = wait_for(lambda: pipeline.stats()["acked"] == sessions, sessions / drain_rate + 5.0)
+    elapsed = time.monotonic() - start
+    stats = pipeline.stats()
+    pipeline.stop()
+    client.close()
+    # The first payload goes out right away, then one every 1/drain_rate seconds
+    rate = (sessions - 1) / elapsed if elapsed > 0 else float("inf")
+    stats.update({"drain_seconds": elapsed, "drain_rate_measured": rate})
+    return stats, {
+        "spooled_while_offline": spooled and offline_files == sessions and offline_calls == 0,
+        "all_drained_and_acked": drained and not spool_files(spool_dir),
+        "rate_limited": rate <= drain_rate * 1.1,
+        "in_order": [payload for payload, _ in client.received] == payloads,
+        "published_once": once_each(client, payloads),
+    }
+
+
+def scenario_disconnect_unacked(spool_dir, sessions):
+    client = FakeBrokerClient()
+    client.acks_enabled = False
+    pipeline = make_pipeline(client, spool_dir, max_inflight=sessions + 10)
+    payloads = submit_sessions(pipeline, 0, sessions)
+    sent = wait_for(lambda: pipeline.stats()["sessions_published"] == sessions, 5.0)
+    client.disconnect()
+    # Sessions ending while disconnected wait in the spool
+    late = submit_sessions(pipeline, sessions, 2)
+    spooled = wait_for(lambda: pipeline.stats()["sessions_spooled"] == 2, 5.0)
+    client.acks_enabled = True
+    client.reconnect()
+    settled = wait_for(lambda: pipeline.stats()["acked"] == sessions + 2, 5.0)
+    stats = pipeline.stats()
+    pipeline.stop()
+    client.close()
+    delivered = {payload for payload, _ in client.received}
+    return stats, {
+        "unacked_published_before_disconnect": sent,
+        "new_sessions_spooled_while_offline": spooled,
+        "all_acked_after_reconnect": settled and stats["inflight"] == 0,
+        "unacked_not_respooled": stats["sessions_spooled"] == 2 and not spool_files(spool_dir),
+        "published_once": once_each(client, payloads + late),
+        "all_delivered": delivered == set(payloads + late),
+    }
+
+
+def scenario_no_conn_race(spool_dir, sessions):
+    # The link drops between is_connected() and publish(): MQTT_ERR_NO_CONN, but the client keeps the message
+    client = FakeBrokerClient()
+    client._connected = False
+    client.stale_connected = True
+    pipeline = make_pipeline(client, spool_dir)
+    payloads = submit_sessions(pipeline, 0, sessions)
+    queued = wait_for(lambda: pipeline.stats()["sessions_published"] == sessions, 5.0)
+    client.stale_connected = False
+    client.reconnect()
+    settled = wait_for(lambda: pipeline.stats()["acked"] == sessions, 5.0)
+    stats = pipeline.stats()
+    pipeline.stop()
+    client.close()
+    return stats, {
+        "queued_by_client": queued and stats["publish_failures"] == 0,
+        "all_acked_after_reconnect": settled and stats["inflight"] == 0,
+        "nothing_spooled": stats["sessions_spooled"] == 0 and not spool_files(spool_dir),
+        "published_once": once_each(client, payloads),
+    }
+
+
+def scenario_stale_early_ack(spool_dir):
+    # An ack for a mid that was never registered must expire instead of completing a later publish
+    client = FakeBrokerClient()
+    client.acks_enabled = False
+    pipeline = make_pipeline(client, spool_dir)
+    saved_ttl = mqtt_pipeline.EARLY_ACK_TTL
+    mqtt_pipeline.EARLY_ACK_TTL = 0.05
+    try:
+        pipeline.acknowledge(1)
+        time.sleep(0.1)
+        submit_sessions(pipeline, 0, 1)
+        published = wait_for(lambda: pipeline.stats()["sessions_published"] == 1, 5.0)
+        stats = pipeline.stats()
+    finally:
+        mqtt_pipeline.EARLY_ACK_TTL = saved_ttl
+    pipeline.stop()
+    client.close()
+    return stats, {
+        "published": published,
+        "not_falsely_acked": stats["acked"] == 0 and stats["inflight"] == 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT publish pipeline check with a stand-in paho client.")
+    parser.add_argument("--sessions", type=int, default=200, help="Sessions per scenario")
+    parser.add_argument("--drain-sessions", type=int, default=20, help="Sessions spooled while offline")
+    parser.add_argument("--drain-rate", type=float, default=20.0, help="Spool drain rate (payloads/s)")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        scenarios = [
+            ("healthy", lambda d: scenario_healthy(d, args.sessions)),
+            ("early_puback", lambda d: scenario_early_ack(d, args.sessions)),
+            ("offline_then_drain", lambda d: scenario_offline_then_drain(d, args.drain_sessions, args.drain_rate)),
+            ("disconnect_unacked", lambda d: scenario_disconnect_unacked(d, 10)),
+            ("no_conn_race", lambda d: scenario_no_conn_race(d, 5)),
+            ("stale_early_ack", scenario_stale_early_ack),
+        ]
+        for name, run in scenarios:
+            spool_dir = os.path.join(tmp, name)
+            stats, checks = run(spool_dir)
+            results[name] = {"stats": stats, "checks": checks}
+            failed = [check for check, ok in checks.items() if not ok]
+            print(f"{name:<20} {'OK' if not failed else 'FAILED: ' + ', '.join(failed)}")
+            if name == "offline_then_drain":
+                print(f"{'':<20} drained {args.drain_sessions} payloads in {stats['drain_seconds']:.2f} s "
+                      f"({stats['drain_rate_measured']:.1f}/s, limit {args.drain_rate:.1f}/s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+    ok = all(all(result["checks"].values()) for result in results.values())
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
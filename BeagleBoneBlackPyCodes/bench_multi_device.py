@@ -0,0 +1,192 @@
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+
+import BBBPredict
+from bench_inference import DEFAULT_DATASET, load_model
+from compiled_pipeline import CompiledPipeline
+from enrollment import load_samples, user_names
+from metrics import METRICS
+from serial_reader import MultiDeviceReader
+
+# Çok cihazlı tahmin modunun pty ile yük testi.
+# Her swipe paneli için bir pty açılır; BBBPredict'in çok cihazlı döngüsü (MultiDeviceReader +
+# DeviceSession + ortak toplu tahmin) pty'lerin slave uçlarını /dev/rfcommN yerine sembolik
+# bağlantılar üzerinden açar. Her cihaz için bir yazıcı iş parçacığı veri setindeki oturumları
+# ESP32 protokolüyle (CMD:START_SWIPE, DATA:..., CMD:DATA_SENT) --rate örnek/s hızında gönderir.
+# Oturumların ortasında --disconnect cihazının pty'si kapatılıp yenisi açılır (Bluetooth kopması ve
+# rfcomm'un yeniden bağlanması); okuyucu cihazı yeniden açmalı, diğer cihazlar etkilenmemelidir.
+# Raporlanan: karar verilen/gönderilen oturumlar, CMD:DATA_SENT'ten karara gecikme, satır/s,
+# ortak tahmin çağrısı başına satır (cihazlar arası toplu tahminin etkisi) ve yeniden bağlanma sayısı.
+
+
+class PtyDevice:
+    # Seri cihaz yerine geçen pty; path sabit kalır, yeniden bağlanmada yeni pty'ye yönlendirilir
+    def __init__(self, path):
+        self.path = path
+        self.master = None
+        self.open()
+
+    def open(self):
+        master, slave = os.openpty()
+        tmp_link = f"{self.path}.tmp"
+        os.symlink(os.ttyname(slave), tmp_link)
+        os.replace(tmp_link, self.path)
+        os.close(slave)
+        self.master = master
+
+    def close(self):
+        if self.master is not None:
+            os.close(self.master)
+            self.master = None
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.master, view):]
+
+
+def writer(device_id, device, sessions, rate, disconnect_at, reader, sent, decided, timeout):
+    # Oturumları sırayla gönderir; disconnect_at numaralı oturumdan önce bağlantıyı koparır
+    period = 1.0 / rate if rate > 0 else 0.0
+    for i, (trial, rows) in enumerate(sessions):
+        if i == disconnect_at:
+            # pty kapanınca okunmamış baytlar kaybolur; önceki oturumlar karara bağlanınca koparılır
+            wait_for(lambda: len(decided.get(device_id, [])) >= i, timeout, "Oturumlar zamanında karara bağlanmadı")
+            device.close()
+            wait_for(lambda: device_id not in reader.connected, timeout, "Cihazın kopması fark edilmedi")
+            device.open()
+            wait_for(lambda: device_id in reader.connected, timeout, "Cihaz zamanında yeniden bağlanmadı")
+        device.write(b"CMD:START_SWIPE\r\n")
+        for row in rows:
+            device.write(("DATA:" + ",".join(str(int(v)) for v in row) + "\r\n").encode())
+            if period:
+                time.sleep(period)
+        sent[device_id].append((trial, time.monotonic()))
+        device.write(b"CMD:DATA_SENT\r\n")
+
+
+def wait_for(condition, timeout, message):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError(message)
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Çok cihazlı tahmin modunun pty ile yük testi.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Oturumların alınacağı CSV dosyası")
+    parser.add_argument("--model-dir", default=BBBPredict.MODEL_DIR, help="joblib model dosyalarının klasörü")
+    parser.add_argument("--devices", type=int, default=4, help="Cihaz (pty) sayısı")
+    parser.add_argument("--sessions", type=int, default=10, help="Cihaz başına oturum")
+    parser.add_argument("--rate", type=float, default=10.0, help="Cihaz başına örnek/s (0: beklemeden)")
+    parser.add_argument("--disconnect", type=int, default=0, help="Bağlantısı koparılacak cihaz (-1: hiçbiri)")
+    parser.add_argument("--output", default="bench_multi_device.json", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model, scaler, label_encoder, source = load_model(args.model_dir, args.dataset)
+    BBBPredict.QUIET = True
+    BBBPredict.MODEL_RELOAD_INTERVAL = None
+    BBBPredict.DEVICE_RECONNECT_INTERVAL = 0.2
+    BBBPredict._install_pipeline(CompiledPipeline.from_sklearn(scaler, model, label_encoder.classes_), 0)
+
+    user_trials, features = load_samples(args.dataset)
+    trials, first = np.unique(user_trials, return_index=True)
+    trials = trials[np.argsort(first)]
+    rng = np.random.default_rng(0)
+
+    # Karar anı ve kararı kaydetmek için _finish_session sarılır (işleyiciler kaydedilmeden önce)
+    decided = {}
+    finish_session = BBBPredict._finish_session
+
+    def record_finish(state):
+        if state.aggregator is not None and state.pipeline is not None and state.aggregator.vote()[2]:
+            winner = state.labels[state.aggregator.vote()[0]]
+            decided.setdefault(state.device_id, []).append((winner, time.monotonic()))
+        finish_session(state)
+
+    BBBPredict._finish_session = record_finish
+
+    with tempfile.TemporaryDirectory() as device_dir:
+        devices = {f"panel{i}": PtyDevice(os.path.join(device_dir, f"rfcomm{i}")) for i in range(args.devices)}
+        BBBPredict.SERIAL_PORT_DEVICES = {device_id: device.path for device_id, device in devices.items()}
+        import serial
+        reader = MultiDeviceReader(BBBPredict.SERIAL_PORT_DEVICES, lambda path: serial.Serial(path, timeout=1),
+                                   BBBPredict._setup_device, reconnect_interval=BBBPredict.DEVICE_RECONNECT_INTERVAL)
+        reader.on_batch_end(BBBPredict._flush_all)
+        sent = {device_id: [] for device_id in devices}
+        disconnect_id = f"panel{args.disconnect}" if 0 <= args.disconnect < args.devices else None
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            reader_thread = threading.Thread(target=reader.run, name="reader")
+            reader_thread.start()
+            wait_for(lambda: len(reader.connected) == len(devices), 5.0, "Cihazlar zamanında açılmadı")
+            writers = []
+            for device_id, device in devices.items():
+                picked = rng.choice(trials, args.sessions, replace=False)
+                sessions = [(trial, features[user_trials == trial]) for trial in picked]
+                writers.append(threading.Thread(target=writer, args=(
+                    device_id, device, sessions, args.rate,
+                    args.sessions // 2 if device_id == disconnect_id else -1, reader, sent, decided, 30.0)))
+            start = time.monotonic()
+            for thread in writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            try:
+                wait_for(lambda: sum(map(len, decided.values())) >= args.devices * args.sessions, 30.0,
+                         "Tüm oturumlar karara bağlanmadı")
+            finally:
+                elapsed = time.monotonic() - start
+                reader.stop()
+                reader_thread.join()
+        reader.close()
+        for device in devices.values():
+            device.close()
+
+    latencies = []
+    correct = total = 0
+    for device_id, sessions in sent.items():
+        for (trial, sent_at), (winner, decided_at) in zip(sessions, decided.get(device_id, [])):
+            latencies.append((decided_at - sent_at) * 1000.0)
+            correct += int(winner == user_names([trial])[0])
+            total += 1
+    counters = METRICS.snapshot()["counters"]
+    rows = counters.get("inference_rows", 0)
+    report = {
+        "model_source": source,
+        "devices": args.devices,
+        "sessions_sent": sum(map(len, sent.values())),
+        "sessions_decided": total,
+        "session_accuracy": correct / total if total else None,
+        "rows": rows,
+        "rows_per_sec": rows / elapsed,
+        "elapsed_s": elapsed,
+        "rows_per_inference_call": rows / max(counters.get("inference_calls", 0), 1),
+        "decision_latency_p50_ms": float(np.percentile(latencies, 50)),
+        "decision_latency_p95_ms": float(np.percentile(latencies, 95)),
+        "device_connects": counters.get("device_connects", 0),
+        "device_disconnects": counters.get("device_disconnects", 0),
+    }
+    print(f"{args.devices} cihaz, {report['sessions_decided']}/{report['sessions_sent']} oturum karara bağlandı "
+          f"(doğruluk {report['session_accuracy']:.3f}); {elapsed:.1f} s içinde {rows} satır "
+          f"({report['rows_per_sec']:.0f} satır/s)")
+    print(f"Karar gecikmesi p50 {report['decision_latency_p50_ms']:.2f} ms, p95 {report['decision_latency_p95_ms']:.2f} ms; "
+          f"tahmin çağrısı başına {report['rows_per_inference_call']:.1f} satır")
+    print(f"Bağlantılar: {report['device_connects']} açılış, {report['device_disconnects']} kopma")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Sonuçlar '{args.output}' dosyasına yazıldı.")
+
+
+if __name__ == '__main__':
+    main()
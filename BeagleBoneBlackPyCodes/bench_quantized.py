@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+import BBBPredict
+from bench_inference import DEFAULT_DATASET, load_model
+from compiled_pipeline import CompiledPipeline
+from enrollment import load_samples, user_names
+from flat_forest import export_forest
+from model_bundle import save_bundle
+from quantized_forest import QuantizedPipeline, model_nbytes, quantize_forest
+
+# Nicemlenmiş modelin (quantized_forest.py) float modelle karşılaştırması:
+#   bellek   unpickle edilmiş sklearn modelin ağaç dizileri, düz float orman dizileri ve
+#            nicemlenmiş diziler; ayrıca paket dosyalarının diskteki boyutu
+#   gecikme  satır başına (N=1) p50/p95 ve --batch satırlık bloklarla satır/s
+#   doğruluk veri setinde satır ve oturum (çoğunluk oyu) doğruluğu, float modelle uyum ve
+#            en büyük olasılık farkı
+# Model: bench_inference.load_model (joblib dosyaları yoksa veri setiyle eğitilen yedek RF; bu durumda
+# doğruluk eğitim verisi üzerindedir ve yalnızca uyum/fark anlamlıdır).
+
+
+def sklearn_model_bytes(model):
+    # Unpickle edilmiş modelin ağaç dizileri; sklearn Tree belleği C tarafında ayırdığı için
+    # tracemalloc bunu görmez, dizi boyutları __getstate__ üzerinden toplanır
+    if hasattr(model, "estimators_"):
+        total = 0
+        for estimator in model.estimators_:
+            state = estimator.tree_.__getstate__()
+            total += state["nodes"].nbytes + state["values"].nbytes
+        return total
+    return len(model.get_booster().save_raw())
+
+
+def latency(pipeline, features, batch_size):
+    timings = np.empty(len(features))
+    for i, row in enumerate(features):
+        start = time.perf_counter()
+        pipeline.predict_encoded(row)
+        timings[i] = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(0, len(features), batch_size):
+        pipeline.predict_encoded(features[i:i + batch_size])
+    total = time.perf_counter() - start
+    timings *= 1000.0
+    return {
+        "row_p50_ms": float(np.percentile(timings, 50)),
+        "row_p95_ms": float(np.percentile(timings, 95)),
+        "batch_rows_per_sec": len(features) / total,
+    }
+
+
+def accuracy(pipeline, user_trials, features):
+    predicted = pipeline.predict(features).astype(str)
+    correct = predicted == user_names(user_trials)
+    sessions = [correct[user_trials == trial].mean() > 0.5 for trial in np.unique(user_trials)]
+    return predicted, float(correct.mean()), float(np.mean(sessions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nicemlenmiş ve float modelin bellek, gecikme ve doğruluk karşılaştırması.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="CSV dosyası veya column_store klasörü")
+    parser.add_argument("--model-dir", default=BBBPredict.MODEL_DIR, help="joblib model dosyalarının klasörü")
+    parser.add_argument("--latency-rows", type=int, default=1000, help="Gecikme ölçümünde kullanılan satır sayısı")
+    parser.add_argument("--batch", type=int, default=64, help="Toplu ölçümde blok boyutu")
+    parser.add_argument("--output", default="bench_quantized.json", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model, scaler, label_encoder, source = load_model(args.model_dir, args.dataset)
+    float_arrays = export_forest(model, scaler, label_encoder.classes_)
+    quantized_arrays = quantize_forest(float_arrays)
+    pipelines = {
+        "sklearn": CompiledPipeline.from_sklearn(scaler, model, label_encoder.classes_),
+        "float": CompiledPipeline.from_flat_forest(float_arrays),
+        "quantized": QuantizedPipeline(quantized_arrays),
+    }
+
+    pickle_size, sklearn_bytes = len(pickle.dumps((model, scaler))), sklearn_model_bytes(model)
+    with tempfile.TemporaryDirectory() as tmp:
+        save_bundle(os.path.join(tmp, "float.npy"), float_arrays)
+        save_bundle(os.path.join(tmp, "quantized.npy"), quantized_arrays)
+        float_file = os.path.getsize(os.path.join(tmp, "float.npy"))
+        quantized_file = os.path.getsize(os.path.join(tmp, "quantized.npy"))
+    memory = {
+        "sklearn_pickle_bytes": pickle_size,
+        "sklearn_unpickled_bytes": sklearn_bytes,
+        "float_arrays_bytes": model_nbytes(float_arrays),
+        "quantized_arrays_bytes": model_nbytes(quantized_arrays),
+        "float_bundle_file_bytes": float_file,
+        "quantized_bundle_file_bytes": quantized_file,
+    }
+    print(f"Model: {source}, {len(float_arrays['roots'])} ağaç, {len(float_arrays['feature'])} düğüm")
+    print(f"Bellek: sklearn (unpickle) {sklearn_bytes / 2**20:.1f} MB, float dizi {memory['float_arrays_bytes'] / 2**20:.1f} MB, "
+          f"nicemlenmiş {memory['quantized_arrays_bytes'] / 2**20:.1f} MB "
+          f"(paket dosyası {float_file / 2**20:.1f} MB -> {quantized_file / 2**20:.1f} MB)")
+
+    user_trials, features = load_samples(args.dataset)
+    sample = features[np.random.default_rng(0).permutation(len(features))[:args.latency_rows]]
+    report = {"model_source": source, "rows": len(features), "memory": memory, "engines": {}}
+    predictions = {}
+    print(f"\n{'motor':<10} {'satır p50 ms':>13} {'satır p95 ms':>13} {'toplu satır/s':>14} {'satır doğr.':>12} {'oturum doğr.':>13}")
+    for name, pipeline in pipelines.items():
+        pipeline.predict_encoded(sample[:32])  # ısınma
+        timing = latency(pipeline, sample, args.batch)
+        predictions[name], row_accuracy, session_accuracy = accuracy(pipeline, user_trials, features)
+        report["engines"][name] = dict(timing, row_accuracy=row_accuracy, session_accuracy=session_accuracy)
+        print(f"{name:<10} {timing['row_p50_ms']:13.3f} {timing['row_p95_ms']:13.3f} "
+              f"{timing['batch_rows_per_sec']:14.0f} {row_accuracy:12.4f} {session_accuracy:13.4f}")
+
+    agreement = float(np.mean(predictions["quantized"] == predictions["float"]))
+    proba_diff = float(np.abs(pipelines["quantized"].predict_proba(features)
+                              - pipelines["float"].predict_proba(features)).max())
+    report["agreement_with_float"] = agreement
+    report["max_proba_diff"] = proba_diff
+    report["accuracy_delta"] = report["engines"]["quantized"]["row_accuracy"] - report["engines"]["float"]["row_accuracy"]
+    print(f"\nNicemlenmiş model float modelle %{agreement * 100:.3f} uyumlu; en büyük olasılık farkı {proba_diff:.4f}, "
+          f"doğruluk farkı {report['accuracy_delta']:+.4f}")
+    if source == "synthetic":
+        print("Not: joblib dosyaları bulunamadı; model veri setinin tamamıyla eğitildi (doğruluk eğitim verisi üzerinde).")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Sonuçlar '{args.output}' dosyasına yazıldı.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import os
+import pty
+import threading
+import time
+import tty
+
+import numpy as np
+
+from serial_reader import SerialLineReader
+
+# --- Serial ingestion latency benchmark ---
+# A pty pair stands in for /dev/rfcomm0: a writer thread plays the ESP32 on the master side and
+# sends DATA: lines at the ESP32's ~100 ms sample rate, stamping each with its send time. The same
+# stream is read once with the old "in_waiting + sleep(0.05)" loop and once with SerialLineReader,
+# and the per-line latency (newline written -> handler called) and loop wakeups are compared.
+
+SAMPLE_FEATURES = "86,80,74,13,62,64,72,71,102,0,0,0,53,0,0,0,0,0"
+
+
+def open_pty_pair():
+    """Returns (master_fd, slave_fd, slave_path) with the slave in raw mode, like a serial port."""
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    return master, slave, os.ttyname(slave)
+
+
+def start_writer(master, count, interval, sent_at):
+    """Writes count DATA: lines to the pty master, recording each send time."""
+    def write_lines():
+        rng = np.random.default_rng(0)
+        for seq in range(count):
+            # Jitter so lines do not always land right after a poll tick
+            time.sleep(interval * rng.uniform(0.5, 1.5))
+            line = f"DATA:{seq},{SAMPLE_FEATURES}\n".encode()
+            sent_at[seq] = time.perf_counter()
+            os.write(master, line)
+
+    thread = threading.Thread(target=write_lines, daemon=True)
+    thread.start()
+    return thread
+
+
+def run_polling(slave_path, master, count, interval):
+    """The original loop from BBBPredict/BeagleBoneBlackCode main()."""
+    import serial
+
+    sent_at = np.zeros(count)
+    received_at = np.zeros(count)
+    wakeups = 0
+    ser = serial.Serial(slave_path, 9600, timeout=1)
+    writer = start_writer(master, count, interval, sent_at)
+    received = 0
+    start = time.perf_counter()
+    while received < count:
+        wakeups += 1
+        if ser.in_waiting > 0:
+            line = ser.readline().decode('utf-8', errors='ignore').strip()
+            if line.startswith("DATA:"):
+                seq = int(line[5:].split(',', 1)[0])
+                received_at[seq] = time.perf_counter()
+                received += 1
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    ser.close()
+    return received_at - sent_at, wakeups / elapsed
+
+
+def run_event_driven(slave, master, count, interval):
+    """The selector-based SerialLineReader."""
+    sent_at = np.zeros(count)
+    received_at = np.zeros(count)
+    reader = SerialLineReader(slave)
+    wakeups = 0
+    received = 0
+
+    def on_data(line):
+        nonlocal received
+        seq = int(line[5:].split(',', 1)[0])
+        received_at[seq] = time.perf_counter()
+        received += 1
+        if received == count:
+            reader.stop()
+
+    def on_batch_end():
+        nonlocal wakeups
+        wakeups += 1
+
+    reader.on_prefix("DATA:", on_data)
+    reader.on_batch_end(on_batch_end)
+    writer = start_writer(master, count, interval, sent_at)
+    start = time.perf_counter()
+    reader.run(timeout=10)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    reader.close()
+    return received_at - sent_at, wakeups / elapsed
+
+
+def report(name, latency, wakeups_per_sec):
+    ms = latency * 1000.0
+    print(f"{name:<14} p50={np.percentile(ms, 50):7.2f} ms  p95={np.percentile(ms, 95):7.2f} ms  "
+          f"max={ms.max():7.2f} ms  wakeups={wakeups_per_sec:6.1f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial read latency: poll loop vs SerialLineReader.")
+    parser.add_argument("--lines", type=int, default=100, help="Number of DATA: lines to send")
+    parser.add_argument("--interval", type=float, default=0.1, help="Mean seconds between lines (ESP32 ~0.1)")
+    args = parser.parse_args()
+
+    master, slave, slave_path = open_pty_pair()
+    try:
+        report("poll+sleep", *run_polling(slave_path, master, args.lines, args.interval))
+        report("event-driven", *run_event_driven(slave, master, args.lines, args.interval))
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import BBBPredict
+
+# BBBPredict soğuk açılış ölçümü: her deneme yeni bir Python sürecinde çalışır ve
+# süreç başlangıcından ilk tahminin dönmesine kadar geçen süre (time-to-first-prediction) ölçülür.
+# Eski joblib yolu ("sklearn") ile tek dosyalık paket yolu ("bundle") karşılaştırılır;
+# --engines ile düz orman ("numpy") ve nicemlenmiş paket ("quantized") de eklenebilir.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Çocuk süreçte çalışan kod: import, model yükleme ve ilk tahmin ayrı ayrı ölçülür
+CHILD_CODE = """
+import json, sys, time
+t0 = time.perf_counter()
+import BBBPredict
+t_import = time.perf_counter()
+BBBPredict.INFERENCE_ENGINE = sys.argv[1]
+BBBPredict.MODEL_FILENAME, BBBPredict.SCALER_FILENAME, BBBPredict.ENCODER_FILENAME, \\
+    BBBPredict.FOREST_FILENAME, BBBPredict.BUNDLE_FILENAME, BBBPredict.QUANTIZED_FILENAME = sys.argv[2:8]
+if not BBBPredict.load_models():
+    sys.exit(1)
+t_load = time.perf_counter()
+result = BBBPredict.predict_users([[86, 80, 74, 13, 62, 64, 72, 71, 102, 0, 0, 0, 53, 0, 0, 0, 0, 0]])
+t_predict = time.perf_counter()
+print(json.dumps({"import": t_import - t0, "load": t_load - t_import, "predict": t_predict - t_load,
+                  "result": str(result[0][0])}))
+"""
+
+
+def run_once(engine, files):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD_CODE, engine, *files],
+                          cwd=SCRIPT_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{engine}' motoru başlatılamadı:\n{proc.stdout}{proc.stderr}")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings["wall"] = wall
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BBBPredict açılış süresi (ilk tahmine kadar) ölçümü.")
+    parser.add_argument("--model-dir", default=BBBPredict.MODEL_DIR, help="Model dosyalarının bulunduğu klasör")
+    parser.add_argument("--engines", nargs="+", default=["sklearn", "bundle"],
+                        choices=["sklearn", "numpy", "bundle", "quantized"], help="Karşılaştırılacak tahmin motorları")
+    parser.add_argument("--repeat", type=int, default=5, help="Her motor için deneme sayısı")
+    args = parser.parse_args()
+
+    files = [os.path.join(args.model_dir, os.path.basename(path)) for path in (
+        BBBPredict.MODEL_FILENAME, BBBPredict.SCALER_FILENAME, BBBPredict.ENCODER_FILENAME,
+        BBBPredict.FOREST_FILENAME, BBBPredict.BUNDLE_FILENAME, BBBPredict.QUANTIZED_FILENAME)]
+
+    print(f"{'motor':<8} {'toplam(s)':>10} {'import(s)':>10} {'yükleme(s)':>11} {'ilk tahmin(s)':>14}")
+    for engine in args.engines:
+        runs = [run_once(engine, files) for _ in range(args.repeat)]
+        median = {key: statistics.median(run[key] for run in runs) for key in ("wall", "import", "load", "predict")}
+        print(f"{engine:<8} {median['wall']:>10.3f} {median['import']:>10.3f} "
+              f"{median['load']:>11.3f} {median['predict']:>14.4f}   (tahmin: {runs[0]['result']})")
+
+
+if __name__ == '__main__':
+    main()
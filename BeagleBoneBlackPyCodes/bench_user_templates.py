@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from compiled_pipeline import CompiledPipeline
+from enrollment import encode_users, load_samples, user_names
+from flat_forest import export_forest
+from session_features import SessionAggregator
+from user_templates import UserTemplates, build_templates, session_features_from_samples
+
+# Kullanıcı şablonlarıyla (user_templates.py) kayıtlı olmayan kişilerin reddi: başarı ve ek gecikme.
+# Değerlendirme: kullanıcılar karıştırılıp --impostors kişilik gruplara ayrılır; her katlamada bir grup
+# eğitimden tamamen çıkarılır (sahte kişiler). Kalan kullanıcıların oturumları --test-size oranında
+# eğitim/test olarak bölünür; eğitim oturumlarıyla BBB_egitme.py'deki gibi oturum modeli (StandardScaler +
+# RandomForest) ve şablonlar kurulur. Test oturumları ve sahte kişilerin tüm oturumları BBBPredict'teki
+# gibi değerlendirilir: oturum modeli kullanıcıyı seçer, o kullanıcının şablonuna uzaklık eşiği aşarsa
+# karar "unknown" olur. Katlamalar --repeats kez farklı karıştırmayla tekrarlanır.
+# Raporlanan (her --accept-rate için): kayıtlı kullanıcı oturumlarının kabul oranı, doğru kabul oranı
+# (doğru kullanıcı ve kabul), sahte kişi oturumlarının ret oranı; ayrıca eşikten bağımsız AUC ve EER.
+# Gecikme: BBBPredict'te oturum sonunda eklenen iş (SessionAggregator.features + UserTemplates.check)
+# ve karşılaştırma için oturum modeli tahmini; şablon sayısıyla ölçeklenme yapay K kullanıcıyla ölçülür.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(SCRIPT_DIR, "..", "Dataset", "dataset.csv")
+
+
+def split_known(users, known, test_size, rng):
+    # Kayıtlı kullanıcıların oturumlarından test_size oranı teste ayrılır; (eğitim, test) indeksleri döner
+    train, test = [], []
+    for user in known:
+        own = rng.permutation(np.flatnonzero(users == user))
+        n_test = max(1, int(round(len(own) * test_size)))
+        test.extend(own[:n_test])
+        train.extend(own[n_test:])
+    return np.array(train), np.array(test)
+
+
+def train_session_model(features, users, n_estimators, random_state):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    class_names = np.unique(users)
+    scaler = StandardScaler().fit(features)
+    model = RandomForestClassifier(random_state=random_state, n_jobs=-1, n_estimators=n_estimators)
+    model.fit(scaler.transform(features), encode_users(class_names, users))
+    return export_forest(model, scaler, class_names), scaler
+
+
+def equal_error_rate(genuine, impostor):
+    # Kabul edilen sahte kişi oranı ile reddedilen kayıtlı kullanıcı oranının eşitlendiği nokta
+    thresholds = np.unique(np.concatenate([genuine, impostor]))
+    false_reject = (genuine[None, :] > thresholds[:, None]).mean(axis=1)
+    false_accept = (impostor[None, :] <= thresholds[:, None]).mean(axis=1)
+    best = np.argmin(np.abs(false_reject - false_accept))
+    return float((false_reject[best] + false_accept[best]) / 2)
+
+
+def percentiles_us(samples):
+    samples = np.asarray(samples) / 1000.0
+    return {"p50": float(np.percentile(samples, 50)), "p95": float(np.percentile(samples, 95)),
+            "mean": float(samples.mean())}
+
+
+def time_calls(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    return percentiles_us(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kullanıcı şablonlarıyla kayıtlı olmayan kişilerin reddi.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="CSV dosyası veya column_store klasörü")
+    parser.add_argument("--impostors", type=int, default=4, help="Katlama başına eğitimden çıkarılan kullanıcı sayısı")
+    parser.add_argument("--repeats", type=int, default=3, help="Katlamaların farklı karıştırmayla tekrar sayısı")
+    parser.add_argument("--trees", type=int, default=100, help="Oturum modelindeki ağaç sayısı")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Kayıtlı kullanıcılarda teste ayrılan oturum oranı")
+    parser.add_argument("--accept-rates", type=float, nargs="+", default=[0.8, 0.9, 0.95, 0.99],
+                        help="Eşiğin seçildiği kayıtlı kullanıcı kabul oranı hedefleri")
+    parser.add_argument("--shrinkage", type=float, default=0.5, help="Varyansların ortak varyansa büzülme oranı")
+    parser.add_argument("--latency-repeat", type=int, default=2000, help="Gecikme ölçümünde tekrar sayısı")
+    parser.add_argument("--seed", type=int, default=42, help="Rastgele tohum")
+    parser.add_argument("--output", default="bench_user_templates.json", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+    from sklearn.metrics import roc_auc_score
+
+    rng = np.random.default_rng(args.seed)
+    user_trials, rows = load_samples(args.dataset)
+    names, sessions = session_features_from_samples(user_trials, rows)
+    users = user_names(names)
+    all_users = np.unique(users)
+    print(f"{len(sessions)} oturum, {len(all_users)} kullanıcı; katlama başına {args.impostors} sahte kişi, "
+          f"{args.repeats} tekrar")
+
+    totals = {rate: {"genuine": 0, "accepted": 0, "correct": 0, "impostor": 0, "rejected": 0}
+              for rate in args.accept_rates}
+    genuine_scores, impostor_scores, model_correct = [], [], []
+    for repeat in range(args.repeats):
+        order = rng.permutation(all_users)
+        for fold in range(0, len(order), args.impostors):
+            impostors = np.sort(order[fold:fold + args.impostors])
+            known = np.setdiff1d(all_users, impostors)
+            train, test = split_known(users, known, args.test_size, rng)
+            test_impostors = np.flatnonzero(np.isin(users, impostors))
+            arrays, scaler = train_session_model(sessions[train], users[train], args.trees, args.seed + repeat)
+            pipeline = CompiledPipeline.from_flat_forest(arrays)
+            labels = encode_users(arrays["class_names"], users[train])
+
+            evaluated = np.concatenate([test, test_impostors])
+            predicted = pipeline.predict_encoded(sessions[evaluated])
+            is_genuine = np.arange(len(evaluated)) < len(test)
+            right = predicted[is_genuine] == encode_users(arrays["class_names"], users[test])
+            model_correct.extend(right)
+            for rate in args.accept_rates:
+                templates = UserTemplates(build_templates(sessions[train], labels, arrays["class_names"],
+                                                          mean=scaler.mean_, scale=scaler.scale_,
+                                                          shrinkage=args.shrinkage, accept_rate=rate))
+                accepted, scores = templates.check(sessions[evaluated], predicted)
+                counts = totals[rate]
+                counts["genuine"] += int(is_genuine.sum())
+                counts["accepted"] += int(accepted[is_genuine].sum())
+                counts["correct"] += int((accepted[is_genuine] & right).sum())
+                counts["impostor"] += int((~is_genuine).sum())
+                counts["rejected"] += int((~accepted[~is_genuine]).sum())
+            genuine_scores.extend(scores[is_genuine])
+            impostor_scores.extend(scores[~is_genuine])
+
+    genuine_scores = np.array(genuine_scores)
+    impostor_scores = np.array(impostor_scores)
+    auc = roc_auc_score(np.r_[np.zeros(len(genuine_scores)), np.ones(len(impostor_scores))],
+                        np.r_[genuine_scores, impostor_scores])
+    eer = equal_error_rate(genuine_scores, impostor_scores)
+    report = {"dataset": os.path.abspath(args.dataset), "seed": args.seed, "impostors": args.impostors,
+              "repeats": args.repeats, "trees": args.trees, "shrinkage": args.shrinkage,
+              "model_accuracy": float(np.mean(model_correct)), "auc": float(auc), "eer": eer, "accept_rates": {}}
+    print(f"\nOturum modeli doğruluğu (kayıtlı kullanıcılar, şablonsuz): {report['model_accuracy']:.3f}")
+    print(f"{'hedef':>6} {'kabul':>7} {'doğru kabul':>12} {'sahte ret':>10}")
+    for rate, counts in totals.items():
+        scores = {"genuine_accept": counts["accepted"] / counts["genuine"],
+                  "correct_accept": counts["correct"] / counts["genuine"],
+                  "impostor_reject": counts["rejected"] / counts["impostor"]}
+        report["accept_rates"][str(rate)] = scores
+        print(f"{rate:6.2f} {scores['genuine_accept']:7.3f} {scores['correct_accept']:12.3f} "
+              f"{scores['impostor_reject']:10.3f}")
+    print(f"AUC {auc:.3f}, EER {eer:.3f} (eşikten bağımsız; {len(genuine_scores)} kayıtlı, "
+          f"{len(impostor_scores)} sahte oturum)")
+
+    # Gecikme: son katlamanın modeli ve şablonlarıyla, tek oturum (BBBPredict._finish_session'daki gibi)
+    session_rows = rows[user_trials == names[evaluated[0]]]
+    aggregator = SessionAggregator(len(arrays["class_names"]))
+    aggregator.update(session_rows)
+    features = aggregator.features()
+    encoded = int(pipeline.predict_encoded(features)[0])
+    latency = {
+        "session_model": time_calls(lambda: pipeline.predict_encoded(features), args.latency_repeat),
+        "template_check": time_calls(lambda: templates.check(aggregator.features(), encoded), args.latency_repeat),
+    }
+    # Şablon sayısıyla ölçeklenme: aynı boyutta rastgele şablonlar
+    scaling = {}
+    for n_users in (20, 100, 1000):
+        synthetic = build_templates(rng.normal(size=(n_users * 10, sessions.shape[1])),
+                                    np.repeat(np.arange(n_users), 10), np.arange(n_users).astype(str))
+        large = UserTemplates(synthetic)
+        scaling[n_users] = time_calls(lambda: large.check(features, 0), args.latency_repeat)
+    report["latency_us"] = latency
+    report["latency_by_users_us"] = {str(k): v for k, v in scaling.items()}
+    print(f"\nOturum sonu ek gecikme (features + check): p50 {latency['template_check']['p50']:.1f} µs, "
+          f"p95 {latency['template_check']['p95']:.1f} µs; oturum modeli p50 {latency['session_model']['p50']:.1f} µs")
+    for n_users, timing in scaling.items():
+        print(f"  {n_users:5d} kullanıcı: check p50 {timing['p50']:.1f} µs, p95 {timing['p95']:.1f} µs")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Sonuçlar '{args.output}' dosyasına yazıldı.")
+
+
+if __name__ == '__main__':
+    main()
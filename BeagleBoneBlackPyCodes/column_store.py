@@ -0,0 +1,438 @@
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from csv_sink import FSYNC_ALWAYS, FSYNC_BOUNDARY, FSYNC_NEVER
+from session_features import DURATION_COLUMNS, RAW_COLUMNS
+
+# --- Columnar, memory-mappable sample store ---
+# The gateway's CSV grows forever and every retrain re-parses all of it as text. The store keeps
+# the same samples as one fixed-dtype .npy file per column in a directory:
+#
+#   timestamp.npy           uint32   ESP32 millis() timestamp
+#   rawT9.npy ... rawT4.npy int16    raw touch values (-1 is a valid sentinel)
+#   durationT9.npy ...      int16    touch durations
+#   user.npy                uint16   line number in users.txt   ("User0")
+#   trial.npy               uint32   line number in trials.txt  ("User0.3", i.e. user_trial)
+#   device.npy              uint16   line number in devices.txt ("panel1"; "" from a single-device gateway)
+#   users.txt, trials.txt, devices.txt  append-only dictionaries, one id per line
+#   meta.json               row count, dictionary sizes and dtypes
+#
+# Every .npy file has a fixed 128-byte header, so appending only writes the new rows at the end
+# and rewrites the header's shape in place; new ids are appended to the dictionary files. meta.json
+# stays a few hundred bytes however long the history is and is replaced atomically after the
+# column and dictionary files. Its counts are authoritative: rows and ids past them (an append
+# interrupted by a power loss) are ignored by readers and truncated by the next writer.
+
+STORE_VERSION = 3
+# Dictionary-encoded column -> dictionary name (<name>.txt, meta["sizes"][name])
+DICTIONARIES = {"user": "users", "trial": "trials", "device": "devices"}
+HEADER_SIZE = 128
+FEATURE_COLUMNS = RAW_COLUMNS + DURATION_COLUMNS
+COLUMN_DTYPES = dict(
+    [("timestamp", np.dtype('<u4'))]
+    + [(name, np.dtype('<i2')) for name in FEATURE_COLUMNS]
+    + [("user", np.dtype('<u2')), ("trial", np.dtype('<u4')), ("device", np.dtype('<u2'))]
+)
+
+
+def _npy_header(dtype, rows):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (dtype.str, rows)
+    header = header.encode('latin1')
+    padding = HEADER_SIZE - 10 - len(header) - 1
+    if padding < 0:
+        raise ValueError(f"Row count {rows} does not fit in the fixed .npy header")
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', HEADER_SIZE - 10) + header + b' ' * padding + b'\n'
+
+
+def _read_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["version"] != STORE_VERSION:
+        raise ValueError(f"Unsupported column store version: {meta['version']}")
+    return meta
+
+
+def _read_dictionary(path, name, size):
+    file_path = os.path.join(path, f"{name}.txt")
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, 'rb') as f:
+        values = f.read().decode('utf-8').split('\n')
+    # The last element is the text after the final newline (empty, or a partially written id)
+    return values[:min(size, len(values) - 1)]
+
+
+def load_store(path, mmap=True):
+    """
+    Opens a store for reading.
+
+    :param path: Store directory.
+    :param mmap: Map the column files read-only instead of reading them into memory.
+    :return: (columns, meta); columns maps column name -> 1-D array of meta["rows"] rows, and
+        meta["users"] / meta["trials"] hold the dictionaries.
+    """
+    meta = _read_meta(path)
+    for name, size in meta["sizes"].items():
+        meta[name] = _read_dictionary(path, name, size)
+    rows = meta["rows"]
+    columns = {}
+    for name, dtype in COLUMN_DTYPES.items():
+        file_path = os.path.join(path, f"{name}.npy")
+        if rows == 0:
+            columns[name] = np.empty(0, dtype=dtype)
+        elif mmap:
+            columns[name] = np.memmap(file_path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(rows,))
+        else:
+            with open(file_path, 'rb') as f:
+                f.seek(HEADER_SIZE)
+                columns[name] = np.fromfile(f, dtype=dtype, count=rows)
+    return columns, meta
+
+
+def decode_ids(columns, meta):
+    """Returns (user, user_trial) string arrays by dictionary lookup (no per-row string splitting)."""
+    users = np.asarray(meta["users"], dtype=object)
+    trials = np.asarray(meta["trials"], dtype=object)
+    return users[columns["user"]], trials[columns["trial"]]
+
+
+def decode_devices(columns, meta):
+    """Returns the device id of every row ("" for rows from a single-device gateway)."""
+    return np.asarray(meta["devices"], dtype=object)[columns["device"]]
+
+
+class ColumnStore:
+    """
+    Appender for a column store directory (created if missing).
+
+    Only one process should append at a time; any number of readers can use load_store().
+    """
+
+    def __init__(self, path, fsync=True):
+        """
+        :param path: Store directory.
+        :param fsync: fsync column files, dictionaries and meta.json on every append; otherwise only
+            sync() and close() do.
+        """
+        self.path = path
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            self.meta = _read_meta(path)
+        else:
+            self.meta = {"version": STORE_VERSION, "rows": 0, "sizes": {name: 0 for name in DICTIONARIES.values()},
+                         "dtypes": {name: dtype.str for name, dtype in COLUMN_DTYPES.items()}}
+        self.dictionaries = {name: _read_dictionary(path, name, self.meta["sizes"][name])
+                             for name in DICTIONARIES.values()}
+        self._codes = {name: {value: i for i, value in enumerate(values)} for name, values in self.dictionaries.items()}
+        self._recover()
+
+        self._files = {}
+        for name, dtype in COLUMN_DTYPES.items():
+            file_path = os.path.join(path, f"{name}.npy")
+            f = open(file_path, 'r+b' if os.path.exists(file_path) else 'w+b')
+            # Drop rows written after the last committed meta.json (interrupted append)
+            f.truncate(HEADER_SIZE + self.meta["rows"] * dtype.itemsize)
+            f.seek(0)
+            f.write(_npy_header(dtype, self.meta["rows"]))
+            self._files[name] = f
+        self._dictionary_files = {}
+        for name, values in self.dictionaries.items():
+            file_path = os.path.join(path, f"{name}.txt")
+            f = open(file_path, 'r+b' if os.path.exists(file_path) else 'w+b')
+            f.truncate(sum(len(value.encode('utf-8')) + 1 for value in values))
+            f.seek(0, os.SEEK_END)
+            self._dictionary_files[name] = f
+        self.meta["sizes"] = {name: len(values) for name, values in self.dictionaries.items()}
+        self._write_meta()
+
+    def _recover(self):
+        # Without fsync on every append, a power loss can leave meta.json ahead of the column or
+        # dictionary files; keep only the rows that are fully on disk and have decodable ids
+        rows = self.meta["rows"]
+        for name, dtype in COLUMN_DTYPES.items():
+            file_path = os.path.join(self.path, f"{name}.npy")
+            size = os.path.getsize(file_path) if os.path.exists(file_path) else HEADER_SIZE
+            rows = min(rows, max(size - HEADER_SIZE, 0) // dtype.itemsize)
+        for column, name in DICTIONARIES.items():
+            if rows and len(self.dictionaries[name]) < self.meta["sizes"][name]:
+                codes = np.memmap(os.path.join(self.path, f"{column}.npy"), dtype=COLUMN_DTYPES[column],
+                                  mode='r', offset=HEADER_SIZE, shape=(rows,))
+                missing = np.flatnonzero(codes >= len(self.dictionaries[name]))
+                if len(missing):
+                    rows = int(missing[0])
+                del codes
+        if rows != self.meta["rows"]:
+            print(f"Column store {self.path}: {self.meta['rows'] - rows} rows were not fully written, dropped")
+            self.meta["rows"] = rows
+
+    @property
+    def rows(self):
+        return self.meta["rows"]
+
+    def _encode(self, values, name):
+        codes, dictionary = self._codes[name], self.dictionaries[name]
+        unique, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        mapped = np.empty(len(unique), dtype=np.int64)
+        new = []
+        for i, value in enumerate(unique.tolist()):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(dictionary)
+                dictionary.append(value)
+                new.append(value)
+            mapped[i] = code
+        if new:
+            self._dictionary_files[name].write("".join(value + "\n" for value in new).encode('utf-8'))
+        return mapped[inverse]
+
+    def append(self, user_trials, timestamps, features, devices=None):
+        """
+        Appends a batch of samples.
+
+        :param user_trials: Sequence of "User<id>.<trial>" strings, one per row.
+        :param timestamps: Sequence of ESP32 timestamps (uint32).
+        :param features: (k, 18) values in FEATURE_COLUMNS order (int16 range).
+        :param devices: Sequence of device ids, one per row (None: all rows from a single-device gateway).
+        """
+        features = np.asarray(features)
+        timestamps = np.asarray(timestamps)
+        k = len(features)
+        if k == 0:
+            return
+        if devices is None:
+            devices = [""] * k
+        if (features.shape != (k, len(FEATURE_COLUMNS)) or len(timestamps) != k or len(user_trials) != k
+                or len(devices) != k):
+            raise ValueError(f"Expected {k} rows of {len(FEATURE_COLUMNS)} features with one id, timestamp "
+                             f"and device each")
+        if features.min() < -32768 or features.max() > 32767:
+            raise ValueError("Feature values do not fit in int16")
+        if timestamps.min() < 0 or timestamps.max() > 0xFFFFFFFF:
+            raise ValueError("Timestamps do not fit in uint32")
+
+        user_trials = [str(value) for value in user_trials]
+        users = [value.split('.', 1)[0] for value in user_trials]
+        data = {
+            "timestamp": timestamps,
+            "user": self._encode(users, DICTIONARIES["user"]),
+            "trial": self._encode(user_trials, DICTIONARIES["trial"]),
+            "device": self._encode([str(value) for value in devices], DICTIONARIES["device"]),
+        }
+        for i, name in enumerate(FEATURE_COLUMNS):
+            data[name] = features[:, i]
+
+        rows = self.meta["rows"] + k
+        for name, dtype in COLUMN_DTYPES.items():
+            f = self._files[name]
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(data[name], dtype=dtype).tobytes())
+            f.seek(0)
+            f.write(_npy_header(dtype, rows))
+        self._flush_files(self.fsync)
+        self.meta["rows"] = rows
+        self.meta["sizes"] = {name: len(values) for name, values in self.dictionaries.items()}
+        self._write_meta(self.fsync)
+
+    def _flush_files(self, sync):
+        for f in list(self._files.values()) + list(self._dictionary_files.values()):
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+    def _write_meta(self, sync=False):
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def sync(self):
+        """fsyncs the appended rows and dictionaries, then commits meta.json durably."""
+        self._flush_files(True)
+        self._write_meta(sync=True)
+
+    def close(self, sync=True):
+        """
+        Closes the files.
+
+        :param sync: fsync the column files, dictionaries and meta.json first.
+        """
+        if not self._files:
+            return
+        self._flush_files(sync)
+        for f in list(self._files.values()) + list(self._dictionary_files.values()):
+            f.close()
+        self._files = {}
+        self._dictionary_files = {}
+        self._write_meta(sync)
+
+
+def parse_row(line):
+    """
+    Parses one data-collection row "User0.1,<timestamp>,<18 values>[,<device id>]" (a multi-device
+    gateway appends the device id).
+
+    :return: (user_trial, timestamp, values, device) with device "" if absent, or None for CMD:/DATA:
+        lines, malformed rows and rows whose values do not fit the column dtypes (ColumnStore.append
+        would reject the whole batch).
+    """
+    fields = line.strip().split(',')
+    if len(fields) not in (2 + len(FEATURE_COLUMNS), 3 + len(FEATURE_COLUMNS)) or fields[0].startswith(("CMD:", "DATA:")):
+        return None
+    try:
+        timestamp = int(fields[1])
+        values = [int(value) for value in fields[2:2 + len(FEATURE_COLUMNS)]]
+    except ValueError:
+        return None
+    if not 0 <= timestamp <= 0xFFFFFFFF or min(values) < -32768 or max(values) > 32767:
+        return None
+    device = fields[2 + len(FEATURE_COLUMNS)] if len(fields) > 2 + len(FEATURE_COLUMNS) else ""
+    return fields[0], timestamp, values, device
+
+
+class ColumnStoreWriter:
+    """
+    Buffers gateway lines and appends them to a ColumnStore in batches, like BufferedCsvWriter:
+    on max_rows, when the oldest buffered row is max_delay seconds old (checked on every line and,
+    after start_background_flush(), while no lines arrive), at CMD:DATA_SENT and on close().
+    """
+
+    def __init__(self, path, max_rows=50, max_delay=2.0, fsync_policy=FSYNC_BOUNDARY):
+        """
+        :param path: Store directory.
+        :param max_rows: Append once this many rows are buffered.
+        :param max_delay: Append once the oldest buffered row is this many seconds old.
+        :param fsync_policy: FSYNC_NEVER, FSYNC_BOUNDARY (sync at CMD:DATA_SENT and on close) or
+            FSYNC_ALWAYS (sync every append), as for BufferedCsvWriter.
+        """
+        if fsync_policy not in (FSYNC_NEVER, FSYNC_BOUNDARY, FSYNC_ALWAYS):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.store = ColumnStore(path, fsync=fsync_policy == FSYNC_ALWAYS)
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.fsync_policy = fsync_policy
+        self.skipped = 0
+        self._rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop_flusher = threading.Event()
+
+    def write_line(self, line):
+        """Buffers one received line; CMD:DATA_SENT flushes, other non-row and out-of-range lines are skipped."""
+        if line == "CMD:DATA_SENT":
+            self.flush(boundary=True)
+            return
+        row = parse_row(line)
+        if row is None:
+            if not line.startswith("CMD:"):
+                self.skipped += 1
+            return
+        with self._lock:
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            if len(self._rows) >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._rows:
+            return
+        rows, self._rows, self._oldest = self._rows, [], None
+        user_trials, timestamps, values, devices = zip(*rows)
+        self.store.append(user_trials, timestamps, values, devices)
+
+    def flush(self, boundary=False):
+        """
+        Appends buffered rows.
+
+        :param boundary: True at a session boundary; syncs the store under FSYNC_BOUNDARY.
+        """
+        with self._lock:
+            self._flush_locked()
+            if boundary and self.fsync_policy == FSYNC_BOUNDARY:
+                self.store.sync()
+
+    def flush_if_due(self):
+        """Appends if the oldest buffered row has waited max_delay seconds (for idle periods)."""
+        with self._lock:
+            if self._oldest is not None and time.monotonic() - self._oldest >= self.max_delay:
+                self._flush_locked()
+
+    def start_background_flush(self):
+        """Starts a daemon thread that enforces max_delay even when no new lines arrive."""
+        def run():
+            interval = max(self.max_delay / 2.0, 0.05)
+            while not self._stop_flusher.wait(interval):
+                try:
+                    self.flush_if_due()
+                except Exception as e:
+                    print(f"Error appending to column store ({self.store.path}): {e}")
+
+        self._flusher = threading.Thread(target=run, name="column-store-flush", daemon=True)
+        self._flusher.start()
+
+    def close(self):
+        """Appends remaining rows, syncs (unless FSYNC_NEVER) and closes the store."""
+        self._stop_flusher.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            try:
+                self._flush_locked()
+            finally:
+                self.store.close(sync=self.fsync_policy != FSYNC_NEVER)
+
+
+def convert_csv(csv_path, store_path, chunk_rows=100000):
+    """
+    Appends a gateway/training CSV (user_trial, timestamp, 18 values[, device]) to a store, in chunks.
+    Rows that are not numeric (e.g. the ESP32 header line) are skipped.
+
+    :return: (rows appended, rows skipped).
+    """
+    import pandas as pd
+
+    names = ["user_trial", "timestamp"] + FEATURE_COLUMNS + ["device"]
+    store = ColumnStore(store_path, fsync=False)
+    appended = skipped = 0
+    try:
+        # Rows without a device column (single-device gateway, training CSV) get device ""
+        for chunk in pd.read_csv(csv_path, header=None, names=names, chunksize=chunk_rows, dtype=str,
+                                 keep_default_na=False):
+            numeric = chunk[names[1:-1]].apply(pd.to_numeric, errors='coerce')
+            valid = numeric.notna().all(axis=1).to_numpy()
+            skipped += int((~valid).sum())
+            store.append(chunk["user_trial"].to_numpy()[valid], numeric["timestamp"].to_numpy()[valid].astype(np.int64),
+                         numeric[FEATURE_COLUMNS].to_numpy()[valid].astype(np.int64),
+                         chunk["device"].to_numpy()[valid])
+            appended += int(valid.sum())
+    finally:
+        # Data and meta.json are fsync'ed once here instead of per chunk
+        store.close()
+    return appended, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts a swipe CSV file into a memory-mappable column store.")
+    parser.add_argument("csv", help="CSV file (user_trial, timestamp, 18 values)")
+    parser.add_argument("store", help="Store directory (rows are appended if it exists)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    appended, skipped = convert_csv(args.csv, args.store)
+    print(f"Appended {appended} rows to {args.store} ({skipped} non-numeric rows skipped) "
+          f"in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
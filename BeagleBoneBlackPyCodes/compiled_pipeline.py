@@ -0,0 +1,183 @@
+import numpy as np
+
+from flat_forest import FlatForest
+from metrics import METRICS, now
+
+# Yükleme anında "derlenen" scaler + model hattı.
+# StandardScaler.transform her çağrıda girdi doğrulaması yapıp diziyi kopyalıyor;
+# BBB'nin tek çekirdekli ARM işlemcisinde bu ek yük ağaç taramasından daha pahalı.
+# Burada scaler'ın mean_/scale_ değerleri bir kez alınır, ölçekleme önceden ayrılmış
+# tamponlar üzerinde tek bir afin geçişle yapılır ve model doğrulama atlanarak çağrılır.
+# Aritmetik sklearn ile birebir aynıdır (önce çıkarma, sonra bölme), bu yüzden sonuçlar
+# scaler.transform + model.predict yolu ile tam olarak eşleşir.
+
+
+def _scaler_params(scaler):
+    n_features = int(scaler.n_features_in_)
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    if not getattr(scaler, "with_mean", True) or mean is None:
+        mean = np.zeros(n_features)
+    if not getattr(scaler, "with_std", True) or scale is None:
+        scale = np.ones(n_features)
+    return mean, scale
+
+
+class CompiledPipeline:
+    def __init__(self, mean, scale, model, classes=None, max_batch=64):
+        # mean/scale: StandardScaler parametreleri; model: sklearn/XGBoost modeli veya FlatForest
+        self.mean = np.ascontiguousarray(mean, dtype=np.float64)
+        self.scale = np.ascontiguousarray(scale, dtype=np.float64)
+        self.n_features = len(self.mean)
+        self.model = model
+        self.max_batch = max_batch
+        # Sayısal etiket -> kullanıcı adı arama tablosu (label_encoder.classes_)
+        self.classes = None if classes is None else np.asarray(classes).astype(object)
+
+        # Tekrar kullanılan tamponlar: her tahminde yeni dizi ayrılmaz
+        self._scaled = np.empty((max_batch, self.n_features), dtype=np.float64)
+        self._labels = np.empty(max_batch, dtype=np.intp)
+        self._predict_chunk = self._compile_model(model)
+
+    @classmethod
+    def from_sklearn(cls, scaler, model, classes=None, max_batch=64):
+        mean, scale = _scaler_params(scaler)
+        return cls(mean, scale, model, classes, max_batch)
+
+    @classmethod
+    def from_flat_forest(cls, arrays, max_batch=64):
+        # flat_forest.export_forest çıktısı: scaler parametreleri ve sınıf adları dosyanın içindedir
+        return cls(arrays["mean"], arrays["scale"], FlatForest(arrays), arrays.get("class_names"), max_batch)
+
+    def _compile_model(self, model):
+        # sklearn ormanı (RandomForestClassifier vb.): ağaçlar check_input=False ile sırayla çağrılır
+        if hasattr(model, "estimators_") and hasattr(model, "n_classes_") and np.ndim(model.n_classes_) == 0:
+            estimators = list(model.estimators_)
+            model_classes = np.asarray(model.classes_)
+            self._scaled32 = np.empty((self.max_batch, self.n_features), dtype=np.float32)
+            self._proba = np.empty((self.max_batch, int(model.n_classes_)), dtype=np.float64)
+
+            def proba_forest(scaled):
+                n = len(scaled)
+                # sklearn ağaçları float32 ile karşılaştırma yapar; dönüşüm aynı şekilde yapılır
+                x32 = self._scaled32[:n]
+                x32[...] = scaled
+                proba = self._proba[:n]
+                proba.fill(0.0)
+                for estimator in estimators:
+                    proba += estimator.predict_proba(x32, check_input=False)
+                proba /= len(estimators)
+                return proba
+
+            def predict_forest(scaled, out):
+                out[...] = model_classes.take(np.argmax(proba_forest(scaled), axis=1))
+                return out
+
+            self._proba_chunk = proba_forest
+            self._proba_classes = model_classes
+            return predict_forest
+
+        # XGBoost: DMatrix oluşturmadan inplace_predict ile tahmin
+        if hasattr(model, "get_booster"):
+            booster = model.get_booster()
+
+            def predict_xgboost(scaled, out):
+                raw = booster.inplace_predict(scaled)
+                if raw.ndim > 1 and raw.shape[1] != 1:
+                    out[...] = np.argmax(raw, axis=1)
+                elif getattr(model, "objective", "").startswith("multi:softmax"):
+                    out[...] = raw.reshape(-1)
+                else:
+                    out[...] = raw.reshape(-1) > 0.5
+                return out
+
+            self._proba_chunk = model.predict_proba
+            self._proba_classes = np.arange(len(model.classes_)) if hasattr(model, "classes_") else None
+            return predict_xgboost
+
+        # FlatForest: RF için ortalama olasılıklar, XGBoost için skorlardan softmax/sigmoid
+        if isinstance(model, FlatForest):
+            def proba_flat(scaled):
+                scores = model.decision(scaled)
+                if model.kind == "sklearn":
+                    return scores
+                if scores.shape[1] == 1:
+                    positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+                    return np.column_stack((1.0 - positive, positive))
+                scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+                return scores / scores.sum(axis=1, keepdims=True)
+
+            self._proba_chunk = proba_flat
+            self._proba_classes = model.model_classes
+        else:
+            # Bilinmeyen model türü: modelin kendi predict_proba metodu (varsa) kullanılır
+            self._proba_chunk = getattr(model, "predict_proba", None)
+            self._proba_classes = getattr(model, "classes_", None)
+
+        # FlatForest veya bilinmeyen model türü: modelin kendi predict metodu kullanılır
+        def predict_generic(scaled, out):
+            out[...] = model.predict(scaled)
+            return out
+
+        return predict_generic
+
+    def predict_encoded(self, features):
+        # features: tek bir 18'lik özellik listesi veya (N, 18) dizi; sayısal etiketleri döner
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != self.n_features:
+            raise ValueError(f"Beklenen özellik sayısı {self.n_features}, alınan: {features.shape[1]}")
+
+        n = len(features)
+        # Küçük toplu tahminlerde sonuç önceden ayrılmış tampona yazılır; tampon bir sonraki çağrıda
+        # üzerine yazıldığı için çağırana kopyası döner (n intp; ölçekleme tamponu gibi ayırma gerektirmez)
+        small = n <= self.max_batch
+        out = self._labels[:n] if small else np.empty(n, dtype=np.intp)
+        for start in range(0, n, self.max_batch):
+            stop = min(start + self.max_batch, n)
+            scaled = self._scaled[:stop - start]
+            span_start = now()
+            np.subtract(features[start:stop], self.mean, out=scaled)
+            np.divide(scaled, self.scale, out=scaled)
+            predict_start = now()
+            METRICS.observe("scale", span_start)
+            self._predict_chunk(scaled, out[start:stop])
+            METRICS.observe("predict", predict_start)
+        return out.copy() if small else out
+
+    def predict_proba(self, features):
+        # (N, sınıf_sayısı) olasılık matrisi; sütun i, sayısal etiket i'ye (classes[i]) karşılık gelir
+        if self._proba_chunk is None:
+            raise TypeError(f"{type(self.model).__name__} olasılık tahmini desteklemiyor")
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != self.n_features:
+            raise ValueError(f"Beklenen özellik sayısı {self.n_features}, alınan: {features.shape[1]}")
+
+        n_labels = len(self.classes) if self.classes is not None else int(np.max(self._proba_classes)) + 1
+        out = np.zeros((len(features), n_labels), dtype=np.float64)
+        for start in range(0, len(features), self.max_batch):
+            stop = min(start + self.max_batch, len(features))
+            scaled = self._scaled[:stop - start]
+            span_start = now()
+            np.subtract(features[start:stop], self.mean, out=scaled)
+            np.divide(scaled, self.scale, out=scaled)
+            predict_start = now()
+            METRICS.observe("scale", span_start)
+            proba = self._proba_chunk(scaled)
+            METRICS.observe("predict_proba", predict_start)
+            if self._proba_classes is None:
+                out[start:stop] = proba
+            else:
+                out[start:stop, self._proba_classes] = proba
+        return out
+
+    def predict(self, features):
+        # Kullanıcı adlarını döner; classes verilmemişse sayısal etiketleri döner
+        encoded = self.predict_encoded(features)
+        if self.classes is None:
+            # predict_encoded zaten çağırana ait yeni bir dizi döner
+            return encoded
+        return self.classes[encoded]
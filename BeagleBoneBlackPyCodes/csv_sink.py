@@ -0,0 +1,157 @@
+import csv
+import os
+import threading
+import time
+
+# --- Buffered CSV sink for the data gateway ---
+# The gateway's original write_to_csv() (kept in bench_csv_sink.py as the baseline) opened, appended
+# and closed the CSV file for every received line, i.e. one open/write/close syscall storm per ESP32
+# sample (~every 100 ms) on the SD card. This writer keeps the file open, buffers rows in memory and
+# writes them out in batches.
+
+# fsync policies
+FSYNC_NEVER = "never"        # leave it to the kernel's writeback
+FSYNC_BOUNDARY = "boundary"  # fsync at the end of each swipe session (CMD:DATA_SENT) and on close
+FSYNC_ALWAYS = "always"      # fsync after every flush
+
+
+class BufferedCsvWriter:
+    """
+    Persistent CSV writer with a bounded in-memory row buffer.
+
+    The buffer is written out when it holds max_rows rows, when its oldest row is older than
+    max_delay seconds, at a session boundary (CMD:DATA_SENT) and on close(). The file can be
+    rotated by size and/or age; rotated files get a timestamp suffix.
+    """
+
+    def __init__(self, file_path, max_rows=50, max_delay=2.0, fsync_policy=FSYNC_BOUNDARY,
+                 rotate_bytes=None, rotate_seconds=None, header=None):
+        """
+        :param file_path: Path to the CSV file (appended to if it exists).
+        :param max_rows: Flush once this many rows are buffered.
+        :param max_delay: Flush once the oldest buffered row is this many seconds old.
+        :param fsync_policy: FSYNC_NEVER, FSYNC_BOUNDARY or FSYNC_ALWAYS.
+        :param rotate_bytes: Rotate when the file reaches this size (None disables).
+        :param rotate_seconds: Rotate when the file is this many seconds old (None disables).
+        :param header: Optional list of column names written at the top of each new file.
+        """
+        if fsync_policy not in (FSYNC_NEVER, FSYNC_BOUNDARY, FSYNC_ALWAYS):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.file_path = file_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.fsync_policy = fsync_policy
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.header = header
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.rotations = 0
+
+        self._rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._opened_at = None
+        self._flusher = None
+        self._stop_flusher = threading.Event()
+        self._open()
+
+    def _open(self):
+        self._file = open(self.file_path, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        self._opened_at = time.monotonic()
+        if self.header and self._file.tell() == 0:
+            self._writer.writerow(self.header)
+
+    def _rotate_if_due(self):
+        size_due = self.rotate_bytes is not None and self._file.tell() >= self.rotate_bytes
+        age_due = self.rotate_seconds is not None and time.monotonic() - self._opened_at >= self.rotate_seconds
+        if not (size_due or age_due):
+            return
+        self._file.close()
+        rotated_path = f"{self.file_path}.{time.strftime('%Y%m%d-%H%M%S')}"
+        suffix = 1
+        while os.path.exists(rotated_path):
+            rotated_path = f"{self.file_path}.{time.strftime('%Y%m%d-%H%M%S')}.{suffix}"
+            suffix += 1
+        os.replace(self.file_path, rotated_path)
+        self.rotations += 1
+        self._open()
+
+    def _flush_locked(self, sync, rotate=True):
+        if self._rows:
+            self._writer.writerows(self._rows)
+            self.rows_written += len(self._rows)
+            self._rows.clear()
+            self._oldest = None
+            self.flushes += 1
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        if rotate:
+            self._rotate_if_due()
+
+    def write_line(self, data_row_string):
+        """
+        Buffers one received line. "CMD:" control lines are not written as rows; CMD:DATA_SENT
+        marks the end of a swipe session and flushes the buffer.
+
+        :param data_row_string: A string containing data values separated by commas.
+        """
+        if data_row_string.startswith("CMD:"):
+            if data_row_string == "CMD:DATA_SENT":
+                self.flush(boundary=True)
+            return
+        with self._lock:
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._rows.append(data_row_string.split(','))
+            if len(self._rows) >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay:
+                self._flush_locked(self.fsync_policy == FSYNC_ALWAYS)
+
+    def flush(self, boundary=False):
+        """
+        Writes out buffered rows.
+
+        :param boundary: True at a session boundary; fsyncs under FSYNC_BOUNDARY.
+        """
+        with self._lock:
+            sync = self.fsync_policy == FSYNC_ALWAYS or (boundary and self.fsync_policy == FSYNC_BOUNDARY)
+            self._flush_locked(sync)
+
+    def flush_if_due(self):
+        """Flushes if the oldest buffered row has waited max_delay seconds (for idle periods)."""
+        with self._lock:
+            if self._oldest is not None and time.monotonic() - self._oldest >= self.max_delay:
+                self._flush_locked(self.fsync_policy == FSYNC_ALWAYS)
+
+    def start_background_flush(self):
+        """
+        Starts a daemon thread that enforces max_delay even when no new lines arrive
+        (the serial reader blocks while the ESP32 is idle).
+        """
+        def run():
+            interval = max(self.max_delay / 2.0, 0.05)
+            while not self._stop_flusher.wait(interval):
+                try:
+                    self.flush_if_due()
+                except Exception as e:
+                    print(f"Error flushing CSV file ({self.file_path}): {e}")
+
+        self._flusher = threading.Thread(target=run, name="csv-flush", daemon=True)
+        self._flusher.start()
+
+    def close(self):
+        """Flushes remaining rows, fsyncs (unless FSYNC_NEVER) and closes the file."""
+        self._stop_flusher.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush_locked(self.fsync_policy != FSYNC_NEVER, rotate=False)
+            self._file.close()
+            self._file = None
@@ -0,0 +1,280 @@
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+
+from flat_forest import FlatForest, export_forest, integer_thresholds, load_forest, order_leaves_last
+from model_bundle import load_bundle, save_bundle
+from session_features import DURATION_COLUMNS, RAW_COLUMNS
+
+# Artımlı kullanıcı kaydı (enrollment).
+# Yeni bir kullanıcı eklemek için tüm veri setiyle BBB_egitme.py'yi yeniden çalıştırmak yerine,
+# yayındaki düzleştirilmiş RandomForest (model paketi veya .npz) yeni örneklerle güncellenir:
+#   1. Etiket tablosu genişletilir: yeni kullanıcılar class_names'in SONUNA eklenir; böylece mevcut
+#      sayısal etiketler (ve ağaçların sınıf sütunları) değişmez. LabelEncoder sıralı tuttuğu için
+#      burada kullanılmaz.
+#   2. Scaler akan istatistiklerle güncellenir (StandardScaler.partial_fit ile aynı birleştirme).
+#      Ölçek değişince mevcut ağaçların eşikleri ham özellik uzayı üzerinden yeni ölçeğe çevrilir;
+#      ağaçlar aynı ham değerlerde aynı dalı seçmeye devam eder.
+#   3. Yeni örnekler her ağaçta yapraklara yürütülür ve yaprak sınıf dağılımları, eğitimdeki
+#      ağırlıklı örnek sayıları (node_weight) üzerine eklenerek güncellenir. Her ağaç örnekleri
+#      Poisson(1) ağırlıkla görür (çevrimiçi bagging); ağaçlar arası çeşitlilik korunur.
+#   4. İsteğe bağlı: yeni örnekler ve eski verilerden bir örneklem (--replay) ile birkaç yeni ağaç
+#      büyütülüp ormana eklenir (warm start). Eski ağaçların bölmeleri yeni kullanıcıyı hiç
+#      görmediği için ayırt edicilik asıl bu ağaçlardan gelir.
+# Sonuç model_version'ı bir artırılmış yeni bir paket olarak yayımlanır: önce MODEL_DIR/versions/
+# altına sürümlü kopya yazılır, sonra yayındaki dosya atomik olarak (os.replace) değiştirilir.
+# BBBPredict dosyanın değiştiğini oturumlar arasında fark edip modeli yeniden başlatmadan değiştirir.
+#
+# Oturum modeli (session_forest.npz) güncellenmez; sınıf listesi farklılaştığında BBBPredict onu
+# devre dışı bırakıp satır oylarına döner. Kullanıcı şablonları (user_templates.npz) da aynı şekilde
+# devre dışı kalır; yeni kullanıcılarla user_templates.py komut satırından yeniden üretilip BBBPredict
+# yeniden başlatılabilir. Zaman zaman tam yeniden eğitim yine önerilir;
+# bkz. bench_enrollment.py (süre ve doğruluk karşılaştırması).
+
+FEATURE_COLUMNS = RAW_COLUMNS + DURATION_COLUMNS
+STATE_KEYS = ("mean", "scale", "var", "n_samples_seen", "node_weight", "class_names")
+
+
+def load_model(path):
+    if path.endswith(".npz"):
+        return load_forest(path)
+    return load_bundle(path)
+
+
+def save_model(path, arrays):
+    if path.endswith(".npz"):
+        # np.savez atomik değil; geçici dosyaya yazılıp yer değiştirilir
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    else:
+        save_bundle(path, arrays)
+
+
+def load_samples(path):
+    # (user_trial dizisi, (N, 18) float64 özellikler); CSV dosyası veya column_store klasörü.
+    # Sayısal olmayan satırlar (ör. ESP32 başlık satırı) atlanır.
+    if os.path.isdir(path):
+        from column_store import decode_ids, load_store
+        columns, meta = load_store(path)
+        _, user_trials = decode_ids(columns, meta)
+        features = np.column_stack([columns[name] for name in FEATURE_COLUMNS]).astype(np.float64)
+        return user_trials.astype(str), features
+
+    import pandas as pd
+    names = ["user_trial", "timestamp"] + FEATURE_COLUMNS
+    # Çok cihazlı gateway'in eklediği cihaz sütunu atlanır
+    df = pd.read_csv(path, header=None, names=names, usecols=range(len(names)), dtype=str)
+    numeric = df[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    valid = numeric.notna().all(axis=1).to_numpy()
+    return df["user_trial"].to_numpy()[valid].astype(str), numeric.to_numpy(dtype=np.float64)[valid]
+
+
+def user_names(user_trials):
+    # "User3.12" -> "User3"
+    return np.char.partition(np.asarray(user_trials, dtype=str), '.')[:, 0]
+
+
+def check_state(arrays):
+    if str(arrays["kind"]) != "sklearn":
+        raise ValueError("Artımlı kayıt yalnızca RandomForest modelleriyle yapılabilir.")
+    missing = [key for key in STATE_KEYS if key not in arrays]
+    if missing:
+        raise ValueError(f"Model dosyasında {', '.join(missing)} yok; modeli BBB_egitme.py veya "
+                         f"flat_forest.py ile yeniden dışa aktarın.")
+
+
+def extend_labels(class_names, users):
+    # Yeni kullanıcılar sona eklenir; (yeni class_names, eklenen adlar)
+    known = set(np.asarray(class_names).tolist())
+    added = sorted(set(np.asarray(users).tolist()) - known)
+    return np.asarray(list(np.asarray(class_names).tolist()) + added).astype(str), added
+
+
+def encode_users(class_names, users):
+    # Kullanıcı adları -> sayısal etiketler; class_names'te olmayanlar -1
+    index = {name: i for i, name in enumerate(np.asarray(class_names).tolist())}
+    unique, inverse = np.unique(np.asarray(users, dtype=str), return_inverse=True)
+    return np.array([index.get(name, -1) for name in unique.tolist()], dtype=np.int64)[inverse]
+
+
+def partial_fit_scaler(mean, var, n_samples_seen, features):
+    # StandardScaler.partial_fit ile aynı birleştirme: (mean, var, n_samples_seen, scale)
+    n_new = len(features)
+    total = n_samples_seen + n_new
+    delta = features.mean(axis=0) - mean
+    new_mean = mean + delta * n_new / total
+    new_var = (var * n_samples_seen + features.var(axis=0) * n_new
+               + delta ** 2 * n_samples_seen * n_new / total) / total
+    scale = np.sqrt(new_var)
+    # Sabit özelliklerde sklearn gibi ölçek 1 alınır
+    scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+    return new_mean, new_var, total, scale
+
+
+def rescale_thresholds(arrays, mean, scale):
+    # Eşikler eski ölçekten ham değere, oradan yeni ölçeğe çevrilir (yapraklardaki inf korunur).
+    # Her eşik ham uzayda "sola giden en büyük tamsayı K" olarak bulunur (bkz. integer_thresholds) ve
+    # yeni ölçekte K ile K+1'in tam ortasına konur. Böylece tüm tamsayı girdiler aynı dalı seçer.
+    feature = arrays["feature"]
+    k = integer_thresholds(arrays)
+    return np.where(np.isfinite(k), (k + 0.5 - mean[feature]) / scale[feature], np.inf)
+
+
+def widen_value(value, model_classes, n_labels):
+    # Ağaç çıktılarını tüm etiket uzayına genişletir (yeni sınıfların sütunu sıfır)
+    out = np.zeros((len(value), n_labels), dtype=np.float64)
+    out[:, np.asarray(model_classes)] = value
+    return out
+
+
+def update_leaves(arrays, scaled, labels, rng):
+    # Yaprak sınıf dağılımlarını yeni örneklerle günceller; (value, node_weight) döner
+    leaves = FlatForest(arrays).leaves(scaled)
+    weights = rng.poisson(1.0, size=leaves.shape).astype(np.float64)
+    value = np.array(arrays["value"], dtype=np.float64)
+    node_weight = np.array(arrays["node_weight"], dtype=np.float64)
+
+    # Yalnızca ağırlığı sıfırdan büyük (satır, ağaç) çiftleri yaprakları değiştirir
+    sampled = weights > 0
+    leaf = leaves[sampled]
+    label = np.broadcast_to(np.asarray(labels)[:, None], leaves.shape)[sampled]
+    weight = weights[sampled]
+
+    touched, slot = np.unique(leaf, return_inverse=True)
+    # value yalnızca yaprakları tutar (yaprak düğüm i -> value[i - n_internal]); node_weight tüm düğümleri
+    rows = touched - int(arrays["n_internal"])
+    counts = value[rows] * node_weight[touched, None]
+    np.add.at(counts, (slot, label), weight)
+    np.add.at(node_weight, leaf, weight)
+    value[rows] = counts / node_weight[touched, None]
+    return value, node_weight
+
+
+def merge_trees(arrays, grown, n_labels):
+    # grown ağaçlarını (export_forest çıktısı) arrays'in sonuna ekler; düğümler ardından yeniden
+    # numaralanır (önce tüm iç düğümler, sonra tüm yapraklar). Yaprak değerleri zaten düğüm sırasıyla art arda.
+    offset = len(arrays["feature"])
+    return order_leaves_last({
+        "feature": np.concatenate([arrays["feature"], grown["feature"]]),
+        "threshold": np.concatenate([arrays["threshold"], grown["threshold"]]),
+        "left": np.concatenate([arrays["left"], grown["left"] + offset]).astype(np.int32),
+        "right": np.concatenate([arrays["right"], grown["right"] + offset]).astype(np.int32),
+        "value": np.concatenate([arrays["value"], widen_value(grown["value"], grown["model_classes"], n_labels)]),
+        "node_weight": np.concatenate([arrays["node_weight"], grown["node_weight"]]),
+        "roots": np.concatenate([arrays["roots"], grown["roots"] + offset]).astype(np.int32),
+        "max_depth": np.int32(max(int(arrays["max_depth"]), int(grown["max_depth"]))),
+    })
+
+
+def enroll(arrays, users, features, replay_users=None, replay_features=None, new_trees=0, random_state=None):
+    # Modeli yeni örneklerle günceller; (yeni diziler, eklenen kullanıcılar) döner.
+    # users: satır başına kullanıcı adı; replay_*: yeni ağaçlar için eski veriden örneklem (isteğe bağlı)
+    check_state(arrays)
+    if "n_internal" not in arrays:
+        # Sürüm 1 düzeninde kaydedilmiş model paketi (bkz. flat_forest.py)
+        arrays = order_leaves_last(arrays)
+    rng = np.random.default_rng(random_state)
+    features = np.asarray(features, dtype=np.float64)
+    class_names, added = extend_labels(arrays["class_names"], users)
+    n_labels = len(class_names)
+    labels = encode_users(class_names, users)
+
+    mean, var, n_samples_seen, scale = partial_fit_scaler(
+        arrays["mean"], arrays["var"], arrays["n_samples_seen"], features)
+    # mmap ile açılmış salt okunur diziler kopyalanır
+    out = {name: np.array(value) for name, value in arrays.items()}
+    out["threshold"] = rescale_thresholds(arrays, mean, scale)
+    out["mean"], out["var"], out["n_samples_seen"], out["scale"] = mean, var, n_samples_seen, scale
+    out["value"] = widen_value(arrays["value"], arrays["model_classes"], n_labels)
+    out["model_classes"] = np.arange(n_labels, dtype=np.int64)
+    out["base"] = np.zeros(n_labels, dtype=np.float64)
+    out["class_names"] = class_names
+
+    out["value"], out["node_weight"] = update_leaves(out, (features - mean) / scale, labels, rng)
+
+    if new_trees > 0:
+        from sklearn.ensemble import RandomForestClassifier
+        grow_features, grow_labels = features, labels
+        if replay_features is not None and len(replay_features):
+            replay_labels = encode_users(class_names, replay_users)
+            known = replay_labels >= 0
+            grow_features = np.vstack([features, np.asarray(replay_features, dtype=np.float64)[known]])
+            grow_labels = np.concatenate([labels, replay_labels[known]])
+        model = RandomForestClassifier(n_estimators=new_trees, random_state=random_state, n_jobs=-1)
+        model.fit((grow_features - mean) / scale, grow_labels)
+        out.update(merge_trees(out, export_forest(model), n_labels))
+
+    out["model_version"] = np.int64(int(arrays.get("model_version", 0)) + 1)
+    return out, added
+
+
+def publish(arrays, path):
+    # Sürümlü kopyayı versions/ altına yazar, ardından yayındaki dosyayı atomik olarak değiştirir.
+    # Eski sürümü açık tutan süreçler (mmap) etkilenmez; geri dönmek için sürümlü dosya kopyalanabilir.
+    versions_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "versions")
+    os.makedirs(versions_dir, exist_ok=True)
+    versioned_path = os.path.join(versions_dir, f"v{int(arrays['model_version']):04d}_{os.path.basename(path)}")
+    save_model(versioned_path, arrays)
+
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(versioned_path, tmp_path)
+    except OSError:
+        shutil.copyfile(versioned_path, tmp_path)
+    os.replace(tmp_path, path)
+    return versioned_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yayındaki modele yeni kullanıcıları artımlı olarak ekler.")
+    parser.add_argument("--model", required=True, help="Yayındaki model paketi (.npy) veya düz orman (.npz)")
+    parser.add_argument("--data", required=True, help="Yeni kullanıcıların örnekleri: CSV veya column_store klasörü")
+    parser.add_argument("--replay", help="Yeni ağaçlar için eski veri (CSV veya column_store klasörü)")
+    parser.add_argument("--replay-rows", type=int, default=2000, help="Eski veriden alınacak en fazla satır")
+    parser.add_argument("--new-trees", type=int, default=20, help="Eklenecek ağaç sayısı (--replay gerekir)")
+    parser.add_argument("--seed", type=int, default=None, help="Tekrarlanabilirlik için rastgele tohum")
+    parser.add_argument("--dry-run", action="store_true", help="Güncelle ama yayımlama")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    arrays = load_model(args.model)
+    user_trials, features = load_samples(args.data)
+    users = user_names(user_trials)
+    replay_users = replay_features = None
+    if args.replay:
+        replay_trials, replay_features = load_samples(args.replay)
+        if len(replay_features) > args.replay_rows:
+            keep = np.random.default_rng(args.seed).choice(len(replay_features), args.replay_rows, replace=False)
+            replay_trials, replay_features = replay_trials[keep], replay_features[keep]
+        replay_users = user_names(replay_trials)
+    elif args.new_trees:
+        print("Uyarı: --replay verilmedi; yeni ağaç eklenmeyecek, yalnızca yapraklar güncellenecek.")
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    enrolled, added = enroll(arrays, users, features, replay_users, replay_features,
+                             new_trees=args.new_trees if args.replay else 0, random_state=args.seed)
+    enroll_seconds = time.perf_counter() - start
+
+    print(f"{len(features)} örnek, {len(set(users.tolist()))} kullanıcı işlendi; "
+          f"eklenen kullanıcılar: {', '.join(added) if added else 'yok'}")
+    print(f"Model sürümü {int(arrays.get('model_version', 0))} -> {int(enrolled['model_version'])}, "
+          f"{len(enrolled['roots'])} ağaç, {len(enrolled['feature'])} düğüm "
+          f"(yükleme {load_seconds:.2f} s, güncelleme {enroll_seconds:.2f} s)")
+    if args.dry_run:
+        return
+    versioned_path = publish(enrolled, args.model)
+    print(f"Yayımlandı: '{args.model}' (sürümlü kopya '{versioned_path}').")
+
+
+if __name__ == '__main__':
+    main()
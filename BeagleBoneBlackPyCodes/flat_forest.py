@@ -0,0 +1,282 @@
+import argparse
+import json
+
+import numpy as np
+
+# Eğitilmiş ağaç topluluğunu (sklearn RandomForest veya XGBoost) bitişik NumPy dizilerine
+# düzleştirir ve yalnızca numpy ile çalışan vektörel bir değerlendirici sağlar.
+# Böylece BBB üzerinde tahmin için sklearn/xgboost import etmek gerekmez.
+#
+# Dizi düzeni (quantized_forest.py'deki gibi önce tüm ağaçların iç düğümleri, sonra tüm yapraklar;
+# her grupta ağaç sırası korunur):
+#   feature   : düğümde karşılaştırılan özellik indeksi
+#   threshold : eşik; float32'ye çevrilmiş girdi için "x <= threshold" ise sola gidilir
+#   left/right: çocuk düğümlerin global indeksleri; yapraklar kendilerine döner
+#   value     : yalnızca yaprak çıktıları, yaprak düğüm i için value[i - n_internal]
+#               (RF: sınıf dağılımı, XGBoost: ilgili sınıf sütununda yaprak ağırlığı)
+#   n_internal: iç düğüm sayısı
+#   roots     : her ağacın kök düğümü
+#   node_weight: (yalnızca RF) düğüme düşen ağırlıklı eğitim örneği sayısı; enrollment.py yaprak
+#               sınıf dağılımlarını yeni örneklerle güncellerken kullanır
+# Sürüm 1 dosyalarında düğümler ağaç ağaç sıralıydı ve value her düğüm için bir satır tutuyordu;
+# bunlar yüklenirken order_leaves_last ile çevrilir.
+
+FOREST_FORMAT_VERSION = 2
+
+
+def order_leaves_last(arrays):
+    # Düğümleri yeniden numaralar: önce iç düğümler, sonra yapraklar (her grupta eski sıra korunur).
+    # value düğüm başına bir satırsa yalnızca yaprak satırları tutulur; zaten yaprak başınaysa
+    # (düğüm sırasıyla) olduğu gibi kalır. Zaten bu düzendeki dizilerde düğüm sırası değişmez.
+    left = np.asarray(arrays["left"])
+    is_leaf = left == np.arange(len(left))
+    order = np.concatenate([np.flatnonzero(~is_leaf), np.flatnonzero(is_leaf)])
+    new_index = np.empty(len(order), dtype=np.int32)
+    new_index[order] = np.arange(len(order), dtype=np.int32)
+    n_internal = int(np.count_nonzero(~is_leaf))
+
+    out = dict(arrays)
+    for key in ("feature", "threshold", "node_weight"):
+        if key in arrays:
+            out[key] = np.asarray(arrays[key])[order]
+    out["left"] = new_index[left[order]]
+    out["right"] = new_index[np.asarray(arrays["right"])[order]]
+    out["roots"] = new_index[np.asarray(arrays["roots"])]
+    value = np.asarray(arrays["value"])
+    out["value"] = value[order[n_internal:]] if len(value) == len(left) else value
+    out["n_internal"] = np.int32(n_internal)
+    out["format_version"] = np.int32(FOREST_FORMAT_VERSION)
+    return out
+
+
+def _flatten_trees(trees, n_outputs):
+    # trees: (feature, threshold, left, right, value) dizilerinden oluşan liste; yapraklarda left == -1.
+    # Düğümler önce ağaç ağaç dizilir, ardından order_leaves_last ile iç düğümler öne alınır
+    sizes = [len(t[0]) for t in trees]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    total = int(sum(sizes))
+
+    feature = np.zeros(total, dtype=np.int32)
+    threshold = np.full(total, np.inf, dtype=np.float64)
+    left = np.empty(total, dtype=np.int32)
+    right = np.empty(total, dtype=np.int32)
+    value = []
+    depths = []
+
+    for offset, (t_feature, t_threshold, t_left, t_right, t_value) in zip(offsets, trees):
+        n = len(t_feature)
+        nodes = np.arange(offset, offset + n, dtype=np.int32)
+        is_leaf = t_left < 0
+        feature[nodes] = np.where(is_leaf, 0, t_feature)
+        threshold[nodes] = np.where(is_leaf, np.inf, t_threshold)
+        # Yapraklar kendi üzerine döner; böylece tüm ağaçlar aynı adım sayısında yürütülebilir
+        left[nodes] = np.where(is_leaf, nodes, t_left + offset)
+        right[nodes] = np.where(is_leaf, nodes, t_right + offset)
+        # Yalnızca yaprak satırları, düğüm sırasıyla
+        value.append(np.asarray(t_value, dtype=np.float64)[is_leaf])
+
+        depth = np.zeros(n, dtype=np.int32)
+        for i in range(n):
+            if not is_leaf[i]:
+                depth[t_left[i]] = depth[t_right[i]] = depth[i] + 1
+        depths.append(int(depth.max()))
+
+    return {
+        "feature": feature,
+        "threshold": threshold,
+        "left": left,
+        "right": right,
+        "value": np.concatenate(value).reshape(-1, n_outputs),
+        "roots": offsets.astype(np.int32),
+        "max_depth": np.int32(max(depths)),
+    }
+
+
+def _export_sklearn_forest(model):
+    n_classes = int(model.n_classes_)
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        leaf_value = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+        # Eski sklearn sürümlerinde value sınıf sayılarını tutar; predict_proba gibi normalize edilir
+        totals = leaf_value.sum(axis=1, keepdims=True)
+        if np.any(totals > 1.0 + 1e-6):
+            totals[totals == 0.0] = 1.0
+            leaf_value /= totals
+        trees.append((tree.feature, tree.threshold, tree.children_left, tree.children_right, leaf_value))
+
+    arrays = _flatten_trees(trees, n_classes)
+    arrays["node_weight"] = np.concatenate(
+        [np.asarray(estimator.tree_.weighted_n_node_samples, dtype=np.float64) for estimator in model.estimators_])
+    arrays = order_leaves_last(arrays)
+    arrays["kind"] = np.array("sklearn")
+    arrays["model_classes"] = np.asarray(model.classes_).astype(np.int64)
+    arrays["base"] = np.zeros(n_classes, dtype=np.float64)
+    return arrays
+
+
+def _export_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    gbtree = learner["gradient_booster"]["model"]
+    objective = learner["objective"]["name"]
+    n_outputs = max(int(learner["learner_model_param"].get("num_class", "0")), 1)
+
+    trees = []
+    for tree, group in zip(gbtree["trees"], gbtree["tree_info"]):
+        t_left = np.asarray(tree["left_children"], dtype=np.int64)
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        # XGBoost "x < t" kullanır; float32 girdide bu "x <= t'nin bir önceki float32 değeri" ile aynıdır
+        t_threshold = np.nextafter(conditions, np.float32(-np.inf)).astype(np.float64)
+        t_value = np.zeros((len(t_left), n_outputs), dtype=np.float64)
+        t_value[:, group] = np.where(t_left < 0, conditions, 0.0)
+        trees.append((np.asarray(tree["split_indices"]), t_threshold, t_left,
+                      np.asarray(tree["right_children"], dtype=np.int64), t_value))
+
+    arrays = order_leaves_last(_flatten_trees(trees, n_outputs))
+    base = [float(v) for v in learner["learner_model_param"]["base_score"].strip("[]").split(",")]
+    base = np.broadcast_to(np.asarray(base, dtype=np.float64), (n_outputs,)).copy()
+    if objective.startswith("binary:logistic"):
+        base = np.log(base / (1.0 - base))
+    arrays["kind"] = np.array("xgboost")
+    arrays["model_classes"] = np.arange(max(n_outputs, 2), dtype=np.int64)
+    arrays["base"] = base
+    return arrays
+
+
+def export_forest(model, scaler=None, class_names=None):
+    # Modeli düzleştirilmiş dizilere çevirir; scaler ve sınıf adları da eklenirse
+    # çalışma anında sklearn'e hiç ihtiyaç kalmaz
+    if hasattr(model, "estimators_"):
+        arrays = _export_sklearn_forest(model)
+    elif hasattr(model, "get_booster"):
+        arrays = _export_xgboost(model)
+    else:
+        raise TypeError(f"Desteklenmeyen model türü: {type(model).__name__}")
+
+    arrays["format_version"] = np.int32(FOREST_FORMAT_VERSION)
+    if scaler is not None:
+        n_features = int(scaler.n_features_in_)
+        arrays["mean"] = np.zeros(n_features) if scaler.mean_ is None else np.asarray(scaler.mean_, dtype=np.float64)
+        arrays["scale"] = np.ones(n_features) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+        # Akan istatistikler (partial_fit ile güncelleme için; bkz. enrollment.py)
+        if getattr(scaler, "var_", None) is not None:
+            arrays["var"] = np.asarray(scaler.var_, dtype=np.float64)
+            arrays["n_samples_seen"] = np.broadcast_to(
+                np.asarray(scaler.n_samples_seen_, dtype=np.float64), (n_features,)).copy()
+    if class_names is not None:
+        arrays["class_names"] = np.asarray(class_names).astype(str)
+    return arrays
+
+
+def integer_thresholds(arrays):
+    # Eşikleri ölçeklenmemiş ham özellik uzayına çevirir: her bölme için "sola giden en büyük tamsayı K".
+    # Ham özellikler tamsayı olduğundan "x <= K" ölçeklenmiş girdideki karşılaştırmayla tüm tamsayı
+    # girdilerde aynı dalı seçer. sklearn eşikleri float32 yuvarlaması nedeniyle bazen tam bir veri
+    # değerinin üzerine düştüğü için K, CompiledPipeline ile aynı aritmetikle aranır. Yapraklarda inf döner.
+    feature = arrays["feature"]
+    threshold = arrays["threshold"]
+    mean = arrays["mean"][feature]
+    scale = arrays["scale"][feature]
+    finite = np.isfinite(threshold)
+
+    def goes_left(k):
+        # Önce float64 ölçekleme, ardından float32 karşılaştırma
+        return ((k - mean) / scale).astype(np.float32) <= threshold
+
+    k = np.floor(np.where(finite, threshold * scale + mean, 0.0))
+    k = np.where(goes_left(k + 1), k + 1, k)
+    k = np.where(goes_left(k), k, k - 1)
+    return np.where(finite, k, np.inf)
+
+
+def save_forest(path, arrays):
+    np.savez(path, **arrays)
+
+
+def load_forest(path):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    version = int(arrays["format_version"])
+    if version == 1:
+        arrays = order_leaves_last(arrays)
+    elif version != FOREST_FORMAT_VERSION:
+        raise ValueError(f"Desteklenmeyen orman dosyası sürümü: {version}")
+    return arrays
+
+
+class FlatForest:
+    # Ölçeklenmiş (N, 18) girdi için tüm ağaçları aynı anda, derinlik adımlarıyla yürütür
+
+    def __init__(self, arrays):
+        if "n_internal" not in arrays:
+            # Sürüm 1 düzeninde kaydedilmiş model paketi
+            arrays = order_leaves_last(arrays)
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.n_internal = int(arrays["n_internal"])
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.kind = str(arrays["kind"])
+        self.model_classes = arrays["model_classes"]
+        self.base = arrays["base"]
+
+    def leaves(self, scaled):
+        # Her satır ve ağaç için ulaşılan yaprak düğümün indeksi: (N, ağaç_sayısı)
+        # sklearn ile aynı karşılaştırma için girdi float32'ye çevrilir
+        x32 = np.asarray(scaled, dtype=np.float32)
+        rows = np.arange(len(x32))[:, None]
+        node = np.broadcast_to(self.roots, (len(x32), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = x32[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def decision(self, scaled):
+        # RF için ortalama sınıf olasılıkları, XGBoost için ham skor (margin)
+        node = self.leaves(scaled)
+        out = np.zeros((len(node), self.value.shape[1]), dtype=np.float64)
+        out += self.base
+        # Ağaçlar sklearn'deki sırayla toplanır; böylece eşitlik durumlarında da aynı sonuç çıkar
+        leaf = node - self.n_internal
+        for t in range(leaf.shape[1]):
+            out += self.value[leaf[:, t]]
+        if self.kind == "sklearn":
+            out /= node.shape[1]
+        return out
+
+    def predict(self, scaled):
+        scores = self.decision(scaled)
+        if scores.shape[1] == 1:
+            return self.model_classes.take((scores[:, 0] > 0).astype(np.intp))
+        return self.model_classes.take(np.argmax(scores, axis=1))
+
+
+def main():
+    # Komut satırı: BBB'deki mevcut joblib dosyalarını düzleştirilmiş .npz dosyasına veya model paketine çevirir
+    parser = argparse.ArgumentParser(description="Ağaç modelini numpy ile çalışan düz dizilere aktarır.")
+    parser.add_argument("model", help="Model joblib dosyası (RandomForest veya XGBoost)")
+    parser.add_argument("scaler", help="StandardScaler joblib dosyası")
+    parser.add_argument("encoder", help="LabelEncoder joblib dosyası")
+    parser.add_argument("output", help="Çıktı dosyası: .npz (düz orman) veya .npy (model_bundle paketi)")
+    args = parser.parse_args()
+
+    import joblib
+
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+    label_encoder = joblib.load(args.encoder)
+    arrays = export_forest(model, scaler, label_encoder.classes_)
+    if args.output.endswith(".npy"):
+        from model_bundle import save_bundle
+        save_bundle(args.output, arrays)
+    else:
+        save_forest(args.output, arrays)
+    print(f"{len(arrays['roots'])} ağaç, {len(arrays['feature'])} düğüm '{args.output}' dosyasına aktarıldı.")
+
+
+if __name__ == '__main__':
+    main()
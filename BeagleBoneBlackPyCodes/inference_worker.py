@@ -0,0 +1,493 @@
+import json
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import struct
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+from metrics import METRICS, now
+
+# Ayrı süreçte çalışan tahmin işçisi.
+# BBBPredict'te seri okuma ile model tahmini aynı iş parçacığını paylaşır: tahmin sürerken rfcomm
+# tamponunu boşaltan kimse yoktur. Burada model uzun ömürlü bir işçi süreçte çalışır; G/Ç süreci
+# yalnızca satırları okur, özellikleri paylaşılan belleğe yazar ve sonuçları geldikçe işler.
+#
+# Paylaşılan bellek (multiprocessing.shared_memory) sabit boyutlu yuvalardan oluşan bir halkadır:
+#   features (yuva, max_rows, 18) float32   G/Ç süreci yazar (ham tamsayılar float32'de birebir)
+#   labels   (yuva, max_rows) int32          işçi yazar (sayısal etiketler)
+#   proba    (yuva, max_rows, max_labels)    işçi yazar (yalnızca olasılık istenmişse)
+#   meta     (yuva, alan) int64              sıra no, satır sayısı, olasılık isteği, model kuşağı,
+#                                            durum, etiket sayısı, tahmin süresi
+# Mesajlar boru (pipe) üzerinden ham baytlardır; pickle yoktur:
+#   G/Ç -> işçi:  b"S" + (yuva, sıra no)   yuvayı değerlendir
+#                 b"L" + JSON               model dosyasını kuşak olarak yükle (yeniden başlatmada
+#                                           beklenen sürüm ve sınıflarla)
+#                 b"Q"                      çık
+#   işçi -> G/Ç:  b"R" + (yuva, sıra no) + JSON   sonuç hazır; JSON işçideki ölçüm değişiklikleri
+#                 b"F" + (yuva, sıra no) + hata metni
+#                 b"M" + JSON               model yüklendi (kuşak, sürüm, sınıf adları)
+#                 b"E" + JSON               model yüklenemedi
+#                 b"X"                      işçi süreç öldü (başlatıcı yazar)
+# Sonuç borusu işçi yeniden başlatılsa da aynı kalır; fileno() seri okuyucunun seçicisine eklenir ve
+# sonuçlar seri verisiyle aynı döngüde işlenir.
+#
+# Geri basınç: boş yuva yoksa submit() False döner; çağıran satırları kendi kuyruğunda tutar.
+# Çökme: başlatıcı işçinin bitişini bildirir; işçi yeni istek borusuyla yeniden başlatılır, yüklü model
+# kuşakları yeniden yüklenir ve bitmemiş yuvalar sırasıyla yeniden gönderilir (yuva içeriği paylaşılan
+# bellekte durur). Değerlendirilirken işçiyi max_attempts kez düşüren toplu tahmin hatayla düşürülür.
+# Yeniden yüklemede model dosyası o arada değiştiyse (sürüm veya sınıflar farklı) eski kuşak numarası
+# yeni içeriği almaz; kuşak yüklenemedi (E) sayılır ve o kuşağa gelen istekler hata alır.
+#
+# İşçiler fork ile başlatılır (Linux): model yükleme fonksiyonu ve yapılandırma sürece kopyalanır.
+# Çok iş parçacıklı bir süreçten fork edilen çocuk, fork anında başka bir iş parçacığının tuttuğu
+# kilitlerde (ölçüm sunucusu, G/Ç kütüphaneleri) kilitlenebilir. Bu yüzden G/Ç süreci yalnızca bir kez,
+# ilk start() çağrısında tek iş parçacıklı bir başlatıcı fork eder; işçileri (yeniden başlatmalar
+# dahil) başlatıcı fork eder. İlk start() diğer iş parçacıkları başlamadan önce çağrılmalıdır.
+# İstek borusunun okuma ucu başlatıcıya SCM_RIGHTS ile (socket.send_fds) verilir.
+#
+# İşçideki ölçümler (ör. scale/predict, önbellek sayaçları) kendi METRICS'ine yazılır; her sonuçla
+# birlikte değişiklikler gönderilir ve G/Ç sürecinde "worker_" önekiyle kaydedilir (ör. worker_predict).
+
+META_SEQ, META_ROWS, META_PROBA, META_GENERATION, META_STATUS, META_LABELS, META_PREDICT_NS = range(7)
+META_FIELDS = 7
+SLOT_FREE, SLOT_SUBMITTED, SLOT_RUNNING, SLOT_DONE, SLOT_FAILED = range(5)
+_SLOT_MESSAGE = struct.Struct("<iq")
+
+
+class SlotRing:
+    # Paylaşılan bellekte sabit boyutlu yuvalar; diziler aynı bloğun üzerindeki numpy görünümleridir
+
+    def __init__(self, n_slots, max_rows, n_features, max_labels):
+        self.n_slots = n_slots
+        self.max_rows = max_rows
+        self.n_features = n_features
+        self.max_labels = max_labels
+        layout = [
+            ("features", np.float32, (n_slots, max_rows, n_features)),
+            ("labels", np.int32, (n_slots, max_rows)),
+            ("proba", np.float32, (n_slots, max_rows, max_labels)),
+            ("meta", np.int64, (n_slots, META_FIELDS)),
+        ]
+        offsets = []
+        size = 0
+        for _, dtype, shape in layout:
+            size = (size + 63) // 64 * 64
+            offsets.append(size)
+            size += np.dtype(dtype).itemsize * int(np.prod(shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        for (name, dtype, shape), offset in zip(layout, offsets):
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset))
+        self.meta[:] = 0
+
+    def close(self):
+        # Görünümler bırakılmadan paylaşılan bellek kapatılamaz
+        del self.features, self.labels, self.proba, self.meta
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _launcher_main(control, ring, responses, load_pipeline, keep_models, nice):
+    # Başlatıcı süreç (tek iş parçacıklı): her b"W" + istek borusu için bir işçi fork eder ve pid'ini
+    # döner; işçinin bitişini "yaşam hattı" borusunun kapanmasından anlar ve G/Ç sürecine b"X" yazar.
+    # Kontrol soketi kapanınca (G/Ç süreci kapandı veya öldü) işçinin bitmesini bekleyip çıkar.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_pid = None
+    lifeline = None
+    while True:
+        watched = [control] if lifeline is None else [control, lifeline]
+        ready = select.select(watched, [], [])[0]
+        if lifeline is not None and lifeline in ready:
+            os.close(lifeline)
+            lifeline = None
+            os.waitpid(worker_pid, 0)
+            worker_pid = None
+            responses.send_bytes(b"X")
+        if control not in ready:
+            continue
+        try:
+            message, fds, _, _ = socket.recv_fds(control, 16, 1)
+        except OSError:
+            message, fds = b"", []
+        if not message:
+            break
+        lifeline, child_lifeline = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(lifeline)
+                control.close()
+                _worker_main(ring, Connection(fds[0], writable=False), responses, load_pipeline, keep_models, nice)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(child_lifeline)
+        os.close(fds[0])
+        worker_pid = pid
+        control.send(struct.pack("<q", pid))
+    if worker_pid is not None:
+        os.waitpid(worker_pid, 0)
+
+
+def _worker_main(ring, requests, responses, load_pipeline, keep_models, nice):
+    # İşçi süreç: istekleri sırayla işler. Ctrl+C tüm süreç grubuna gider; kapanışı G/Ç süreci yönetir
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Tek çekirdekte G/Ç süreci uyanınca işlemciyi hemen alsın diye işçi daha düşük öncelikte çalışır
+    os.nice(nice)
+    pipelines = OrderedDict()
+    # Fork anında G/Ç sürecinden kopyalanan ölçümler gönderilmez; yalnızca işçide kaydedilenler
+    seen_metrics = {}
+    METRICS.changes(seen_metrics)
+    while True:
+        try:
+            message = requests.recv_bytes()
+        except EOFError:
+            return
+        kind = message[:1]
+        if kind == b"Q":
+            return
+        if kind == b"L":
+            request = json.loads(message[1:])
+            generation = request["generation"]
+            try:
+                pipeline, version = load_pipeline()
+                classes = None if pipeline.classes is None else [str(name) for name in pipeline.classes]
+                expected = request.get("expect")
+                if expected is not None and (expected["version"] != version or expected["classes"] != classes):
+                    # Dosya bu kuşak ilk yüklendikten sonra değişti; eski kuşak yeni modeli almamalı
+                    raise RuntimeError(f"Model dosyası kuşak {generation} yüklendikten sonra değişti "
+                                       f"(sürüm {expected['version']} -> {version})")
+            except Exception as e:
+                responses.send_bytes(b"E" + json.dumps({"generation": generation, "error": str(e)}).encode())
+                continue
+            pipelines[generation] = pipeline
+            while len(pipelines) > keep_models:
+                pipelines.popitem(last=False)
+            responses.send_bytes(b"M" + json.dumps(
+                {"generation": generation, "version": version, "classes": classes}).encode())
+            continue
+
+        slot, seq = _SLOT_MESSAGE.unpack(message[1:])
+        meta = ring.meta[slot]
+        # Yeniden başlatmadan sonra aynı istek iki kez gelebilir; yalnızca bekleyen sıra no işlenir
+        if meta[META_SEQ] != seq or meta[META_STATUS] != SLOT_SUBMITTED:
+            continue
+        n = int(meta[META_ROWS])
+        pipeline = pipelines.get(int(meta[META_GENERATION]))
+        # Çökmede yalnızca üzerinde çalışılan yuva deneme sayar (bkz. InferenceWorker._restart)
+        meta[META_STATUS] = SLOT_RUNNING
+        try:
+            if pipeline is None:
+                raise RuntimeError(f"Model kuşağı {int(meta[META_GENERATION])} işçide yüklü değil")
+            start = now()
+            features = ring.features[slot, :n]
+            if meta[META_PROBA]:
+                proba = pipeline.predict_proba(features)
+                if proba.shape[1] > ring.max_labels:
+                    raise ValueError(f"Sınıf sayısı {proba.shape[1]} yuva kapasitesini ({ring.max_labels}) aşıyor")
+                ring.proba[slot, :n, :proba.shape[1]] = proba
+                meta[META_LABELS] = proba.shape[1]
+            else:
+                ring.labels[slot, :n] = pipeline.predict_encoded(features)
+            meta[META_PREDICT_NS] = now() - start
+        except Exception as e:
+            meta[META_STATUS] = SLOT_FAILED
+            responses.send_bytes(b"F" + _SLOT_MESSAGE.pack(slot, seq) + str(e).encode())
+            continue
+        meta[META_STATUS] = SLOT_DONE
+        responses.send_bytes(b"R" + _SLOT_MESSAGE.pack(slot, seq) + json.dumps(METRICS.changes(seen_metrics)).encode())
+
+
+class InferenceWorker:
+    """
+    G/Ç sürecindeki taraf: yuvaları yönetir, işçi süreci başlatır ve çökünce yeniden başlatır.
+    Tek iş parçacığından (seri okuma döngüsü) kullanılmalıdır.
+    """
+
+    def __init__(self, load_pipeline, n_features, n_slots=4, max_rows=64, max_labels=64,
+                 keep_models=2, max_attempts=2, nice=10):
+        # load_pipeline() -> (hat, sürüm): işçi süreçte çağrılır (hat: CompiledPipeline arayüzü)
+        # nice: işçinin G/Ç sürecine göre öncelik farkı (os.nice)
+        self.load_pipeline = load_pipeline
+        self.nice = nice
+        self.keep_models = keep_models
+        self.max_attempts = max_attempts
+        self.ring = SlotRing(n_slots, max_rows, n_features, max_labels)
+        self.max_rows = max_rows
+        self.generation = 0
+        self.restarts = 0
+        self._context = multiprocessing.get_context("fork")
+        self._responses_r, self._responses_w = self._context.Pipe(duplex=False)
+        self._requests_w = None
+        self._launcher = None
+        self._control = None
+        self._pid = None
+        self._free = list(range(n_slots))
+        # yuva -> [sıra no, callback, deneme sayısı, gönderim anı]; sıra, gönderim sırasıdır
+        self._in_flight = OrderedDict()
+        self._next_seq = 1
+        self._loaded = OrderedDict()   # kuşak -> {"version", "classes"} (işçinin bildirdiği)
+        self._pending = []             # yüklenmesi istenen, sonucu gelmemiş kuşaklar
+        self._model_hooks = []
+        self._model_error_hooks = []
+
+    def on_model(self, hook):
+        """Registers hook(generation, version, classes), called when the worker has loaded a model."""
+        self._model_hooks.append(hook)
+
+    def on_model_error(self, hook):
+        """Registers hook(generation, error), called when the worker could not load a model."""
+        self._model_error_hooks.append(hook)
+
+    def fileno(self):
+        # Sonuç borusu: okunabilir olduğunda poll() çağrılmalı
+        return self._responses_r.fileno()
+
+    @property
+    def free_slots(self):
+        return len(self._free)
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight)
+
+    @property
+    def pid(self):
+        return self._pid
+
+    def start(self):
+        # İlk çağrıda başlatıcıyı fork eder (diğer iş parçacıkları başlamadan önce çağrılmalı)
+        if self._launcher is None:
+            self._control, launcher_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self._launcher = self._context.Process(
+                target=_launcher_main, name="inference-launcher", daemon=True,
+                args=(launcher_control, self.ring, self._responses_w, self.load_pipeline, self.keep_models, self.nice))
+            self._launcher.start()
+            launcher_control.close()
+        requests_r, self._requests_w = self._context.Pipe(duplex=False)
+        socket.send_fds(self._control, [b"W"], [requests_r.fileno()])
+        requests_r.close()
+        reply = self._control.recv(8)
+        if len(reply) != 8:
+            raise RuntimeError("İşçi başlatıcı süreci yanıt vermiyor")
+        self._pid = struct.unpack("<q", reply)[0]
+        # Yeniden başlatmada yüklü kuşaklar model dosyasından yeniden okunur; dosya o arada değiştiyse
+        # işçi kuşağı reddeder (E). Yüklenmesi beklenen kuşaklar yeniden istenir.
+        for generation, info in self._loaded.items():
+            self._send_load(generation, info)
+        for generation in self._pending:
+            self._send_load(generation)
+
+    def _send_load(self, generation, expect=None):
+        self._requests_w.send_bytes(b"L" + json.dumps({"generation": generation, "expect": expect}).encode())
+
+    def load(self, generation=None):
+        # İşçiden model dosyasını yeni bir kuşak olarak yüklemesini ister; sonuç on_model ile gelir
+        self.generation = self.generation + 1 if generation is None else generation
+        self._pending.append(self.generation)
+        self._send_load(self.generation)
+        return self.generation
+
+    def submit(self, rows, generation, want_proba, callback):
+        """
+        Queues up to max_rows rows; callback(scores, error) runs from poll() with labels (k,) or
+        probabilities (k, n_labels), or error text. Returns False if no slot is free (backpressure).
+        """
+        if len(rows) > self.max_rows:
+            raise ValueError(f"Bir yuvaya en fazla {self.max_rows} satır sığar, verilen: {len(rows)}")
+        if not self._free:
+            METRICS.count("worker_backpressure")
+            return False
+        slot = self._free.pop()
+        seq = self._next_seq
+        self._next_seq += 1
+        self.ring.features[slot, :len(rows)] = rows
+        meta = self.ring.meta[slot]
+        meta[META_SEQ] = seq
+        meta[META_ROWS] = len(rows)
+        meta[META_PROBA] = int(want_proba)
+        meta[META_GENERATION] = generation
+        meta[META_STATUS] = SLOT_SUBMITTED
+        self._in_flight[slot] = [seq, callback, 1, now()]
+        self._requests_w.send_bytes(b"S" + _SLOT_MESSAGE.pack(slot, seq))
+        return True
+
+    def poll(self):
+        # Hazır sonuçları ve bildirimleri işler (bloklamaz); işlenen mesaj sayısını döner
+        handled = 0
+        while self._responses_r.poll():
+            message = self._responses_r.recv_bytes()
+            handled += 1
+            kind = message[:1]
+            if kind in (b"R", b"F"):
+                slot, seq = _SLOT_MESSAGE.unpack(message[1:1 + _SLOT_MESSAGE.size])
+                tail = message[1 + _SLOT_MESSAGE.size:]
+                if kind == b"R":
+                    METRICS.merge(json.loads(tail), prefix="worker_")
+                self._complete(slot, seq, tail.decode() if kind == b"F" else None)
+            elif kind == b"M":
+                info = json.loads(message[1:])
+                generation = info["generation"]
+                if generation in self._pending:
+                    self._pending.remove(generation)
+                if generation not in self._loaded:
+                    self._loaded[generation] = {"version": info["version"], "classes": info["classes"]}
+                    while len(self._loaded) > self.keep_models:
+                        self._loaded.popitem(last=False)
+                for hook in self._model_hooks:
+                    hook(generation, info["version"], info["classes"])
+            elif kind == b"E":
+                info = json.loads(message[1:])
+                if info["generation"] in self._pending:
+                    self._pending.remove(info["generation"])
+                # Yeniden yüklenemeyen kuşak artık işçide yok; sonraki yeniden başlatmada istenmez
+                self._loaded.pop(info["generation"], None)
+                for hook in self._model_error_hooks:
+                    hook(info["generation"], info["error"])
+            elif kind == b"X":
+                self._restart()
+        return handled
+
+    def _complete(self, slot, seq, error):
+        entry = self._in_flight.get(slot)
+        if entry is None or entry[0] != seq:
+            return
+        del self._in_flight[slot]
+        meta = self.ring.meta[slot]
+        scores = None
+        if error is None:
+            n = int(meta[META_ROWS])
+            if meta[META_PROBA]:
+                scores = self.ring.proba[slot, :n, :int(meta[META_LABELS])].astype(np.float64)
+            else:
+                scores = self.ring.labels[slot, :n].astype(np.intp)
+            METRICS.histogram("worker_batch").record(int(meta[META_PREDICT_NS]))
+        METRICS.observe("worker_roundtrip", entry[3])
+        meta[META_STATUS] = SLOT_FREE
+        self._free.append(slot)
+        entry[1](scores, error)
+
+    def _restart(self):
+        # Başlatıcı b"X"i işçi süreci toplandıktan sonra yazar
+        METRICS.count("worker_restarts")
+        self.restarts += 1
+        self._requests_w.close()
+        failed = []
+        for slot, entry in list(self._in_flight.items()):
+            meta = self.ring.meta[slot]
+            if meta[META_STATUS] == SLOT_RUNNING:
+                # İşçi bu yuvayı değerlendirirken öldü; aynı toplu tahmin işçiyi tekrar tekrar düşürmesin
+                entry[2] += 1
+                if entry[2] > self.max_attempts:
+                    failed.append((slot, entry))
+                    continue
+            if meta[META_STATUS] in (SLOT_RUNNING, SLOT_DONE, SLOT_FAILED):
+                # Sonucu yazılmış ama mesajı gönderilememiş yuvalar da yeniden değerlendirilir
+                meta[META_STATUS] = SLOT_SUBMITTED
+        for slot, entry in failed:
+            del self._in_flight[slot]
+            self.ring.meta[slot, META_STATUS] = SLOT_FREE
+            self._free.append(slot)
+            METRICS.count("worker_failed_batches")
+        self.start()
+        for slot, entry in self._in_flight.items():
+            self._requests_w.send_bytes(b"S" + _SLOT_MESSAGE.pack(slot, entry[0]))
+        for slot, entry in failed:
+            entry[1](None, f"İşçi süreç bu toplu tahminde {self.max_attempts} kez sonlandı")
+
+    def wait(self, condition, timeout):
+        # condition() doğru olana kadar sonuçları işler; süre dolarsa False döner
+        deadline = None if timeout is None else now() + int(timeout * 1e9)
+        while not condition():
+            remaining = None if deadline is None else (deadline - now()) / 1e9
+            if remaining is not None and remaining <= 0:
+                return False
+            if self._responses_r.poll(remaining):
+                self.poll()
+        return True
+
+    def run(self, features, generation, want_proba=False):
+        # Eşzamanlı kullanım (ör. predict_users): satırları yuvalara böler ve tüm sonuçları bekler
+        features = np.asarray(features, dtype=np.float64)
+        chunks = [None] * ((len(features) + self.max_rows - 1) // self.max_rows)
+        errors = []
+
+        def store(index, scores, error):
+            chunks[index] = scores
+            if error is not None:
+                errors.append(error)
+
+        for index, start in enumerate(range(0, len(features), self.max_rows)):
+            rows = features[start:start + self.max_rows]
+            callback = lambda scores, error, index=index: store(index, scores, error)
+            self.wait(lambda: self.free_slots > 0, None)
+            self.submit(rows, generation, want_proba, callback)
+        self.wait(lambda: errors or all(chunk is not None for chunk in chunks), None)
+        if errors:
+            raise RuntimeError(errors[0])
+        if not chunks:
+            return np.empty((0,), dtype=np.intp)
+        return np.concatenate(chunks)
+
+    def close(self, timeout=5.0):
+        if self._launcher is not None:
+            try:
+                self._requests_w.send_bytes(b"Q")
+            except OSError:
+                pass
+            # Kontrol soketi kapanınca başlatıcı işçinin bitmesini bekleyip çıkar
+            self._control.close()
+            self._launcher.join(timeout)
+            if self._launcher.is_alive():
+                try:
+                    os.kill(self._pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                self._launcher.join(timeout)
+            if self._launcher.is_alive():
+                self._launcher.terminate()
+                self._launcher.join()
+        for connection in (self._requests_w, self._responses_r, self._responses_w):
+            if connection is not None:
+                connection.close()
+        self.ring.close()
+
+
+class RemotePipeline:
+    # İşçideki modelin G/Ç sürecindeki vekili: CompiledPipeline arayüzü (eşzamanlı, işçiye gidip gelir).
+    # Sıcak yolda (BBBPredict oturumları) eşzamansız InferenceWorker.submit kullanılır.
+
+    def __init__(self, worker, generation, classes, n_features):
+        self.worker = worker
+        self.generation = generation
+        self.classes = None if classes is None else np.asarray(classes).astype(object)
+        self.n_features = n_features
+
+    def _prepare(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != self.n_features:
+            raise ValueError(f"Beklenen özellik sayısı {self.n_features}, alınan: {features.shape[1]}")
+        return features
+
+    def predict_encoded(self, features):
+        return self.worker.run(self._prepare(features), self.generation)
+
+    def predict_proba(self, features):
+        return self.worker.run(self._prepare(features), self.generation, want_proba=True)
+
+    def predict(self, features):
+        encoded = self.predict_encoded(features)
+        if self.classes is None:
+            return encoded
+        return self.classes[encoded]
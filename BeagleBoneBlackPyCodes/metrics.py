@@ -0,0 +1,233 @@
+import array
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Lightweight hot-path metrics for the BBB services ---
+# Spans are measured with the monotonic perf_counter_ns clock and recorded into preallocated ring
+# buffers (no allocation per sample); counters are plain integers. Percentiles are only computed
+# when a snapshot is taken, i.e. off the hot path. Snapshots can be served as JSON over a local
+# HTTP endpoint and/or written periodically to a file.
+#
+# Hot-path usage:
+#     start = metrics.now()
+#     ...
+#     metrics.METRICS.observe("parse", start)
+#     metrics.METRICS.count("malformed_lines")
+#
+# Each metric is expected to be updated from a single thread (the serial loop, the MQTT publisher,
+# ...); snapshots read them from another thread without locking.
+
+now = time.perf_counter_ns
+
+DEFAULT_HISTOGRAM_SIZE = 1024
+
+
+class Histogram:
+    """Ring buffer of the most recent durations (ns) plus lifetime count, sum and max."""
+
+    __slots__ = ("size", "count", "total", "max", "_values")
+
+    def __init__(self, size=DEFAULT_HISTOGRAM_SIZE):
+        """
+        :param size: Number of most recent samples the percentiles are computed over.
+        """
+        self.size = size
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._values = array.array('q', bytes(8 * size))
+
+    def record(self, value_ns):
+        self._values[self.count % self.size] = value_ns
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def recent(self, n):
+        """Returns the last n recorded samples (at most size of them), oldest first."""
+        n = min(n, self.count, self.size)
+        return [self._values[i % self.size] for i in range(self.count - n, self.count)]
+
+    def summary(self):
+        """Returns count, mean/max (lifetime) and p50/p95/p99 (recent window) in milliseconds."""
+        count = self.count
+        window = sorted(self._values[:min(count, self.size)])
+        if not window:
+            return {"count": 0}
+
+        def percentile(p):
+            return window[min(len(window) - 1, int(p / 100.0 * len(window)))] / 1e6
+
+        return {
+            "count": count,
+            "window": len(window),
+            "mean_ms": self.total / count / 1e6,
+            "max_ms": self.max / 1e6,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+        }
+
+
+class Metrics:
+    """Registry of named histograms and counters with optional HTTP/file exporters."""
+
+    def __init__(self, histogram_size=DEFAULT_HISTOGRAM_SIZE):
+        """
+        :param histogram_size: Ring buffer size of each histogram.
+        """
+        self.histogram_size = histogram_size
+        self.started_at = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._create_lock = threading.Lock()
+        self._http_server = None
+        self._stop_writer = threading.Event()
+        self._writer = None
+
+    def histogram(self, name):
+        """Returns the histogram called name, creating it on first use."""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._create_lock:
+                histogram = self._histograms.setdefault(name, Histogram(self.histogram_size))
+        return histogram
+
+    def observe(self, name, start_ns):
+        """Records the time elapsed since start_ns (a value from now()) into histogram name."""
+        self.histogram(name).record(now() - start_ns)
+
+    def count(self, name, n=1):
+        """Adds n to counter name."""
+        self._counters[name] = self._counters.get(name, 0) + n
+
+    def span(self, name):
+        """Context manager recording the duration of its block into histogram name."""
+        return _Span(self.histogram(name))
+
+    def changes(self, seen):
+        """
+        Returns what was recorded since the previous call with the same seen dict (updated in place),
+        e.g. to forward a worker process's metrics to the process that exports them.
+
+        :param seen: Dict kept by the caller between calls; start with {}.
+        :return: {"histograms": {name: [ns, ...]}, "counters": {name: increment}}, only changed entries.
+        """
+        histograms = {}
+        for name, histogram in list(self._histograms.items()):
+            key = ("histogram", name)
+            count = histogram.count
+            if count != seen.get(key, 0):
+                histograms[name] = histogram.recent(count - seen.get(key, 0))
+                seen[key] = count
+        counters = {}
+        for name, value in list(self._counters.items()):
+            key = ("counter", name)
+            if value != seen.get(key, 0):
+                counters[name] = value - seen.get(key, 0)
+                seen[key] = value
+        return {"histograms": histograms, "counters": counters}
+
+    def merge(self, changes, prefix=""):
+        """Records changes() from another registry under prefix + name."""
+        for name, values in changes["histograms"].items():
+            histogram = self.histogram(prefix + name)
+            for value in values:
+                histogram.record(value)
+        for name, n in changes["counters"].items():
+            self.count(prefix + name, n)
+
+    def snapshot(self):
+        """Returns all metrics as a JSON-serialisable dict."""
+        return {
+            "time": time.time(),
+            "uptime_s": time.time() - self.started_at,
+            "counters": dict(self._counters),
+            "histograms": {name: h.summary() for name, h in list(self._histograms.items())},
+        }
+
+    def write_snapshot(self, path):
+        """Writes a snapshot to path atomically (readers never see a partial file)."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_snapshot_writer(self, path, interval=10.0):
+        """
+        Starts a daemon thread writing a snapshot to path every interval seconds.
+
+        :param path: Snapshot file path (e.g. on tmpfs to spare the SD card).
+        :param interval: Seconds between snapshots.
+        """
+        def run():
+            while not self._stop_writer.wait(interval):
+                try:
+                    self.write_snapshot(path)
+                except OSError as e:
+                    print(f"Error writing metrics snapshot ({path}): {e}")
+
+        self._writer = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+        self._writer.start()
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """
+        Serves snapshots as JSON on http://host:port/metrics from a daemon thread.
+
+        :param port: TCP port to listen on.
+        :param host: Interface to bind; the default keeps the endpoint local to the BBB.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(registry.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep request logs off the console
+
+        self._http_server = ThreadingHTTPServer((host, port), Handler)
+        self._http_server.daemon_threads = True
+        threading.Thread(target=self._http_server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def stop(self, snapshot_path=None):
+        """Stops the exporters; writes a final snapshot if snapshot_path is given."""
+        self._stop_writer.set()
+        if self._writer is not None:
+            self._writer.join()
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+        if snapshot_path:
+            self.write_snapshot(snapshot_path)
+
+
+class _Span:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.record(now() - self._start)
+        return False
+
+
+# Process-wide registry used by the services and shared modules
+METRICS = Metrics()
@@ -0,0 +1,89 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# Tek dosyalık, sürümlü model paketi (bundle).
+# Scaler parametreleri, düzleştirilmiş orman dizileri ve sınıf adları tek bir uint8 .npy
+# dosyasında tutulur; böylece np.load(mmap_mode='r') ile pickle kullanmadan, kopyalamadan açılır.
+#
+# Dosya içeriği (uint8 dizisi):
+#   [8 bayt: başlık uzunluğu (little-endian uint64)][JSON başlık][dolgu][dizi 1][dolgu][dizi 2]...
+# Başlıkta sihirli değer, sürüm, skaler alanlar ve her dizinin dtype/shape/offset bilgisi bulunur.
+# Diziler 64 bayt hizalı yazılır; .npy veri bölümü de 64 bayt hizalı olduğu için görünümler hizalıdır.
+
+BUNDLE_MAGIC = "swipe-bundle"
+BUNDLE_VERSION = 1
+_ALIGN = 64
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def save_bundle(path, arrays):
+    # arrays: flat_forest.export_forest çıktısı; 0 boyutlu diziler başlığa skaler olarak yazılır
+    scalars = {}
+    blobs = []
+    for name, value in arrays.items():
+        value = np.asarray(value)
+        if value.dtype.hasobject:
+            raise TypeError(f"'{name}' dizisi object dtype; pakete yalnızca sayısal/metin diziler yazılabilir.")
+        if value.ndim == 0:
+            scalars[name] = value.item()
+        else:
+            blobs.append((name, np.ascontiguousarray(value)))
+
+    entries = {}
+    offset = 0
+    for name, value in blobs:
+        entries[name] = {"dtype": value.dtype.str, "shape": list(value.shape), "offset": offset}
+        offset = _align(offset + value.nbytes)
+
+    header = json.dumps({
+        "magic": BUNDLE_MAGIC,
+        "version": BUNDLE_VERSION,
+        "scalars": scalars,
+        "arrays": entries,
+    }).encode("utf-8")
+    data_start = _align(8 + len(header))
+
+    buffer = np.zeros(data_start + offset, dtype=np.uint8)
+    buffer[:8] = np.frombuffer(struct.pack("<Q", len(header)), dtype=np.uint8)
+    buffer[8:8 + len(header)] = np.frombuffer(header, dtype=np.uint8)
+    for name, value in blobs:
+        start = data_start + entries[name]["offset"]
+        buffer[start:start + value.nbytes] = value.reshape(-1).view(np.uint8)
+
+    # Yarım yazılmış dosya okunmasın diye önce geçici dosyaya yazılıp atomik olarak yer değiştirilir
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, buffer, allow_pickle=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_bundle(path, mmap=True):
+    # Dizileri dosya üzerine eşlenmiş (salt okunur) görünümler olarak döner
+    raw = np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    if raw.dtype != np.uint8 or raw.ndim != 1:
+        raise ValueError(f"'{path}' bir model paketi değil.")
+
+    header_len = struct.unpack("<Q", bytes(raw[:8]))[0]
+    header = json.loads(bytes(raw[8:8 + header_len]).decode("utf-8"))
+    if header.get("magic") != BUNDLE_MAGIC:
+        raise ValueError(f"'{path}' bir model paketi değil.")
+    if header.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Desteklenmeyen model paketi sürümü: {header.get('version')}")
+
+    data_start = _align(8 + header_len)
+    arrays = {name: np.asarray(value) for name, value in header["scalars"].items()}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        start = data_start + entry["offset"]
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        arrays[name] = raw[start:start + nbytes].view(dtype).reshape(shape)
+    return arrays
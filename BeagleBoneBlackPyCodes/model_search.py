@@ -0,0 +1,260 @@
+import os
+
+# Her işçi süreç tek çekirdek kullanır; paralellik yalnızca süreç havuzundan gelir
+# (numpy/BLAS ve XGBoost import edilmeden önce ayarlanmalı)
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+import argparse
+import hashlib
+import json
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from compiled_pipeline import CompiledPipeline
+from session_features import DURATION_COLUMNS, RAW_COLUMNS
+
+# --- Çapraz doğrulamalı model arama ---
+# BBB_egitme.py satır bazında train_test_split yapar; aynı user_trial'ın satırları hem eğitim hem
+# test setine düşer ve doğruluk iyimser çıkar. Burada katlar user_trial'a göre gruplanır
+# (StratifiedGroupKFold), her aday model ailesi/boyutu tüm katlarda bir süreç havuzunda eğitilir ve
+# adaylar doğruluk, BBB yolundaki (CompiledPipeline) swipe başına tahmin süresi ve model boyutuna
+# göre Pareto sıralamasıyla raporlanır.
+#
+# Kat bölmeleri ve ölçeklenmiş matrisler bir kez hesaplanıp .npy olarak önbelleğe yazılır;
+# işçiler bunları mmap ile açar (aday başına yeniden ölçekleme ve pickle ile kopyalama yok).
+# Yalnızca CPU kullanılır; işçi sayısı --workers ile sınırlanır.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(SCRIPT_DIR, "..", "Dataset", "dataset.csv")
+FEATURE_COLUMNS = RAW_COLUMNS + DURATION_COLUMNS
+CACHE_VERSION = 1
+
+
+def candidate_grid(quick=False):
+    # (ad, aile, parametreler); XGBoost kurulu değilse o aile atlanır
+    grid = []
+    rf_trees = [25, 100] if quick else [25, 50, 100, 200]
+    rf_depths = [None, 10] if quick else [None, 16, 10, 6]
+    for n_estimators in rf_trees:
+        for max_depth in rf_depths:
+            grid.append((f"rf_t{n_estimators}_d{max_depth or 'max'}", "rf",
+                         {"n_estimators": n_estimators, "max_depth": max_depth}))
+    try:
+        import xgboost  # noqa: F401
+    except ImportError:
+        print("xgboost kurulu değil; XGBoost adayları atlanıyor.")
+    else:
+        for n_estimators in ([50] if quick else [50, 150]):
+            for max_depth in ([4] if quick else [3, 6]):
+                grid.append((f"xgb_t{n_estimators}_d{max_depth}", "xgboost",
+                             {"n_estimators": n_estimators, "max_depth": max_depth}))
+    for c in ([1.0] if quick else [0.1, 1.0, 10.0]):
+        grid.append((f"logreg_c{c:g}", "logreg", {"C": c}))
+    return grid
+
+
+def build_model(family, params):
+    if family == "rf":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=42, n_jobs=1, **params)
+    if family == "xgboost":
+        from xgboost import XGBClassifier
+        return XGBClassifier(random_state=42, n_jobs=1, tree_method="hist", device="cpu", **params)
+    if family == "logreg":
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(max_iter=2000, **params)
+    raise ValueError(f"Bilinmeyen model ailesi: {family}")
+
+
+# --- Kat önbelleği ---
+
+def load_dataset(path):
+    import pandas as pd
+    df = pd.read_csv(path, header=None, names=["user_trial", "timestamp"] + FEATURE_COLUMNS)
+    users = df["user_trial"].str.split(".").str[0]
+    class_names, y = np.unique(users.to_numpy(), return_inverse=True)
+    groups = df["user_trial"].factorize()[0]
+    return df[FEATURE_COLUMNS].to_numpy(dtype=np.float64), y.astype(np.int64), groups, class_names
+
+
+def prepare_cache(dataset, cache_dir, n_splits, seed):
+    # Önbellek veri seti içeriği + kat ayarlarıyla anahtarlanır; değişirse yeniden oluşturulur
+    with open(dataset, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    key = {"version": CACHE_VERSION, "dataset": digest, "n_splits": n_splits, "seed": seed}
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["key"] == key:
+            print(f"Kat önbelleği kullanılıyor: {cache_dir}")
+            return meta
+
+    from sklearn.model_selection import StratifiedGroupKFold
+
+    os.makedirs(cache_dir, exist_ok=True)
+    X, y, groups, class_names = load_dataset(dataset)
+    folds = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    for i, (train, test) in enumerate(folds.split(X, y, groups)):
+        # sklearn StandardScaler ile aynı aritmetik: (x - mean) / scale, scale=0 -> 1
+        mean = X[train].mean(axis=0)
+        scale = X[train].std(axis=0)
+        scale[scale == 0.0] = 1.0
+        arrays = {
+            "X_train": (X[train] - mean) / scale, "y_train": y[train],
+            "X_test": (X[test] - mean) / scale, "y_test": y[test], "groups_test": groups[test],
+            "raw_test": X[test], "mean": mean, "scale": scale,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(cache_dir, f"fold{i}_{name}.npy"), array)
+    meta = {"key": key, "n_rows": len(X), "n_sessions": int(groups.max()) + 1,
+            "class_names": class_names.tolist()}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    print(f"Kat önbelleği oluşturuldu: {cache_dir} ({n_splits} kat, {len(X)} satır, {meta['n_sessions']} oturum)")
+    return meta
+
+
+def load_fold(cache_dir, i, names):
+    return {name: np.load(os.path.join(cache_dir, f"fold{i}_{name}.npy"), mmap_mode="r") for name in names}
+
+
+# --- İşçi süreç ---
+
+def session_accuracy(y_true, y_pred, groups):
+    # Oturum başına çoğunluk oyu (BBBPredict SESSION_MODE kararı)
+    n_classes = int(max(y_true.max(), y_pred.max())) + 1
+    sessions, index = np.unique(groups, return_inverse=True)
+    votes = np.zeros((len(sessions), n_classes), dtype=np.int64)
+    np.add.at(votes, (index, y_pred), 1)
+    truth = np.zeros(len(sessions), dtype=np.int64)
+    truth[index] = y_true
+    return float(np.mean(votes.argmax(axis=1) == truth))
+
+
+def evaluate_candidate(cache_dir, n_splits, name, family, params):
+    row_acc, sess_acc, fit_seconds = [], [], []
+    first_model = None
+    for i in range(n_splits):
+        fold = load_fold(cache_dir, i, ["X_train", "y_train", "X_test", "y_test", "groups_test"])
+        model = build_model(family, params)
+        start = time.perf_counter()
+        model.fit(fold["X_train"], fold["y_train"])
+        fit_seconds.append(time.perf_counter() - start)
+        pred = np.asarray(model.predict(fold["X_test"])).astype(np.int64).reshape(-1)
+        row_acc.append(float(np.mean(pred == fold["y_test"])))
+        sess_acc.append(session_accuracy(np.asarray(fold["y_test"]), pred, np.asarray(fold["groups_test"])))
+        if first_model is None:
+            first_model = model
+    # İlk katın modeli gecikme ölçümü için ana sürece gönderilir
+    return {
+        "name": name, "family": family, "params": params,
+        "row_accuracy": float(np.mean(row_acc)), "row_accuracy_std": float(np.std(row_acc)),
+        "session_accuracy": float(np.mean(sess_acc)),
+        "fit_seconds": float(np.mean(fit_seconds)),
+        "model": pickle.dumps(first_model, protocol=pickle.HIGHEST_PROTOCOL),
+    }
+
+
+# --- Gecikme, boyut ve Pareto sıralaması ---
+
+def measure_latency(model, cache_dir, class_names, repeats):
+    # BBBPredict'teki yol: CompiledPipeline ile tek swipe satırı (N=1) tahmini; medyan süre (ms)
+    fold = load_fold(cache_dir, 0, ["raw_test", "mean", "scale"])
+    pipeline = CompiledPipeline(fold["mean"], fold["scale"], model, class_names)
+    rows = np.ascontiguousarray(fold["raw_test"][:repeats])
+    for row in rows[:10]:
+        pipeline.predict_encoded(row)
+    timings = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        pipeline.predict_encoded(row)
+        timings[i] = time.perf_counter() - start
+    return float(np.median(timings) * 1000.0), float(np.percentile(timings, 95) * 1000.0)
+
+
+def pareto_ranks(results, accuracy_key):
+    # Katman 0: hiçbir aday hem daha doğru hem daha hızlı hem daha küçük değil; sonraki katmanlar
+    # önceki katmanlar çıkarıldıktan sonra aynı şekilde bulunur
+    points = np.array([(-r[accuracy_key], r["latency_ms"], r["size_bytes"]) for r in results])
+    ranks = np.full(len(results), -1)
+    remaining = np.arange(len(results))
+    rank = 0
+    while len(remaining):
+        p = points[remaining]
+        dominated = ((p[None, :, :] <= p[:, None, :]).all(axis=2) & (p[None, :, :] < p[:, None, :]).any(axis=2)).any(axis=1)
+        ranks[remaining[~dominated]] = rank
+        remaining = remaining[dominated]
+        rank += 1
+    return ranks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="user_trial gruplu K-kat çapraz doğrulama ile model arama.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Veri seti CSV dosyası (başlıksız)")
+    parser.add_argument("--folds", type=int, default=5, help="Kat sayısı")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Paralel işçi süreç sayısı (üst sınır)")
+    parser.add_argument("--cache-dir", default=".model_search_cache",
+                        help="Kat bölmeleri ve ölçeklenmiş matrisler için önbellek klasörü")
+    parser.add_argument("--quick", action="store_true", help="Küçük aday ızgarası")
+    parser.add_argument("--latency-repeats", type=int, default=200, help="Gecikme ölçümündeki tek satırlık tahmin sayısı")
+    parser.add_argument("--rank-by", choices=["session_accuracy", "row_accuracy"], default="session_accuracy",
+                        help="Pareto sıralamasında kullanılacak doğruluk")
+    parser.add_argument("--output", default="model_search_results.json", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    meta = prepare_cache(args.dataset, args.cache_dir, args.folds, args.seed)
+    class_names = np.asarray(meta["class_names"])
+    grid = candidate_grid(args.quick)
+    workers = max(1, min(args.workers, len(grid)))
+    print(f"{len(grid)} aday, {args.folds} kat, {workers} işçi süreç")
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate_candidate, args.cache_dir, args.folds, name, family, params)
+                   for name, family, params in grid]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Aday değerlendirilirken hata: {e}")
+                continue
+            print(f"  {result['name']:<18} oturum doğruluğu {result['session_accuracy']:.4f}, "
+                  f"satır doğruluğu {result['row_accuracy']:.4f}")
+            results.append(result)
+    print(f"Çapraz doğrulama {time.perf_counter() - start:.1f} s sürdü.")
+    if not results:
+        return
+
+    # Gecikme işçiler bittikten sonra tek tek ölçülür; paralel eğitim ölçümü bozmaz
+    for result in results:
+        model_bytes = result.pop("model")
+        result["size_bytes"] = len(model_bytes)
+        result["latency_ms"], result["latency_p95_ms"] = measure_latency(
+            pickle.loads(model_bytes), args.cache_dir, class_names, args.latency_repeats)
+
+    for result, rank in zip(results, pareto_ranks(results, args.rank_by)):
+        result["pareto_rank"] = int(rank)
+    results.sort(key=lambda r: (r["pareto_rank"], -r[args.rank_by], r["latency_ms"]))
+
+    print(f"\n{'aday':<18} {'pareto':>6} {'oturum':>7} {'satır':>7} {'ms/swipe':>9} {'p95 ms':>7} {'boyut KB':>9}")
+    for r in results:
+        print(f"{r['name']:<18} {r['pareto_rank']:>6} {r['session_accuracy']:7.4f} {r['row_accuracy']:7.4f} "
+              f"{r['latency_ms']:9.3f} {r['latency_p95_ms']:7.3f} {r['size_bytes'] / 1024:9.1f}")
+    best = [r["name"] for r in results if r["pareto_rank"] == 0]
+    print(f"\nPareto-en iyi adaylar: {', '.join(best)}")
+
+    with open(args.output, "w") as f:
+        json.dump({"folds": args.folds, "seed": args.seed, "rank_by": args.rank_by, "results": results}, f, indent=2)
+    print(f"Sonuçlar '{args.output}' dosyasına yazıldı.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+import bisect
+import os
+import queue
+import threading
+import time
+
+from metrics import METRICS, now
+
+# --- Non-blocking MQTT publish pipeline ---
+# The serial thread only enqueues received lines into a bounded queue. A publisher thread coalesces
+# each swipe session (CMD:START_SWIPE ... CMD:DATA_SENT) into one newline-separated payload and
+# publishes it. While the broker is connected and acking, payloads are published straight from memory
+# and kept there until their PUBACK; nothing is written to the SD card. Only while the broker is
+# unreachable, too many QoS1 messages are still unacked, or on shutdown are payloads written to an
+# on-disk spool, which is drained in order at a limited rate after reconnecting.
+#
+# The client only needs publish(topic, payload, qos) returning an object with .rc and .mid, and
+# is_connected(); a paho-mqtt Client works, and so does a client connected to a local stand-in
+# broker (e.g. mosquitto on localhost). bench_mqtt_pipeline.py drives the pipeline with an
+# in-process stand-in that behaves like paho.
+#
+# Like paho, the client must keep unacked QoS1 messages (and messages published while it was
+# disconnected) and resend them with the same mid after reconnecting. Their mids therefore stay
+# tracked across a disconnect and their PUBACKs complete them; nothing is spooled or drained twice.
+
+MQTT_ERR_SUCCESS = 0  # Same values as paho.mqtt.client.MQTTErrorCode
+MQTT_ERR_NO_CONN = 4  # Not connected; paho still queued a QoS>0 message and sends it on reconnect
+EARLY_ACK_TTL = 10.0  # Seconds an ack for a not yet registered mid is kept
+
+SESSION_START = "CMD:START_SWIPE"
+SESSION_END = "CMD:DATA_SENT"
+
+
+class MqttPublishPipeline:
+    """
+    Producer/consumer stage between the serial reader and the MQTT client.
+
+    Sessions are closed by CMD:DATA_SENT, by a change of the user_trial column (the data-collection
+    firmware sends no CMD: lines), by session_timeout seconds without new lines, or by reaching
+    max_session_rows. With several devices (submit(line, device)), each device has its own open
+    session, so interleaved lines from different panels are never mixed into one payload.
+    """
+
+    def __init__(self, client, topic, spool_dir, qos=1, queue_size=1000, max_inflight=20,
+                 drain_rate=5.0, session_timeout=2.0, max_session_rows=500, max_spool_files=10000,
+                 verbose=True):
+        """
+        :param client: Connected MQTT client (paho-mqtt Client or compatible).
+        :param topic: Topic to publish session payloads to.
+        :param spool_dir: Directory for payloads that could not be published yet.
+        :param qos: MQTT QoS level for publishes.
+        :param queue_size: Capacity of the serial -> publisher queue; lines beyond it are dropped.
+        :param max_inflight: Unacked publishes allowed before new payloads go to the spool.
+        :param drain_rate: Spooled payloads published per second after reconnecting.
+        :param session_timeout: Seconds without a new line after which an open session is published.
+        :param max_session_rows: Rows after which a session is published even without an end marker.
+        :param max_spool_files: Oldest spooled payloads are deleted beyond this count.
+        :param verbose: Print a line for every published session.
+        """
+        self.client = client
+        self.topic = topic
+        self.qos = qos
+        self.spool_dir = spool_dir
+        self.max_inflight = max_inflight
+        self.drain_interval = 1.0 / drain_rate
+        self.session_timeout = session_timeout
+        self.max_session_rows = max_session_rows
+        self.max_spool_files = max_spool_files
+        self.verbose = verbose
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sessions = {}            # device -> _OpenSession
+        self._inflight = {}            # mid -> _Unacked payload
+        self._early_acks = {}          # mid -> time of an ack that arrived before publish() returned the mid
+        self._inflight_lock = threading.Lock()
+        # Spooled payloads not waiting for an ack, oldest first; the directory is listed only here
+        self._spool_pending = [os.path.join(spool_dir, name) for name in self._spool_files()]
+        self._spool_seq = 0
+        self._next_drain_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Counters (read with stats())
+        self.enqueued = 0
+        self.dropped_queue_full = 0
+        self.dropped_spool_full = 0
+        self.sessions_published = 0
+        self.sessions_spooled = 0
+        self.spool_drained = 0
+        self.publish_failures = 0
+        self.acked = 0
+        self.disconnects = 0
+
+    # --- Producer side (serial thread) ---
+
+    def submit(self, line, device=None):
+        """
+        Enqueues one received line without blocking.
+
+        :param line: Received line.
+        :param device: Id of the device the line came from (None for a single-device gateway).
+        :return: False if the queue was full and the line was dropped.
+        """
+        try:
+            self._queue.put_nowait((device, line))
+        except queue.Full:
+            self.dropped_queue_full += 1
+            METRICS.count("mqtt_dropped_queue_full")
+            return False
+        self.enqueued += 1
+        return True
+
+    def connection_lost(self):
+        """
+        Call from the client's on_disconnect callback. Unacked publishes stay tracked by mid: the
+        client resends them after reconnecting and their PUBACKs complete them. Payloads still unacked
+        at shutdown are spooled (see stop()).
+        """
+        self.disconnects += 1
+        METRICS.count("mqtt_disconnects")
+
+    def acknowledge(self, mid):
+        """Call from the client's on_publish callback; marks a QoS1 publish as acked."""
+        if self.qos == 0:
+            return
+        with self._inflight_lock:
+            entry = self._inflight.pop(mid, None)
+            if entry is None:
+                # paho's network thread can deliver the PUBACK before publish() has returned the mid
+                self._early_acks[mid] = time.monotonic()
+                return
+        self._acked(entry)
+
+    def _acked(self, entry):
+        self.acked += 1
+        if entry.path is None:
+            return
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        """Returns queue depth, spool depth and the pipeline counters."""
+        with self._inflight_lock:
+            inflight = len(self._inflight)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "session_rows": sum(len(session.lines) for session in list(self._sessions.values())),
+            "inflight": inflight,
+            "spool_depth": len(self._spool_pending),
+            "enqueued": self.enqueued,
+            "dropped_queue_full": self.dropped_queue_full,
+            "dropped_spool_full": self.dropped_spool_full,
+            "sessions_published": self.sessions_published,
+            "sessions_spooled": self.sessions_spooled,
+            "spool_drained": self.spool_drained,
+            "publish_failures": self.publish_failures,
+            "acked": self.acked,
+            "disconnects": self.disconnects,
+        }
+
+    # --- Consumer side (publisher thread) ---
+
+    def start(self):
+        """Starts the publisher thread."""
+        self._thread = threading.Thread(target=self._run, name="mqtt-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Publishes or spools everything still queued, spools payloads that are still unacked, then
+        stops the publisher thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._wait_timeout())
+            except queue.Empty:
+                item = None
+            if item is not None:
+                self._handle_line(*item)
+            elif self._stop.is_set():
+                break
+            now = time.monotonic()
+            for device, session in list(self._sessions.items()):
+                if now - session.last_line_at >= self.session_timeout:
+                    self._end_session(device)
+            if now >= self._next_drain_at and self._can_publish():
+                self._drain_one()
+        # Shutting down: whatever is left goes to the spool or the broker
+        for device in list(self._sessions):
+            self._end_session(device)
+        # Payloads still waiting for an ack only exist in memory; keep them for the next start
+        # (a late ack still removes the spool file; otherwise the broker may get them twice)
+        with self._inflight_lock:
+            unacked = [entry for entry in self._inflight.values() if entry.path is None]
+        for entry in unacked:
+            entry.path = self._write_spool(entry.payload, entry.created_ns)
+
+    def _wait_timeout(self):
+        if self._stop.is_set():
+            return 0.0
+        return min(self.session_timeout / 2.0, self.drain_interval)
+
+    def _handle_line(self, device, line):
+        if line in (SESSION_START, SESSION_END):
+            self._end_session(device)
+            return
+        if line.startswith("CMD:"):
+            return
+        trial = line.split(',', 1)[0]
+        session = self._sessions.get(device)
+        if session is not None and trial != session.trial and not line.startswith("DATA:"):
+            self._end_session(device)
+            session = None
+        if session is None:
+            session = self._sessions[device] = _OpenSession()
+        session.trial = trial
+        session.last_line_at = time.monotonic()
+        session.lines.append(line)
+        if len(session.lines) >= self.max_session_rows:
+            self._end_session(device)
+
+    def _end_session(self, device):
+        session = self._sessions.pop(device, None)
+        if session is None:
+            return
+        entry = _Unacked("\n".join(session.lines))
+        # Healthy broker: published from memory; the payload stays in memory until its PUBACK and is
+        # spooled only if the connection drops first (connection_lost)
+        if self._can_publish() and not self._spool_pending and self._publish(entry):
+            self.sessions_published += 1
+            if self.verbose:
+                print(f"Successfully published session ({entry.payload.count(chr(10)) + 1} rows) to MQTT.")
+        else:
+            # Broker unreachable/congested or older payloads still waiting: drained later in order
+            self._spool(entry)
+            self.sessions_spooled += 1
+
+    def _can_publish(self):
+        with self._inflight_lock:
+            inflight = len(self._inflight)
+        return self.client.is_connected() and inflight < self.max_inflight
+
+    def _publish(self, entry):
+        start = now()
+        try:
+            result = self.client.publish(self.topic, entry.payload, qos=self.qos)
+        except Exception as e:
+            print(f"Failed to publish message to MQTT: {e}")
+            self.publish_failures += 1
+            METRICS.count("mqtt_publish_failures")
+            return False
+        METRICS.observe("mqtt_publish", start)
+        # MQTT_ERR_NO_CONN: the connection dropped, but a QoS1 message is queued and sent on reconnect
+        queued = result.rc == MQTT_ERR_NO_CONN and self.qos > 0
+        if result.rc != MQTT_ERR_SUCCESS and not queued:
+            print(f"Failed to publish message to MQTT, error code: {result.rc}")
+            self.publish_failures += 1
+            METRICS.count("mqtt_publish_failures")
+            return False
+        if self.qos == 0:
+            if entry.path is not None:
+                os.remove(entry.path)
+            return True
+        # Registered after publish() returns the mid; an ack that already arrived is reconciled here.
+        # (The lock is not held across publish(): paho calls on_publish while holding its own
+        # message mutex, which publish() also takes.)
+        with self._inflight_lock:
+            if self._early_acks:
+                # Acks for mids that were never registered (e.g. publish() raised) must not later
+                # complete an unrelated payload that reuses the mid
+                expired = time.monotonic() - EARLY_ACK_TTL
+                for mid in [mid for mid, at in self._early_acks.items() if at < expired]:
+                    del self._early_acks[mid]
+            early = self._early_acks.pop(result.mid, None) is not None
+            if not early:
+                self._inflight[result.mid] = entry
+        if early:
+            self._acked(entry)
+        return True
+
+    # --- On-disk spool ---
+
+    def _spool_files(self):
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".msg"))
+
+    def _spool(self, entry):
+        # Queues a payload in the spool to be drained in order (publisher thread only)
+        while len(self._spool_pending) >= self.max_spool_files:
+            os.remove(self._spool_pending.pop(0))
+            self.dropped_spool_full += 1
+        entry.path = self._write_spool(entry.payload, entry.created_ns)
+        bisect.insort(self._spool_pending, entry.path)
+
+    def _write_spool(self, payload, created_ns):
+        # Files are named by the payload's creation time, so they sort in the order sessions ended
+        self._spool_seq += 1
+        path = os.path.join(self.spool_dir, f"{created_ns:020d}-{self._spool_seq:06d}.msg")
+        with open(path + ".tmp", "w") as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def _drain_one(self):
+        if not self._spool_pending:
+            return
+        path = self._spool_pending.pop(0)
+        with open(path) as f:
+            entry = _Unacked(f.read(), path)
+        if self._publish(entry):
+            self.spool_drained += 1
+        else:
+            self._spool_pending.insert(0, path)
+        self._next_drain_at = time.monotonic() + self.drain_interval
+
+
+class _Unacked:
+    # A published (or to be published) payload; path is its spool file, None while only in memory
+    __slots__ = ("payload", "path", "created_ns")
+
+    def __init__(self, payload, path=None):
+        self.payload = payload
+        self.path = path
+        self.created_ns = time.time_ns()
+
+
+class _OpenSession:
+    __slots__ = ("lines", "trial", "last_line_at")
+
+    def __init__(self):
+        self.lines = []
+        self.trial = None
+        self.last_line_at = time.monotonic()
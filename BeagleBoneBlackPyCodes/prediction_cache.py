@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import METRICS, now
+
+# Tahmin sonuç önbelleği (LRU + TTL).
+# Parmak pedlerin üzerinde dururken ESP32 neredeyse aynı örnekleri art arda gönderir; veri setinde
+# ardışık satırlar çoğu zaman yalnızca artan durationT* sayacında farklıdır. Önbellek, ham özellik
+# vektörünü buckets genişliğinde kovalara böler (floor(x / genişlik)) ve kova vektörünün baytlarını
+# anahtar olarak kullanır; aynı kovaya düşen satırlar için model yeniden çalıştırılmaz.
+#   buckets = 1         tamsayı girdilerde kayıpsız: yalnızca birebir aynı satırlar önbellekten gelir
+#   buckets = [4]*9 + [100]*9
+#                       ham değerler 4'lük, süre sayaçları 100'lük kovalarda: daha çok isabet, ama kova
+#                       içindeki farklı değerler aynı tahmini alır (yaklaşık; bkz. bench_prediction_cache.py)
+# Veri setinde ardışık satırların ham değerleri de ±1-2 oynadığı için kayıpsız ayarda isabet çok
+# düşüktür; kaba kovalar ise satır kararlarını belirgin biçimde değiştirir. Bu yüzden BBBPredict'te
+# varsayılan olarak kapalıdır.
+# Kayıt sayısı max_entries'i aşınca en uzun süredir kullanılmayan, ttl saniyeden eski olan kayıtlar
+# ise erişildiğinde silinir. Her model örneği kendi önbelleğini taşır: BBBPredict model dosyası
+# değişip yeni model yüklendiğinde yeni ve boş bir önbellek kurulur, eski model ile başlamış
+# oturumlar eski önbelleği kullanarak biter.
+#
+# CompiledPipeline / QuantizedPipeline ile aynı arayüzü sunar (predict / predict_encoded /
+# predict_proba / classes). Ölçümler: prediction_cache_hits, _misses, _evictions, _expired sayaçları.
+
+
+class CachedPipeline:
+    def __init__(self, pipeline, max_entries=4096, ttl=None, buckets=1):
+        # pipeline: sarılan tahmin hattı; ttl: saniye (None ise süresiz); buckets: sayı veya özellik başına genişlikler
+        self.pipeline = pipeline
+        self.classes = pipeline.classes
+        self.n_features = pipeline.n_features
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.buckets = np.broadcast_to(np.asarray(buckets, dtype=np.float64), (self.n_features,)).copy()
+        if np.any(self.buckets <= 0):
+            raise ValueError("Kova genişlikleri pozitif olmalı")
+        # anahtar -> [sayısal etiket, olasılık satırı veya None, son geçerlilik anı]
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def keys(self, features):
+        # Kova vektörlerinin baytları; tam sayı genişlikte tamsayı girdiler birebir korunur
+        buckets = np.floor(features / self.buckets).astype(np.int64)
+        return [row.tobytes() for row in buckets]
+
+    def _lookup(self, keys, need_proba):
+        # (isabet eden kayıtlar, kaçan satırların indeksleri); aynı anahtar iki kez hesaplanmaz
+        current = time.monotonic()
+        found = [None] * len(keys)
+        missing = {}
+        for i, key in enumerate(keys):
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[2] < current:
+                del self._entries[key]
+                METRICS.count("prediction_cache_expired")
+                entry = None
+            if entry is None or (need_proba and entry[1] is None):
+                missing.setdefault(key, []).append(i)
+                continue
+            self._entries.move_to_end(key)
+            found[i] = entry
+        hits = len(keys) - sum(map(len, missing.values()))
+        self.hits += hits
+        self.misses += len(keys) - hits
+        METRICS.count("prediction_cache_hits", hits)
+        METRICS.count("prediction_cache_misses", len(keys) - hits)
+        return found, missing
+
+    def _store(self, key, label, proba):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = [label, proba, expires_at]
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            METRICS.count("prediction_cache_evictions")
+
+    def _prepare(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != self.n_features:
+            raise ValueError(f"Beklenen özellik sayısı {self.n_features}, alınan: {features.shape[1]}")
+        return features
+
+    def predict_encoded(self, features):
+        features = self._prepare(features)
+        start = now()
+        found, missing = self._lookup(self.keys(features), need_proba=False)
+        METRICS.observe("prediction_cache", start)
+        out = np.empty(len(features), dtype=np.intp)
+        for i, entry in enumerate(found):
+            if entry is not None:
+                out[i] = entry[0]
+        if missing:
+            # Kaçan anahtarların ilk satırları tek toplu çağrıda tahmin edilir
+            first_rows = [rows[0] for rows in missing.values()]
+            labels = self.pipeline.predict_encoded(features[first_rows])
+            for (key, rows), label in zip(missing.items(), labels.tolist()):
+                out[rows] = label
+                self._store(key, label, None)
+        return out
+
+    def predict_proba(self, features):
+        features = self._prepare(features)
+        start = now()
+        found, missing = self._lookup(self.keys(features), need_proba=True)
+        METRICS.observe("prediction_cache", start)
+        computed = None
+        if missing:
+            first_rows = [rows[0] for rows in missing.values()]
+            computed = self.pipeline.predict_proba(features[first_rows])
+            n_labels = computed.shape[1]
+        else:
+            n_labels = len(found[0][1]) if found else 0
+        out = np.empty((len(features), n_labels), dtype=np.float64)
+        for i, entry in enumerate(found):
+            if entry is not None:
+                out[i] = entry[1]
+        if missing:
+            for (key, rows), proba in zip(missing.items(), computed):
+                out[rows] = proba
+                # Satır oyu olasılıkların argmax'ıdır (BBBPredict._add_to_session ile aynı)
+                self._store(key, int(np.argmax(proba)), proba)
+        return out
+
+    def predict(self, features):
+        encoded = self.predict_encoded(features)
+        if self.classes is None:
+            return encoded
+        return self.classes[encoded]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,249 @@
+import argparse
+
+import numpy as np
+
+from flat_forest import FlatForest, integer_thresholds, load_forest, order_leaves_last
+from metrics import METRICS, now
+
+# Düşük bellekli tahmin için tamsayıya nicemlenmiş (quantized) orman.
+# Düzleştirilmiş ormanın (flat_forest.py) float64 dizileri 100 ağaçlı bir RF'te onlarca MB tutar;
+# BBB'nin 512 MB belleği Bluetooth yığını ve MQTT istemcisiyle paylaşılır. Ham girdiler zaten küçük
+# tamsayılardır (rawT* ~10-110, durationT* sayaçları), bu yüzden:
+#   - Scaler eşiklere katlanır: her bölme ham uzayda "x <= K" olur (K int16, bkz. integer_thresholds).
+#     Tamsayı girdilerde bu, scaler + float32 karşılaştırmasıyla birebir aynı dalı seçer.
+#   - Düğüm düzeni düzleştirilmiş ormanla aynıdır: önce iç düğümler, sonra yapraklar; yaprak
+#     değerleri yalnızca yapraklar için tutulur (yaprak indeksi = düğüm - n_internal).
+#   - RF yaprak olasılıkları uint8'e (1/255 adım), XGBoost yaprak ağırlıkları int16'ya nicemlenir.
+#     Ağaç çıktıları int32'de toplanır; karar tamsayılar üzerinde argmax ile verilir.
+# Olasılıklar (predict_proba) yalnızca en sonda float'a çevrilir. Yaprak nicemlemesi kayıplıdır;
+# float modelle uyum ve doğruluk farkı için bkz. bench_quantized.py.
+#
+# Dizi düzeni:
+#   feature    : uint8, düğümde karşılaştırılan özellik (yapraklarda 0)
+#   threshold  : int16, ham eşik K; yapraklarda 32767 (girdi en fazla 32767'ye kırpılır, hep sola)
+#   left/right : çocukların global indeksleri (düğüm sayısına göre uint16 veya int32); yapraklar kendine döner
+#   value      : (yaprak_sayısı, çıktı) uint8 (RF) veya int16 (XGBoost)
+#   value_scale: nicemleme adımı; gerçek değer = value * value_scale
+#   base       : int32, value_scale biriminde başlangıç skoru (XGBoost base_score)
+#   roots, n_internal, max_depth, kind, model_classes, class_names, model_version
+
+QUANTIZED_FORMAT_VERSION = 1
+INPUT_MIN = -32767
+INPUT_MAX = 32767
+
+
+def quantize_forest(arrays):
+    # flat_forest.export_forest çıktısını (scaler parametreleriyle birlikte) nicemlenmiş dizilere çevirir
+    if "mean" not in arrays:
+        raise ValueError("Nicemleme için scaler parametreleri (mean/scale) gerekli; modeli export_forest ile "
+                         "scaler vererek dışa aktarın.")
+    n_features = len(arrays["mean"])
+    if n_features > 256:
+        raise ValueError(f"Özellik sayısı uint8'e sığmıyor: {n_features}")
+
+    # Sürüm 1 dizileri (düğüm başına value) de aynı düzene getirilir
+    arrays = order_leaves_last(arrays)
+    n_internal = int(arrays["n_internal"])
+    n_nodes = len(arrays["feature"])
+    k = integer_thresholds(arrays)
+    leaf = ~np.isfinite(k)
+    # Aralık dışı eşikler kırpılır: -32768 hiçbir kırpılmış girdiyi sola göndermez, 32767 hepsini gönderir
+    threshold = np.where(leaf, INPUT_MAX, np.clip(np.where(leaf, 0, k), INPUT_MIN - 1, INPUT_MAX)).astype(np.int16)
+
+    index_dtype = np.uint16 if n_nodes <= np.iinfo(np.uint16).max + 1 else np.int32
+    value = np.asarray(arrays["value"], dtype=np.float64)
+    kind = str(arrays["kind"])
+    if kind == "sklearn":
+        # Olasılıklar [0, 1]; toplam en fazla ağaç_sayısı * 255 olur
+        value_scale = 1.0 / 255.0
+        q_value = np.rint(value / value_scale).astype(np.uint8)
+        base = np.zeros(value.shape[1], dtype=np.int32)
+    else:
+        peak = float(np.abs(value).max()) or 1.0
+        value_scale = peak / np.iinfo(np.int16).max
+        q_value = np.rint(value / value_scale).astype(np.int16)
+        base = np.rint(np.asarray(arrays["base"], dtype=np.float64) / value_scale).astype(np.int32)
+
+    out = {
+        "format_version": np.int32(QUANTIZED_FORMAT_VERSION),
+        "feature": np.where(leaf, 0, np.asarray(arrays["feature"])).astype(np.uint8),
+        "threshold": threshold,
+        "left": np.asarray(arrays["left"]).astype(index_dtype),
+        "right": np.asarray(arrays["right"]).astype(index_dtype),
+        "value": q_value,
+        "value_scale": np.float64(value_scale),
+        "base": base,
+        "roots": np.asarray(arrays["roots"]).astype(np.int32),
+        "n_internal": np.int32(n_internal),
+        "max_depth": np.int32(int(arrays["max_depth"])),
+        "n_features": np.int32(n_features),
+        "kind": np.array(kind),
+        "model_classes": np.asarray(arrays["model_classes"]).astype(np.int64),
+    }
+    for key in ("class_names", "model_version"):
+        if key in arrays:
+            out[key] = np.asarray(arrays[key])
+    return out
+
+
+def load_quantized(path):
+    # model_bundle paketi olarak kaydedilmiş nicemlenmiş orman (mmap ile, kopyalamadan)
+    from model_bundle import load_bundle
+
+    arrays = load_bundle(path)
+    if int(arrays.get("format_version", -1)) != QUANTIZED_FORMAT_VERSION or "n_internal" not in arrays:
+        raise ValueError(f"'{path}' desteklenen bir nicemlenmiş orman değil.")
+    return arrays
+
+
+def to_integer_features(features):
+    # Ham girdiler int16'ya yuvarlanır ve kırpılır (yaprak eşiği 32767 hep sola gitsin diye üst sınır 32767)
+    features = np.asarray(features)
+    if features.dtype.kind not in "iu":
+        features = np.rint(features)
+    return np.clip(features, INPUT_MIN, INPUT_MAX).astype(np.int16)
+
+
+class QuantizedForest:
+    # Ham (ölçeklenmemiş) tamsayı girdi için tüm ağaçları aynı anda yürütür; yalnızca tamsayı aritmetiği
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.value_scale = float(arrays["value_scale"])
+        self.base = arrays["base"]
+        self.roots = arrays["roots"].astype(np.intp)
+        self.n_internal = int(arrays["n_internal"])
+        self.max_depth = int(arrays["max_depth"])
+        self.n_features = int(arrays["n_features"])
+        self.kind = str(arrays["kind"])
+        self.model_classes = arrays["model_classes"]
+
+    def leaves(self, x16):
+        # x16: (N, özellik) int16; her satır ve ağaç için ulaşılan yaprağın indeksi (N, ağaç_sayısı)
+        rows = np.arange(len(x16))[:, None]
+        node = np.broadcast_to(self.roots, (len(x16), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            # Tüm yollar yaprağa ulaştıysa kalan adımlar atlanır (yapraklar n_internal'dan sonra gelir)
+            if node.min() >= self.n_internal:
+                break
+            go_left = x16[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def decision(self, x16):
+        # int32 skorlar (value_scale biriminde): RF için ağaçların olasılık toplamı, XGBoost için margin
+        leaf_values = self.value[self.leaves(x16) - self.n_internal]
+        return leaf_values.sum(axis=1, dtype=np.int32) + self.base
+
+    def predict(self, x16):
+        scores = self.decision(x16)
+        if scores.shape[1] == 1:
+            return self.model_classes.take((scores[:, 0] > 0).astype(np.intp))
+        return self.model_classes.take(np.argmax(scores, axis=1))
+
+    def proba(self, x16):
+        # Olasılıklar yalnızca burada float'a çevrilir
+        scores = self.decision(x16) * self.value_scale
+        if self.kind == "sklearn":
+            return scores / len(self.roots)
+        if scores.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack((1.0 - positive, positive))
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+class QuantizedPipeline:
+    # CompiledPipeline ile aynı arayüz (predict / predict_encoded / predict_proba / classes);
+    # scaler eşiklere katlandığı için ölçekleme adımı yoktur
+
+    def __init__(self, arrays, max_batch=64):
+        self.model = QuantizedForest(arrays)
+        self.n_features = self.model.n_features
+        self.max_batch = max_batch
+        class_names = arrays.get("class_names")
+        self.classes = None if class_names is None else np.asarray(class_names).astype(object)
+
+    @classmethod
+    def from_flat_forest(cls, arrays, max_batch=64):
+        return cls(quantize_forest(arrays), max_batch)
+
+    def _integer_chunks(self, features):
+        features = np.asarray(features)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != self.n_features:
+            raise ValueError(f"Beklenen özellik sayısı {self.n_features}, alınan: {features.shape[1]}")
+        for start in range(0, len(features), self.max_batch):
+            stop = min(start + self.max_batch, len(features))
+            span_start = now()
+            x16 = to_integer_features(features[start:stop])
+            METRICS.observe("quantize", span_start)
+            yield start, stop, x16
+
+    def predict_encoded(self, features):
+        # Sayısal etiketleri döner
+        out = np.empty(len(np.atleast_2d(features)), dtype=np.intp)
+        for start, stop, x16 in self._integer_chunks(features):
+            predict_start = now()
+            out[start:stop] = self.model.predict(x16)
+            METRICS.observe("predict", predict_start)
+        return out
+
+    def predict_proba(self, features):
+        # (N, sınıf_sayısı) olasılık matrisi; sütun i, sayısal etiket i'ye karşılık gelir
+        n_labels = len(self.classes) if self.classes is not None else int(np.max(self.model.model_classes)) + 1
+        out = np.zeros((len(np.atleast_2d(features)), n_labels), dtype=np.float64)
+        for start, stop, x16 in self._integer_chunks(features):
+            predict_start = now()
+            out[start:stop, self.model.model_classes] = self.model.proba(x16)
+            METRICS.observe("predict_proba", predict_start)
+        return out
+
+    def predict(self, features):
+        # Kullanıcı adlarını döner; classes yoksa sayısal etiketleri döner
+        encoded = self.predict_encoded(features)
+        if self.classes is None:
+            return encoded
+        return self.classes[encoded]
+
+
+def model_nbytes(arrays):
+    return sum(np.asarray(value).nbytes for value in arrays.values())
+
+
+def main():
+    # Komut satırı: düzleştirilmiş orman (.npz) veya model paketini (.npy) nicemlenmiş pakete çevirir
+    parser = argparse.ArgumentParser(description="Düzleştirilmiş ormanı tamsayıya nicemlenmiş pakete çevirir.")
+    parser.add_argument("model", help="flat_forest .npz dosyası veya model paketi (.npy)")
+    parser.add_argument("output", help="Nicemlenmiş paket (.npy; BBBPredict'te INFERENCE_ENGINE = \"quantized\")")
+    args = parser.parse_args()
+
+    from model_bundle import load_bundle, save_bundle
+
+    arrays = load_forest(args.model) if args.model.endswith(".npz") else load_bundle(args.model)
+    quantized = quantize_forest(arrays)
+    save_bundle(args.output, quantized)
+    print(f"{len(quantized['roots'])} ağaç, {len(quantized['feature'])} düğüm nicemlendi: "
+          f"{model_nbytes(arrays) / 2**20:.1f} MB -> {model_nbytes(quantized) / 2**20:.1f} MB "
+          f"('{args.output}').")
+
+    # Uyum kontrolü: ızgara üzerindeki tamsayı girdilerde float orman ile aynı yapraklar seçilmeli
+    rng = np.random.default_rng(0)
+    probe = rng.integers(-1, 1000, size=(256, len(arrays["mean"])))
+    scaled = (probe - arrays["mean"]) / arrays["scale"]
+    # İki ormanda da düğümler aynı numaralıdır (önce iç düğümler, sonra yapraklar)
+    mismatch = int(np.count_nonzero(
+        FlatForest(arrays).leaves(scaled) != QuantizedForest(quantized).leaves(to_integer_features(probe))))
+    if mismatch == 0:
+        print("Tüm deneme girdilerinde float ormanla aynı yapraklar seçiliyor.")
+    else:
+        print(f"UYARI: {mismatch} (girdi, ağaç) çiftinde float ormandan farklı yaprak seçildi!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+import os
+import selectors
+import time
+
+from metrics import METRICS, now
+
+# --- Event-driven serial line ingestion ---
+# Replaces the "if ser.in_waiting > 0: ... time.sleep(0.05)" poll loops. The reader blocks on the
+# serial file descriptor with selectors, so a line is handled as soon as its newline arrives and the
+# process sleeps when the ESP32 is idle. Works with a pyserial Serial object, any object with
+# fileno(), or a raw file descriptor (e.g. one end of a pty pair standing in for /dev/rfcomm0).
+
+
+class LineFramer:
+    """
+    Splits a byte stream into complete, decoded lines using one reusable bytearray.
+    Partial lines are kept until their terminating newline arrives.
+    """
+
+    def __init__(self, max_line=4096):
+        """
+        :param max_line: Longest accepted line in bytes; longer garbage (no newline) is discarded.
+        """
+        self.max_line = max_line
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Appends received bytes and returns the complete lines found so far.
+
+        :param data: Bytes read from the device.
+        :return: List of stripped, non-empty lines (decoded as UTF-8, invalid bytes ignored).
+        """
+        buffer = self._buffer
+        buffer += data
+        lines = []
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = buffer[start:end].decode('utf-8', errors='ignore').strip()
+            if line:
+                lines.append(line)
+            start = end + 1
+        # Drop consumed bytes once per read instead of once per line
+        if start:
+            del buffer[:start]
+        if len(buffer) > self.max_line:
+            buffer.clear()
+        return lines
+
+    def reset(self):
+        """Discards any partial line (e.g. after a reconnect)."""
+        self._buffer.clear()
+
+
+class SerialLineReader:
+    """
+    Blocks on a serial device and dispatches complete lines to registered handlers.
+
+    Handlers are looked up in this order: exact command match (e.g. "CMD:START_SWIPE"),
+    then the first matching prefix (e.g. "DATA:"), then the default handler.
+    """
+
+    def __init__(self, port, max_line=4096, read_size=4096, framer=None):
+        """
+        :param port: pyserial Serial object, object with fileno(), or a raw file descriptor.
+        :param max_line: Longest accepted line in bytes.
+        :param read_size: Maximum bytes taken from the device per wakeup.
+        :param framer: Frame splitter; defaults to a text-only LineFramer. Pass a
+                       wire_format.WireFramer to also accept binary frames.
+        """
+        self.fd = port if isinstance(port, int) else port.fileno()
+        self.read_size = read_size
+        self.framer = framer if framer is not None else LineFramer(max_line)
+        self._commands = {}
+        self._frame_handlers = {}
+        self._prefixes = []
+        self._default = None
+        self._line_hooks = []
+        self._batch_end_hooks = []
+        self._error_hook = None
+        self._watched = {}
+        self._running = False
+        # Self-pipe so stop() can wake a blocked select() from another thread or a signal handler
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+
+    def on(self, command, handler):
+        """Registers handler(line) for lines equal to command."""
+        self._commands[command] = handler
+
+    def on_prefix(self, prefix, handler):
+        """Registers handler(line) for lines starting with prefix."""
+        self._prefixes.append((prefix, handler))
+
+    def on_default(self, handler):
+        """Registers handler(line) for lines no other handler matched."""
+        self._default = handler
+
+    def on_frame(self, frame_type, handler):
+        """
+        Registers handler(frame) for binary frames of frame_type (see wire_format). Frames without
+        a handler are rendered as their text-protocol lines and dispatched like text.
+        """
+        self._frame_handlers[frame_type] = handler
+
+    def on_line(self, hook):
+        """Registers hook(line), called for every line before dispatch (e.g. logging)."""
+        self._line_hooks.append(hook)
+
+    def on_batch_end(self, hook):
+        """Registers hook(), called after all lines from one read are dispatched."""
+        self._batch_end_hooks.append(hook)
+
+    def on_error(self, hook):
+        """
+        Registers hook(line, exc) for exceptions raised by handlers. Without it, exceptions propagate
+        out of run(); with it, the bad line is reported and reading continues.
+        """
+        self._error_hook = hook
+
+    def watch(self, fd, handler):
+        """
+        Registers handler(), called whenever fd becomes readable, so other event sources (e.g. the
+        result pipe of an inference worker) are served by the same loop. Takes effect on the next run().
+        """
+        self._watched[fd] = handler
+
+    def dispatch(self, line):
+        """Runs the hooks and the matching handler for one line."""
+        try:
+            for hook in self._line_hooks:
+                hook(line)
+            handler = self._commands.get(line)
+            if handler is None:
+                for prefix, prefix_handler in self._prefixes:
+                    if line.startswith(prefix):
+                        handler = prefix_handler
+                        break
+                else:
+                    handler = self._default
+            if handler is not None:
+                handler(line)
+        except Exception as e:
+            METRICS.count("handler_errors")
+            if self._error_hook is None:
+                raise
+            self._error_hook(line, e)
+
+    def dispatch_frame(self, frame):
+        """Runs the handler registered for a binary frame, or dispatches its text equivalent."""
+        handler = self._frame_handlers.get(frame.type)
+        if handler is None:
+            from wire_format import frame_to_lines
+            for line in frame_to_lines(frame):
+                self.dispatch(line)
+            return
+        try:
+            handler(frame)
+        except Exception as e:
+            METRICS.count("handler_errors")
+            if self._error_hook is None:
+                raise
+            self._error_hook(frame, e)
+
+    def dispatch_lines(self, lines):
+        """Dispatches a group of lines (and binary frames), then runs the batch-end hooks."""
+        for line in lines:
+            if isinstance(line, str):
+                self.dispatch(line)
+            else:
+                self.dispatch_frame(line)
+        for hook in self._batch_end_hooks:
+            hook()
+
+    def read_available(self):
+        """
+        Reads whatever is available on the device (one read) and dispatches complete lines.
+
+        :return: Number of bytes read; 0 means end of file (device closed/hung up),
+                 None means nothing was available after all (spurious wakeup).
+        :raises OSError: If the device reports an error (e.g. EIO after a Bluetooth drop).
+        """
+        try:
+            data = os.read(self.fd, self.read_size)
+        except BlockingIOError:
+            return None
+        if data:
+            METRICS.count("serial_bytes", len(data))
+            lines = self.framer.feed(data)
+            if lines:
+                self.dispatch_lines(lines)
+        return len(data)
+
+    def run(self, timeout=None):
+        """
+        Blocks until data arrives and dispatches lines until stop() is called or the device closes.
+
+        :param timeout: Optional idle timeout in seconds; run() returns if nothing arrives in time.
+        :return: "stopped", "eof" or "timeout".
+        """
+        self._running = True
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.fd, selectors.EVENT_READ, "serial")
+            selector.register(self._wake_r, selectors.EVENT_READ, "wake")
+            for fd, handler in self._watched.items():
+                selector.register(fd, selectors.EVENT_READ, handler)
+            while self._running:
+                wait_start = now()
+                events = selector.select(timeout)
+                METRICS.observe("serial_wait", wait_start)
+                if not events:
+                    return "timeout"
+                for key, _ in events:
+                    if key.data == "wake":
+                        os.read(self._wake_r, 512)
+                        continue
+                    if callable(key.data):
+                        key.data()
+                        continue
+                    if self.read_available() == 0:
+                        return "eof"
+        return "stopped"
+
+    def stop(self):
+        """Makes run() return; safe to call from another thread or a signal handler."""
+        self._running = False
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        """Releases the wakeup pipe (the serial port itself is owned by the caller)."""
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+
+class MultiDeviceReader:
+    """
+    Serves several serial devices (e.g. one rfcomm port per swipe panel) from one selector loop.
+
+    Every device gets its own SerialLineReader, created by setup_reader with its own framer and
+    handlers, so partial lines from different devices never mix. A device that cannot be opened,
+    hangs up or reports an error is closed and reopened every reconnect_interval seconds while the
+    other devices keep being served.
+    """
+
+    def __init__(self, devices, open_port, setup_reader, reconnect_interval=2.0):
+        """
+        :param devices: Mapping of device id -> device path, e.g. {"panel1": "/dev/rfcomm0"}.
+        :param open_port: open_port(path) -> opened port (pyserial Serial or an object with
+                          fileno() and close()); raises OSError if the device is not available.
+        :param setup_reader: setup_reader(device_id, port) -> SerialLineReader for the opened port
+                             with its handlers registered.
+        :param reconnect_interval: Seconds between attempts to (re)open a missing device.
+        """
+        self.devices = dict(devices)
+        self.open_port = open_port
+        self.setup_reader = setup_reader
+        self.reconnect_interval = reconnect_interval
+        self._ports = {}
+        self._readers = {}
+        self._retry_at = {device_id: 0.0 for device_id in self.devices}
+        self._batch_end_hooks = []
+        self._connect_hooks = []
+        self._disconnect_hooks = []
+        self._watched = {}
+        self._selector = None
+        self._running = False
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+
+    @property
+    def connected(self):
+        """Ids of the devices that are currently open."""
+        return list(self._readers)
+
+    def on_batch_end(self, hook):
+        """
+        Registers hook(), called once per wakeup after every device with data was read, e.g. to run
+        one inference batch over the rows of all devices.
+        """
+        self._batch_end_hooks.append(hook)
+
+    def on_connect(self, hook):
+        """Registers hook(device_id), called after a device was opened (also on reconnects)."""
+        self._connect_hooks.append(hook)
+
+    def on_disconnect(self, hook):
+        """Registers hook(device_id, reason), called after a device was closed; reason is "eof" or the error."""
+        self._disconnect_hooks.append(hook)
+
+    def watch(self, fd, handler):
+        """
+        Registers handler(), called whenever fd becomes readable (before the batch-end hooks of that
+        wakeup), e.g. for the result pipe of an inference worker. Takes effect on the next run().
+        """
+        self._watched[fd] = handler
+
+    def _connect_due(self):
+        current = time.monotonic()
+        for device_id, path in self.devices.items():
+            if device_id in self._readers or current < self._retry_at[device_id]:
+                continue
+            port = None
+            try:
+                port = self.open_port(path)
+                reader = self.setup_reader(device_id, port)
+            except OSError:
+                METRICS.count("device_connect_failures")
+                if port is not None:
+                    port.close()
+                self._retry_at[device_id] = current + self.reconnect_interval
+                continue
+            self._ports[device_id] = port
+            self._readers[device_id] = reader
+            self._selector.register(reader.fd, selectors.EVENT_READ, device_id)
+            METRICS.count("device_connects")
+            for hook in self._connect_hooks:
+                hook(device_id)
+
+    def _disconnect(self, device_id, reason):
+        reader = self._readers.pop(device_id)
+        port = self._ports.pop(device_id)
+        self._selector.unregister(reader.fd)
+        reader.close()
+        try:
+            port.close()
+        except OSError:
+            pass
+        self._retry_at[device_id] = time.monotonic() + self.reconnect_interval
+        METRICS.count("device_disconnects")
+        for hook in self._disconnect_hooks:
+            hook(device_id, reason)
+
+    def _select_timeout(self, idle_deadline):
+        # Wake up for the next reconnect attempt or the idle timeout, whichever comes first
+        deadlines = [self._retry_at[device_id] for device_id in self.devices if device_id not in self._readers]
+        if idle_deadline is not None:
+            deadlines.append(idle_deadline)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def run(self, timeout=None):
+        """
+        Serves the devices until stop() is called; devices are opened on entry and closed on exit.
+
+        :param timeout: Optional idle timeout in seconds; run() returns if no device sends anything in time.
+        :return: "stopped" or "timeout".
+        """
+        self._running = True
+        with selectors.DefaultSelector() as selector:
+            self._selector = selector
+            selector.register(self._wake_r, selectors.EVENT_READ, None)
+            for fd, handler in self._watched.items():
+                selector.register(fd, selectors.EVENT_READ, handler)
+            idle_deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                while self._running:
+                    self._connect_due()
+                    wait_start = now()
+                    events = selector.select(self._select_timeout(idle_deadline))
+                    METRICS.observe("serial_wait", wait_start)
+                    if not events:
+                        if idle_deadline is not None and time.monotonic() >= idle_deadline:
+                            return "timeout"
+                        continue
+                    for key, _ in events:
+                        if key.data is None:
+                            os.read(self._wake_r, 512)
+                            continue
+                        if callable(key.data):
+                            key.data()
+                            continue
+                        try:
+                            if self._readers[key.data].read_available() == 0:
+                                self._disconnect(key.data, "eof")
+                        except OSError as e:
+                            # e.g. EIO after a Bluetooth drop; the device is reopened later
+                            self._disconnect(key.data, e)
+                    if idle_deadline is not None:
+                        idle_deadline = time.monotonic() + timeout
+                    for hook in self._batch_end_hooks:
+                        hook()
+            finally:
+                for device_id in list(self._readers):
+                    self._disconnect(device_id, "closed")
+                self._selector = None
+        return "stopped"
+
+    def stop(self):
+        """Makes run() return; safe to call from another thread or a signal handler."""
+        self._running = False
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        """Releases the wakeup pipe."""
+        os.close(self._wake_r)
+        os.close(self._wake_w)
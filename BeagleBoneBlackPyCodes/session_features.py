@@ -0,0 +1,173 @@
+import numpy as np
+
+# --- Oturum (swipe) düzeyinde özellik çıkarımı ---
+# Veri setinde her user_trial ~100 ms aralıklı çok satırlı bir zaman serisidir. Satır başına tahmin
+# yerine bir swipe oturumu (CMD:START_SWIPE ... CMD:DATA_SENT) tek bir özellik vektörüne indirgenir.
+# Elektrot (kanal) başına özellikler:
+#   min_rawT*      oturumdaki en küçük ham değer (dokunulan elektrotta değer düşer)
+#   mean_rawT*     ham değerlerin ortalaması
+#   onset_T*       ilk dokunma anı (oturum başından ms); dokunulmadıysa NOT_TOUCHED
+#   order_T*       dokunma sırası (0 = ilk dokunulan); dokunulmadıysa NOT_TOUCHED
+#   total_durationT*  toplam dokunma süresi (her dokunuşun son durationT* değerlerinin toplamı)
+# ve oturum geneli için örnek sayısı ile süre (span_ms).
+#
+# SessionAggregator aynı özellikleri akış halinde, örnek başına O(1) bellekle günceller;
+# build_session_features eğitim için aynı hesabı pandas/numpy ile vektörel yapar.
+
+ELECTRODES = ["T9", "T8", "T7", "T0", "T2", "T3", "T6", "T5", "T4"]
+RAW_COLUMNS = [f"raw{e}" for e in ELECTRODES]
+DURATION_COLUMNS = [f"duration{e}" for e in ELECTRODES]
+CHANNEL_COUNT = len(ELECTRODES)
+FEATURE_COUNT = 2 * CHANNEL_COUNT
+
+SAMPLE_PERIOD_MS = 100  # ESP32 örnekleme aralığı; DATA: satırlarında zaman damgası yoktur
+NOT_TOUCHED = -1
+
+SESSION_FEATURE_NAMES = (
+    [f"min_{c}" for c in RAW_COLUMNS]
+    + [f"mean_{c}" for c in RAW_COLUMNS]
+    + [f"onset_{e}" for e in ELECTRODES]
+    + [f"order_{e}" for e in ELECTRODES]
+    + [f"total_{c}" for c in DURATION_COLUMNS]
+    + ["n_samples", "span_ms"]
+)
+
+
+class SessionAggregator:
+    # Bir swipe oturumunun özelliklerini ve satır tahminlerinin oylarını artımlı olarak biriktirir
+
+    def __init__(self, n_classes=0):
+        self.votes = np.zeros(n_classes, dtype=np.int64)
+        self.raw_min = np.empty(CHANNEL_COUNT)
+        self.raw_sum = np.empty(CHANNEL_COUNT)
+        self.onset = np.empty(CHANNEL_COUNT)
+        self.order = np.empty(CHANNEL_COUNT, dtype=np.int64)
+        self.total_duration = np.empty(CHANNEL_COUNT)
+        self.last_duration = np.empty(CHANNEL_COUNT)
+        self.reset()
+
+    def reset(self):
+        # Yeni oturum (CMD:START_SWIPE): diziler yeniden ayrılmadan sıfırlanır
+        self.count = 0
+        self.touched = 0
+        self.first_timestamp = None
+        self.span = 0.0
+        self.votes[:] = 0
+        self.raw_min[:] = np.inf
+        self.raw_sum[:] = 0.0
+        self.onset[:] = NOT_TOUCHED
+        self.order[:] = NOT_TOUCHED
+        self.total_duration[:] = 0.0
+        self.last_duration[:] = 0.0
+
+    def update(self, rows, timestamps=None):
+        # rows: tek bir 18'lik örnek veya (k, 18) dizi. timestamps verilmezse örnekler
+        # SAMPLE_PERIOD_MS aralıklı kabul edilir (BBBPredict'e gelen DATA: satırları gibi)
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if rows.shape[1] != FEATURE_COUNT:
+            raise ValueError(f"Beklenen özellik sayısı {FEATURE_COUNT}, alınan: {rows.shape[1]}")
+        k = len(rows)
+        if k == 0:
+            return
+        if timestamps is None:
+            times = (self.count + np.arange(k)) * float(SAMPLE_PERIOD_MS)
+        else:
+            timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+            if self.first_timestamp is None:
+                self.first_timestamp = timestamps[0]
+            times = timestamps - self.first_timestamp
+
+        raw = rows[:, :CHANNEL_COUNT]
+        duration = rows[:, CHANNEL_COUNT:]
+        np.minimum(self.raw_min, raw.min(axis=0), out=self.raw_min)
+        self.raw_sum += raw.sum(axis=0)
+
+        # durationT* dokunma boyunca artar ve bırakınca sıfırlanır; değer düştüğünde bir dokunuş bitmiştir
+        previous = np.vstack((self.last_duration, duration[:-1]))
+        ended = previous > duration
+        self.total_duration += np.where(ended, previous, 0.0).sum(axis=0)
+        self.last_duration[:] = duration[-1]
+
+        # İlk kez dokunulan kanallar: dokunma sırası ilk dokunulan örneğe, eşitlikte kanal sırasına göre
+        touched = duration > 0
+        new = (self.order == NOT_TOUCHED) & touched.any(axis=0)
+        if new.any():
+            first = touched.argmax(axis=0)
+            channels = np.flatnonzero(new)
+            channels = channels[np.argsort(first[channels], kind="stable")]
+            self.onset[channels] = times[first[channels]]
+            self.order[channels] = self.touched + np.arange(len(channels))
+            self.touched += len(channels)
+
+        self.count += k
+        self.span = times[-1]
+
+    def add_votes(self, encoded):
+        # Satır başına tahmin edilen sayısal etiketler oturumun oy sayacına eklenir
+        encoded = np.asarray(encoded, dtype=np.intp).reshape(-1)
+        if len(encoded):
+            self.votes += np.bincount(encoded, minlength=len(self.votes))[:len(self.votes)]
+
+    def vote(self):
+        # (kazanan sayısal etiket, aldığı oy, toplam oy); oy yoksa (None, 0, 0)
+        total = int(self.votes.sum())
+        if total == 0:
+            return None, 0, 0
+        winner = int(np.argmax(self.votes))
+        return winner, int(self.votes[winner]), total
+
+    def features(self):
+        # Oturumun SESSION_FEATURE_NAMES sırasındaki özellik vektörü; örnek yoksa None
+        if self.count == 0:
+            return None
+        return np.concatenate((
+            self.raw_min,
+            self.raw_sum / self.count,
+            self.onset,
+            self.order,
+            # Son dokunuş oturum sonunda biter
+            self.total_duration + self.last_duration,
+            (self.count, self.span),
+        ))
+
+
+def build_session_features(df, session_column="user_trial", time_column="timestamp"):
+    # Eğitim için: her user_trial oturumunun özellik satırı (SessionAggregator ile aynı hesap).
+    # time_column=None ise zaman, SessionAggregator'daki gibi örnek indeksi * SAMPLE_PERIOD_MS olur.
+    import pandas as pd
+
+    codes, sessions = pd.factorize(df[session_column])
+    sort = np.argsort(codes, kind="stable")
+    codes = codes[sort]
+    raw = df[RAW_COLUMNS].to_numpy(dtype=np.float64)[sort]
+    duration = df[DURATION_COLUMNS].to_numpy(dtype=np.float64)[sort]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, len(codes)])
+    position = np.arange(len(codes)) - np.repeat(starts, counts)
+    if time_column is None:
+        times = position * float(SAMPLE_PERIOD_MS)
+    else:
+        stamps = df[time_column].to_numpy(dtype=np.float64)[sort]
+        times = stamps - np.repeat(stamps[starts], counts)
+
+    raw_min = np.minimum.reduceat(raw, starts)
+    raw_mean = np.add.reduceat(raw, starts) / counts[:, None]
+
+    # Bir dokunuş, sonraki örnekte süre düştüğünde veya oturum bittiğinde sona erer
+    last = np.r_[starts[1:] - 1, len(codes) - 1]
+    next_duration = np.vstack((duration[1:], np.zeros((1, CHANNEL_COUNT))))
+    next_duration[last] = 0.0
+    total_duration = np.add.reduceat(np.where(duration > next_duration, duration, 0.0), starts)
+
+    touched = duration > 0
+    onset = np.minimum.reduceat(np.where(touched, times[:, None], np.inf), starts)
+    never = np.isinf(onset)
+    rank = np.argsort(np.argsort(onset, axis=1, kind="stable"), axis=1, kind="stable")
+    order = np.where(never, NOT_TOUCHED, rank)
+    onset[never] = NOT_TOUCHED
+
+    features = np.column_stack((raw_min, raw_mean, onset, order, total_duration, counts, times[last]))
+    return pd.DataFrame(features, index=pd.Index(sessions, name=session_column), columns=SESSION_FEATURE_NAMES)
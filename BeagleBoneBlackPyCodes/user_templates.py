@@ -0,0 +1,170 @@
+import argparse
+
+import numpy as np
+
+from metrics import METRICS, now
+
+# Kayıtlı olmayan kişileri reddetmek için kullanıcı şablonları (açık küme tanıma).
+# Sınıflandırıcı her zaman label_encoder.classes_'tan birini seçer; kayıtlı olmayan biri de en çok
+# benzediği kullanıcı olarak tanınır. Burada her kullanıcı için eğitimde küçük bir şablon hesaplanır
+# ve çalışma anında swipe oturumunun şablona uzaklığı eşiği aşarsa karar "unknown" olur.
+#
+# Şablonlar oturum özellikleri (session_features.SESSION_FEATURE_NAMES) üzerindedir: satır değerleri
+# (ham dokunma değerleri ve süre sayaçları) kullanıcılar arasında büyük ölçüde örtüşür, kişiyi ayırt
+# eden dokunma sırası, zamanlaması ve süreleridir. Ölçeklenmiş (standart) özellik uzayında her
+# kullanıcı için:
+#   centers  (K, F)  oturum özelliklerinin ortalaması
+#   inv_var  (K, F)  özellik başına ters varyans; kullanıcının varyansı tüm kullanıcıların ortalama
+#                    varyansına doğru büzülür (kullanıcı başına ~10 oturumla tam kovaryans kestirilemez)
+# Uzaklık, özellik başına ortalama standart kare uzaklıktır (köşegen Mahalanobis / F):
+#   d_k(x) = mean_f (z_f - centers_kf)^2 * inv_var_kf,   z = (x - mean) / scale
+# Tüm kullanıcılar için tek bir matris çarpımıyla hesaplanır: O(K * F) işlem, döngü yok.
+# Eşik (threshold), eğitim oturumlarında "bir oturum dışarıda" (leave-one-out) hesaplanan gerçek
+# kullanıcı uzaklıklarının accept_rate yüzdeliğidir: kayıtlı kullanıcıların oturumlarının yaklaşık
+# accept_rate kadarı kabul edilir. Reddetme oranı ve kayıtlı olmayan kişilere karşı başarı için
+# bkz. bench_user_templates.py (kullanıcıların bir kısmı eğitimden çıkarılıp sahte kişi yapılır).
+#
+# Dosya düzeni (.npz, pickle yok): format_version, mean, scale, centers, inv_var, threshold,
+# accept_rate, shrinkage, class_names.
+
+TEMPLATES_FORMAT_VERSION = 1
+
+
+def build_templates(features, labels, class_names, mean=None, scale=None, shrinkage=0.5, ridge=1e-2,
+                    accept_rate=0.95):
+    # features: (n, F) oturum özellikleri (ölçeklenmemiş); labels: sayısal etiketler (class_names indeksleri)
+    # mean/scale verilmezse features'tan hesaplanır (StandardScaler ile aynı)
+    features = np.asarray(features, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.intp)
+    n_classes = len(class_names)
+    if mean is None:
+        mean = features.mean(axis=0)
+    if scale is None:
+        scale = features.std(axis=0)
+    scale = np.where(np.asarray(scale) == 0, 1.0, scale)
+    z = (features - mean) / scale
+
+    counts = np.bincount(labels, minlength=n_classes).astype(np.float64)
+    if np.any(counts < 2):
+        missing = [str(class_names[i]) for i in np.flatnonzero(counts < 2)]
+        raise ValueError(f"Şablon için kullanıcı başına en az 2 oturum gerekli: {', '.join(missing)}")
+    sums = np.zeros((n_classes, z.shape[1]))
+    squares = np.zeros((n_classes, z.shape[1]))
+    np.add.at(sums, labels, z)
+    np.add.at(squares, labels, z * z)
+    centers = sums / counts[:, None]
+    variances = np.maximum(squares / counts[:, None] - centers ** 2, 0.0)
+    pooled = variances.mean(axis=0)
+    inv_var = 1.0 / ((1.0 - shrinkage) * variances + shrinkage * pooled + ridge)
+
+    # Eşik: her eğitim oturumu kendi kullanıcısının o oturum hariç şablonuyla ölçülür
+    # (eğitimde görülen oturum kendi şablonuna iyimser biçimde yakın olurdu)
+    rest = counts[labels][:, None] - 1.0
+    loo_centers = (sums[labels] - z) / rest
+    loo_variances = np.maximum((squares[labels] - z * z) / rest - loo_centers ** 2, 0.0)
+    loo_inv_var = 1.0 / ((1.0 - shrinkage) * loo_variances + shrinkage * pooled + ridge)
+    genuine = np.mean((z - loo_centers) ** 2 * loo_inv_var, axis=1)
+    threshold = float(np.quantile(genuine, accept_rate))
+
+    return {
+        "format_version": np.int32(TEMPLATES_FORMAT_VERSION),
+        "mean": np.asarray(mean, dtype=np.float64),
+        "scale": np.asarray(scale, dtype=np.float64),
+        "centers": centers,
+        "inv_var": inv_var,
+        "threshold": np.float64(threshold),
+        "accept_rate": np.float64(accept_rate),
+        "shrinkage": np.float64(shrinkage),
+        "class_names": np.asarray(class_names).astype(str),
+    }
+
+
+def save_templates(path, arrays):
+    np.savez(path, **arrays)
+
+
+def load_templates(path):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    if int(arrays.get("format_version", -1)) != TEMPLATES_FORMAT_VERSION:
+        raise ValueError(f"'{path}' desteklenen bir kullanıcı şablonu dosyası değil.")
+    return arrays
+
+
+class UserTemplates:
+    # Şablonlara vektörel uzaklık ve "unknown" kararı
+
+    def __init__(self, arrays, threshold=None):
+        # threshold verilirse dosyadaki eşiğin yerine kullanılır
+        self.mean = arrays["mean"]
+        self.scale = arrays["scale"]
+        self.class_names = arrays["class_names"]
+        self.threshold = float(arrays["threshold"] if threshold is None else threshold)
+        centers = arrays["centers"]
+        inv_var = arrays["inv_var"]
+        self.n_features = centers.shape[1]
+        # d_k(z) = (z^2 . a_k - 2 z . (c_k a_k) + c_k^2 . a_k) / F: üç terim yükleme anında hazırlanır
+        self._weights = np.ascontiguousarray(inv_var.T)
+        self._cross = np.ascontiguousarray((-2.0 * centers * inv_var).T)
+        self._offset = (centers * centers * inv_var).sum(axis=1)
+
+    def distances(self, features):
+        # (n, F) oturum özellikleri -> (n, K) uzaklıklar (tek oturum için (F,) da verilebilir)
+        start = now()
+        z = (np.atleast_2d(np.asarray(features, dtype=np.float64)) - self.mean) / self.scale
+        d = (z * z) @ self._weights + z @ self._cross + self._offset
+        d = np.maximum(d, 0.0, out=d) / self.n_features
+        METRICS.observe("user_templates", start)
+        return d
+
+    def check(self, features, encoded):
+        # Tahmin edilen kullanıcıların (sayısal etiketler) şablonuna uzaklık ve kabul (uzaklık <= eşik)
+        encoded = np.asarray(encoded, dtype=np.intp).reshape(-1)
+        scores = self.distances(features)[np.arange(len(encoded)), encoded]
+        return scores <= self.threshold, scores
+
+
+def session_features_from_samples(user_trials, features):
+    # (user_trial, (N, 18) satırlar) -> (oturum adları, oturum özellikleri); BBB'deki gibi zaman damgasız
+    import pandas as pd
+
+    from session_features import DURATION_COLUMNS, RAW_COLUMNS, build_session_features
+
+    df = pd.DataFrame(features, columns=RAW_COLUMNS + DURATION_COLUMNS)
+    df.insert(0, "user_trial", user_trials)
+    sessions = build_session_features(df, time_column=None)
+    return sessions.index.to_numpy().astype(str), sessions.to_numpy(dtype=np.float64)
+
+
+def main():
+    # Komut satırı: veri setinden (ör. enrollment.py ile yeni kullanıcılar eklendikten sonra) şablon dosyası üretir
+    parser = argparse.ArgumentParser(description="Kayıtlı olmayan kişileri reddetmek için kullanıcı şablonları üretir.")
+    parser.add_argument("dataset", help="CSV dosyası veya column_store klasörü")
+    parser.add_argument("output", help="Çıktı .npz dosyası (BBBPredict: USER_TEMPLATES_FILENAME)")
+    parser.add_argument("--classes", help="Sınıf sırası için model dosyası (.npz orman veya .npy paket); "
+                                          "verilmezse kullanıcı adları sıralanır")
+    parser.add_argument("--accept-rate", type=float, default=0.95, help="Kayıtlı kullanıcı oturumlarının kabul oranı hedefi")
+    parser.add_argument("--shrinkage", type=float, default=0.5, help="Varyansların ortak varyansa büzülme oranı (0-1)")
+    args = parser.parse_args()
+
+    from enrollment import load_model, load_samples, user_names
+
+    names, features = session_features_from_samples(*load_samples(args.dataset))
+    users = user_names(names)
+    if args.classes:
+        class_names = np.asarray(load_model(args.classes)["class_names"]).astype(str)
+    else:
+        class_names = np.unique(users)
+    unknown = sorted(set(users) - set(class_names))
+    if unknown:
+        raise SystemExit(f"Modelde olmayan kullanıcılar: {', '.join(unknown)}")
+    index = {name: i for i, name in enumerate(class_names)}
+    labels = np.array([index[user] for user in users])
+    arrays = build_templates(features, labels, class_names, shrinkage=args.shrinkage, accept_rate=args.accept_rate)
+    save_templates(args.output, arrays)
+    print(f"{len(class_names)} kullanıcı, {len(features)} oturumdan şablon '{args.output}' dosyasına yazıldı "
+          f"(eşik {float(arrays['threshold']):.3f}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import binascii
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# --- Compact binary wire format for swipe frames ---
+# Text lines ("DATA:86,80,...,0\r\n") cost ~55 bytes per sample at 9600 baud and need split() plus
+# float() per field on the BBB. A binary frame carries the same 18 values as fixed-width integers:
+#
+#   offset size  field
+#   0      2     sync      0xA5 0x5A (never appears in the ASCII text protocol)
+#   2      1     version   WIRE_VERSION
+#   3      1     type      FRAME_DATA / FRAME_ROW / FRAME_CMD
+#   4      1     length    payload length in bytes
+#   5      n     payload   little-endian, see below
+#   5+n    2     crc       CRC-16/CCITT-FALSE (binascii.crc_hqx, init 0xFFFF) over bytes 0..5+n-1
+#
+#   FRAME_DATA payload: 9 raw touch values + 9 durations, int16 each (36 bytes)     -> "DATA:..." line
+#   FRAME_ROW  payload: user uint8, trial uint16, timestamp uint32, then the 18 int16 values
+#                       (43 bytes), i.e. one data-collection CSV row                -> "User0.1,ts,..." line
+#   FRAME_CMD  payload: command id uint8 (CMD_START_SWIPE / CMD_DATA_SENT)         -> "CMD:..." line
+#
+# The text protocol stays the fallback: WireFramer accepts text lines and binary frames on the same
+# stream. The BBB announces support by sending WIRE_HELLO; firmware that understands it answers
+# "CMD:WIRE=1" and switches to binary frames, older firmware ignores it and keeps sending text.
+
+SYNC = b'\xa5\x5a'
+WIRE_VERSION = 1
+WIRE_HELLO = b"CMD:WIRE?1\n"
+WIRE_ACK = "CMD:WIRE=1"
+
+FRAME_DATA = 0x01
+FRAME_ROW = 0x02
+FRAME_CMD = 0x03
+
+CMD_START_SWIPE = 1
+CMD_DATA_SENT = 2
+COMMAND_LINES = {CMD_START_SWIPE: "CMD:START_SWIPE", CMD_DATA_SENT: "CMD:DATA_SENT"}
+COMMAND_IDS = {line: cmd for cmd, line in COMMAND_LINES.items()}
+
+FEATURE_COUNT = 18
+HEADER_SIZE = 5
+CRC_SIZE = 2
+
+_HEADER = struct.Struct('<2sBBB')
+_ROW_PREFIX = struct.Struct('<BHI')
+DATA_PAYLOAD_SIZE = 2 * FEATURE_COUNT
+ROW_PAYLOAD_SIZE = _ROW_PREFIX.size + DATA_PAYLOAD_SIZE
+DATA_FRAME_SIZE = HEADER_SIZE + DATA_PAYLOAD_SIZE + CRC_SIZE
+
+# A run of back-to-back DATA frames is viewed in place as one structured array
+DATA_FRAME_DTYPE = np.dtype([
+    ('sync', '<u2'), ('version', 'u1'), ('type', 'u1'), ('length', 'u1'),
+    ('values', '<i2', (FEATURE_COUNT,)), ('crc', '<u2'),
+])
+ROW_DTYPE = np.dtype([
+    ('user', 'u1'), ('trial', '<u2'), ('timestamp', '<u4'), ('values', '<i2', (FEATURE_COUNT,)),
+])
+_SYNC_WORD = struct.unpack('<H', SYNC)[0]
+
+# type: FRAME_*; data: (k, 18) int16 array for FRAME_DATA (k >= 1, consecutive frames merged),
+# ROW_DTYPE record for FRAME_ROW, "CMD:..." line for FRAME_CMD
+Frame = namedtuple('Frame', ['type', 'data'])
+
+
+def _crc(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def _encode(frame_type, payload):
+    body = _HEADER.pack(SYNC, WIRE_VERSION, frame_type, len(payload)) + payload
+    return body + struct.pack('<H', _crc(body))
+
+
+def _pack_values(features):
+    # Values are signed: the dataset uses -1 for "no reading" on some channels
+    values = np.asarray(features)
+    if values.shape != (FEATURE_COUNT,):
+        raise ValueError(f"Expected {FEATURE_COUNT} values, got shape {values.shape}")
+    if values.size and (values.min() < -32768 or values.max() > 32767):
+        raise ValueError("Feature values do not fit in int16")
+    return values.astype('<i2').tobytes()
+
+
+def encode_data_frame(features):
+    """Encodes 18 feature values (9 raw + 9 durations) as a FRAME_DATA frame."""
+    return _encode(FRAME_DATA, _pack_values(features))
+
+
+def encode_row_frame(user, trial, timestamp, features):
+    """Encodes one data-collection row (User<user>.<trial>, timestamp, 18 values) as a FRAME_ROW frame."""
+    return _encode(FRAME_ROW, _ROW_PREFIX.pack(user, trial, timestamp) + _pack_values(features))
+
+
+def encode_command_frame(command_line):
+    """Encodes "CMD:START_SWIPE" / "CMD:DATA_SENT" as a FRAME_CMD frame."""
+    return _encode(FRAME_CMD, bytes([COMMAND_IDS[command_line]]))
+
+
+def frame_to_lines(frame):
+    """Renders a frame as the equivalent text-protocol line(s)."""
+    if frame.type == FRAME_DATA:
+        return ["DATA:" + ",".join(map(str, row)) for row in frame.data.tolist()]
+    if frame.type == FRAME_ROW:
+        row = frame.data
+        values = ",".join(map(str, row['values'].tolist()))
+        return [f"User{int(row['user'])}.{int(row['trial'])},{int(row['timestamp'])},{values}"]
+    return [frame.data]
+
+
+class WireFramer:
+    """
+    Splits a byte stream carrying both text lines and binary frames.
+
+    feed() returns items in stream order: str for text lines, Frame for binary frames. Consecutive
+    DATA frames from one read are merged into a single Frame whose data is a (k, 18) view into the
+    received bytes (no per-frame copy). Frames with a bad header or CRC are skipped and counted.
+    """
+
+    def __init__(self, max_line=4096):
+        """
+        :param max_line: Longest accepted text line in bytes.
+        """
+        self.max_line = max_line
+        self.crc_errors = 0
+        self.frames = 0
+        self.binary_seen = False
+        self._pending = b''
+
+    def reset(self):
+        """Discards any partial line or frame (e.g. after a reconnect)."""
+        self._pending = b''
+
+    def feed(self, data):
+        """
+        Appends received bytes and returns the complete items found so far.
+
+        :param data: Bytes read from the device.
+        :return: List of str (text lines) and Frame objects.
+        """
+        # Immutable bytes so the returned numpy views stay valid after the next read
+        buf = self._pending + bytes(data) if self._pending else bytes(data)
+        items = []
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            if buf.startswith(SYNC, pos):
+                consumed = self._parse_binary(buf, pos, items)
+                if consumed == 0:
+                    break  # incomplete frame, wait for more bytes
+                pos += consumed
+                continue
+
+            newline = buf.find(b'\n', pos)
+            sync = buf.find(SYNC, pos)
+            if sync >= 0 and (newline < 0 or sync < newline):
+                # Unterminated text before a binary frame: garbage from a resync, drop it
+                pos = sync
+                continue
+            if newline < 0:
+                break  # incomplete text line
+            line = buf[pos:newline].decode('utf-8', errors='ignore').strip()
+            if line:
+                items.append(line)
+            pos = newline + 1
+
+        self._pending = buf[pos:]
+        if len(self._pending) > self.max_line:
+            self._pending = b''
+        return items
+
+    def _parse_binary(self, buf, pos, items):
+        # Returns the number of bytes consumed, 0 if more data is needed
+        remaining = len(buf) - pos
+        if remaining < HEADER_SIZE:
+            return 0
+        _, version, frame_type, length = _HEADER.unpack_from(buf, pos)
+        if version != WIRE_VERSION or frame_type not in (FRAME_DATA, FRAME_ROW, FRAME_CMD) \
+                or length != {FRAME_DATA: DATA_PAYLOAD_SIZE, FRAME_ROW: ROW_PAYLOAD_SIZE, FRAME_CMD: 1}[frame_type]:
+            self.crc_errors += 1
+            return 1  # not a valid header: skip the sync byte and resync
+        if frame_type == FRAME_DATA:
+            return self._parse_data_run(buf, pos, items)
+
+        size = HEADER_SIZE + length + CRC_SIZE
+        if remaining < size:
+            return 0
+        crc_pos = pos + HEADER_SIZE + length
+        if _crc(memoryview(buf)[pos:crc_pos]) != struct.unpack_from('<H', buf, crc_pos)[0]:
+            self.crc_errors += 1
+            return 1
+        self.binary_seen = True
+        self.frames += 1
+        if frame_type == FRAME_ROW:
+            items.append(Frame(FRAME_ROW, np.frombuffer(buf, dtype=ROW_DTYPE, count=1, offset=pos + HEADER_SIZE)[0]))
+        else:
+            line = COMMAND_LINES.get(buf[pos + HEADER_SIZE])
+            if line is not None:
+                items.append(Frame(FRAME_CMD, line))
+        return size
+
+    def _parse_data_run(self, buf, pos, items):
+        count = (len(buf) - pos) // DATA_FRAME_SIZE
+        if count == 0:
+            return 0
+        frames = np.frombuffer(buf, dtype=DATA_FRAME_DTYPE, count=count, offset=pos)
+        header_ok = ((frames['sync'] == _SYNC_WORD) & (frames['version'] == WIRE_VERSION)
+                     & (frames['type'] == FRAME_DATA) & (frames['length'] == DATA_PAYLOAD_SIZE))
+        # Length of the run of back-to-back DATA frames starting at pos
+        run = count if header_ok.all() else int(np.argmin(header_ok))
+        view = memoryview(buf)
+        crc_ok = np.fromiter(
+            (_crc(view[start:start + DATA_FRAME_SIZE - CRC_SIZE]) == crc
+             for start, crc in zip(range(pos, pos + run * DATA_FRAME_SIZE, DATA_FRAME_SIZE),
+                                   frames['crc'][:run].tolist())),
+            dtype=bool, count=run)
+        if not crc_ok.all():
+            self.crc_errors += int(run - crc_ok.sum())
+        values = frames['values'][:run]
+        if not crc_ok.all():
+            values = values[crc_ok]
+        if len(values):
+            self.binary_seen = True
+            self.frames += len(values)
+            items.append(Frame(FRAME_DATA, values))
+        return run * DATA_FRAME_SIZE